@@ -0,0 +1,117 @@
+"""
+التحكم في القبول تحت الضغط - حد تزامن متكيف (AIMD) حسب زمن المعالجة الفعلي
+الأحداث تُصنف بالأولوية: إجابات الألعاب والنقاط أولاً، ثم الاستعلامات، ثم الترفيه
+كل فئة تستخدم نسبة من الحد فقط، فيُرفض الترفيه أولاً عند الامتلاء وتبقى الألعاب تعمل
+"""
+
+import time
+import logging
+from contextlib import contextmanager
+from threading import Condition
+
+logger = logging.getLogger("whale-bot")
+
+CRITICAL, NORMAL, LOW = 'critical', 'normal', 'low'
+PRIORITIES = (CRITICAL, NORMAL, LOW)
+
+SHARES = {CRITICAL: 1.0, NORMAL: 0.8, LOW: 0.5}  # نسبة الحد المتاحة لكل فئة
+WAITS = {CRITICAL: 2.0, NORMAL: 0.5, LOW: 0.0}   # أقصى انتظار لمكان قبل الرفض (ثوانٍ)
+
+
+class AdmissionController:
+    """حد التزامن: يزيد 1 لكل limit حدث أسرع من target، وينقص بنسبة backoff عند تجاوزه
+
+    التخفيض مرة واحدة على الأكثر كل cooldown ثانية حتى لا ينهار الحد بسبب دفعة واحدة بطيئة
+    """
+
+    def __init__(self, target=0.5, initial=32, minimum=4, maximum=200, backoff=0.9, cooldown=1.0,
+                 clock=time.monotonic):
+        self.target = target
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.clock = clock
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.latency = 0.0  # EWMA بالثواني
+        self.stats = {p: {'admitted': 0, 'waited': 0, 'shed': 0} for p in PRIORITIES}
+        self.decreases = 0
+        self._decreased_at = 0.0
+        self._logged_at = {}
+        self._condition = Condition()
+
+    def _capacity(self, priority):
+        return max(1, int(self.limit * SHARES[priority]))
+
+    # ─────────────── القبول ───────────────
+    def acquire(self, priority):
+        """حجز مكان للحدث، ويرجع False إذا رُفض"""
+        with self._condition:
+            if self.in_flight >= self._capacity(priority):
+                deadline = self.clock() + WAITS[priority]
+                self.stats[priority]['waited'] += 1
+                while self.in_flight >= self._capacity(priority):
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        self.stats[priority]['shed'] += 1
+                        self._log_shed(priority)
+                        return False
+                    self._condition.wait(remaining)
+            self.in_flight += 1
+            self.stats[priority]['admitted'] += 1
+            return True
+
+    def release(self, latency=None):
+        with self._condition:
+            self.in_flight -= 1
+            if latency is not None:
+                self._observe(latency)
+            self._condition.notify_all()  # الفئات تختلف في سعتها، فالأول في الانتظار قد لا يكون القادر على الدخول
+
+    def _observe(self, latency):
+        self.latency = latency if not self.latency else self.latency * 0.9 + latency * 0.1
+        now = self.clock()
+        if latency > self.target:
+            if now - self._decreased_at >= self.cooldown:
+                self._decreased_at = now
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                self.decreases += 1
+        elif self.in_flight + 1 >= self.limit * 0.5:
+            # الزيادة فقط عندما يُستخدم الحد فعلاً، وإلا يكبر بلا معنى وقت الهدوء
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def _log_shed(self, priority):
+        now = self.clock()
+        if now - self._logged_at.get(priority, -60.0) >= 60:
+            self._logged_at[priority] = now
+            logger.warning(f"🚦 ضغط عالٍ: رفض أحداث {priority} "
+                           f"(الحد {self.limit:.1f}، الجاري {self.in_flight}، الزمن {self.latency * 1000:.0f}ms)")
+
+    @contextmanager
+    def slot(self, priority, observe=True):
+        """with admission.slot(priority) as admitted: ... (None = بدون حجز)
+
+        observe=False: الحدث ينتظر عمداً (مثل نافذة حكم الإجابات) فلا يُحسب زمنه
+        """
+        if priority is None:
+            yield True
+            return
+        if not self.acquire(priority):
+            yield False
+            return
+        started = time.perf_counter()
+        try:
+            yield True
+        finally:
+            self.release(time.perf_counter() - started if observe else None)
+
+    def status(self):
+        return {
+            'limit': round(self.limit, 1),
+            'in_flight': self.in_flight,
+            'latency_ms': round(self.latency * 1000, 1),
+            'target_ms': round(self.target * 1000),
+            'decreases': self.decreases,
+            'classes': self.stats
+        }
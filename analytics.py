@@ -0,0 +1,251 @@
+"""
+إحصائيات الاستخدام بذاكرة ثابتة
+حلقات زمنية (دقيقة ← ساعة ← يوم) لعدادات الأوامر والألعاب، وتوزيع ساعات اليوم،
+و Space-Saving لأكثر الغرف والمستخدمين نشاطاً
+"""
+
+import time
+from threading import Lock
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+
+
+class SpaceSaving:
+    """أكثر k عناصر تكراراً بذاكرة O(k) (خوارزمية Space-Saving مع Stream-Summary)
+
+    كل عنصر له count (حد أعلى) و error (أقصى زيادة محتملة)، والتحديث O(1)
+    """
+
+    def __init__(self, k=100):
+        self.k = k
+        self.counts = {}   # {key: count}
+        self.errors = {}   # {key: error}
+        self.buckets = {}  # {count: set(keys)}
+        self.min_count = 0
+        self.total = 0
+
+    def add(self, key):
+        self.total += 1
+        count = self.counts.get(key)
+        if count is not None:
+            self._move(key, count, count + 1)
+            return
+        if len(self.counts) < self.k:
+            self.counts[key] = 1
+            self.errors[key] = 0
+            self.buckets.setdefault(1, set()).add(key)
+            self.min_count = 1
+            return
+        # استبدال أقل عنصر: العنصر الجديد يرث عدّه كخطأ
+        low = self.min_count
+        evicted = self.buckets[low].pop()
+        del self.counts[evicted]
+        del self.errors[evicted]
+        self.buckets[low].add(key)
+        self.counts[key] = low
+        self.errors[key] = low
+        self._move(key, low, low + 1)
+
+    def _move(self, key, old, new):
+        keys = self.buckets[old]
+        keys.discard(key)
+        if not keys:
+            del self.buckets[old]
+            if self.min_count == old:
+                self.min_count = new
+        self.buckets.setdefault(new, set()).add(key)
+        self.counts[key] = new
+
+    def top(self, n=10):
+        """[(key, count, error)] مرتبة تنازلياً"""
+        keys = sorted(self.counts, key=self.counts.get, reverse=True)[:n]
+        return [(key, self.counts[key], self.errors[key]) for key in keys]
+
+
+class _Bucket:
+    __slots__ = ('start', 'messages', 'commands', 'games')
+
+    def __init__(self, start):
+        self.start = start
+        self.messages = 0
+        self.commands = {}
+        self.games = 0
+
+    def merge_into(self, totals):
+        totals['messages'] += self.messages
+        totals['games'] += self.games
+        commands = totals['commands']
+        for command, count in self.commands.items():
+            commands[command] = commands.get(command, 0) + count
+
+
+class TimeRing:
+    """حلقة من slots حاوية بدقة resolution ثانية (الأقدم يُستبدل تلقائياً)"""
+
+    def __init__(self, resolution, slots):
+        self.resolution = resolution
+        self.slots = slots
+        self.buckets = [None] * slots
+
+    def bucket(self, ts):
+        """حاوية الفترة التي تحتوي ts (تُنشأ أو يُعاد استخدام مكانها)"""
+        start = int(ts // self.resolution) * self.resolution
+        index = (start // self.resolution) % self.slots
+        bucket = self.buckets[index]
+        if bucket is None or bucket.start != start:
+            bucket = self.buckets[index] = _Bucket(start)
+        return bucket
+
+    @property
+    def retention(self):
+        return self.resolution * self.slots
+
+    def range(self, start, end):
+        """الحاويات داخل [start, end) مرتبة زمنياً"""
+        return sorted((b for b in self.buckets if b is not None and start <= b.start < end),
+                      key=lambda b: b.start)
+
+
+class Analytics:
+    """مسجل الاستخدام - record() لكل رسالة و query() للاستعلام بفترات زمنية
+
+    كل حاوية دقيقة تُطوى في حاوية الساعة ثم اليوم عند انتهائها، فالاستعلام يقرأ
+    الحاويات المجمعة ولا يمر على الأحداث الخام
+    """
+
+    def __init__(self, minutes=180, hours=24 * 14, days=400, top_k=100, clock=time.time):
+        self.levels = [TimeRing(MINUTE, minutes), TimeRing(HOUR, hours), TimeRing(DAY, days)]
+        self.rooms = SpaceSaving(top_k)
+        self.users = SpaceSaving(top_k)
+        self.hour_of_day = [0] * 24
+        self.clock = clock
+        self.started_at = clock()
+        self._current = None  # حاوية الدقيقة الجارية (لم تُطوَ بعد)
+        self._hour = 0        # ساعة اليوم للدقيقة الجارية
+        self._lock = Lock()
+
+    def _minute(self, now):
+        current = self._current
+        if current is not None and current.start <= now < current.start + MINUTE:
+            return current
+        if current is not None:
+            self._rollup(current)
+        self._current = self.levels[0].bucket(now)
+        self._hour = time.localtime(now).tm_hour
+        return self._current
+
+    def _rollup(self, minute):
+        """طي دقيقة منتهية في حاويات الساعة واليوم"""
+        for ring in self.levels[1:]:
+            bucket = ring.bucket(minute.start)
+            bucket.messages += minute.messages
+            bucket.games += minute.games
+            commands = bucket.commands
+            for command, count in minute.commands.items():
+                commands[command] = commands.get(command, 0) + count
+
+    def record(self, command=None, room=None, user=None):
+        """تسجيل رسالة واحدة (command = None للرسائل التي ليست أوامر)"""
+        now = self.clock()
+        with self._lock:
+            bucket = self._minute(now)
+            bucket.messages += 1
+            if command:
+                bucket.commands[command] = bucket.commands.get(command, 0) + 1
+            if room:
+                self.rooms.add(room)
+            if user:
+                self.users.add(user)
+            self.hour_of_day[self._hour] += 1
+
+    def record_game(self):
+        with self._lock:
+            self._minute(self.clock()).games += 1
+
+    def _level_for(self, start, end, now):
+        """أخشن دقة ممكنة تغطي الفترة بحاويات كاملة"""
+        span = end - start
+        for ring in self.levels:
+            if start >= now - ring.retention and span <= ring.resolution * 120:
+                return ring
+        return self.levels[-1]
+
+    def query(self, start=None, end=None, resolution=None, top=10):
+        """إجماليات الفترة [start, end) مع سلسلة زمنية وأكثر الغرف والمستخدمين نشاطاً"""
+        now = self.clock()
+        end = now if end is None else end
+        start = end - DAY if start is None else start
+        with self._lock:
+            ring = self._level_for(start, end, now)
+            if resolution is not None:
+                ring = next((r for r in self.levels if r.resolution == resolution), ring)
+            partial = self._current
+            aligned_start = start - start % ring.resolution
+            buckets = ring.range(aligned_start, end)
+            totals = {'messages': 0, 'games': 0, 'commands': {}}
+            series = []
+            for bucket in buckets:
+                bucket.merge_into(totals)
+                series.append({'start': bucket.start, 'messages': bucket.messages, 'games': bucket.games})
+            # الدقيقة الجارية لم تُطوَ بعد في الساعة واليوم
+            if ring is not self.levels[0] and partial is not None and aligned_start <= partial.start < end:
+                partial.merge_into(totals)
+                bucket_start = partial.start - partial.start % ring.resolution
+                if series and series[-1]['start'] == bucket_start:
+                    series[-1]['messages'] += partial.messages
+                    series[-1]['games'] += partial.games
+                else:
+                    series.append({'start': bucket_start, 'messages': partial.messages, 'games': partial.games})
+            totals['commands'] = dict(sorted(totals['commands'].items(), key=lambda item: -item[1]))
+            return {
+                'from': start,
+                'to': end,
+                'resolution': ring.resolution,
+                'totals': totals,
+                'series': series,
+                'hour_of_day': list(self.hour_of_day),
+                'top_rooms': [{'id': k, 'count': c, 'error': e} for k, c, e in self.rooms.top(top)],
+                'top_users': [{'id': k, 'count': c, 'error': e} for k, c, e in self.users.top(top)],
+                'since': self.started_at
+            }
+
+
+def merge_queries(results, top=10):
+    """دمج نتائج query() من عدة عمال لنفس الفترة والدقة في نتيجة واحدة
+
+    أكثر الغرف والمستخدمين: تُجمع العدّات والأخطاء لكل مفتاح، والمفتاح الغائب عن top عامل
+    لا يُحسب له من ذلك العامل (فالعدّ حد أدنى هنا)
+    """
+    merged = dict(results[0])
+    totals = {'messages': 0, 'games': 0, 'commands': {}}
+    series = {}
+    hour_of_day = [0] * 24
+    tops = {'top_rooms': {}, 'top_users': {}}
+    for result in results:
+        totals['messages'] += result['totals']['messages']
+        totals['games'] += result['totals']['games']
+        commands = totals['commands']
+        for command, count in result['totals']['commands'].items():
+            commands[command] = commands.get(command, 0) + count
+        for point in result['series']:
+            entry = series.setdefault(point['start'], {'start': point['start'], 'messages': 0, 'games': 0})
+            entry['messages'] += point['messages']
+            entry['games'] += point['games']
+        for hour, count in enumerate(result['hour_of_day']):
+            hour_of_day[hour] += count
+        for name, counts in tops.items():
+            for item in result[name]:
+                entry = counts.setdefault(item['id'], {'id': item['id'], 'count': 0, 'error': 0})
+                entry['count'] += item['count']
+                entry['error'] += item['error']
+    totals['commands'] = dict(sorted(totals['commands'].items(), key=lambda item: -item[1]))
+    merged.update(
+        totals=totals,
+        series=[series[start] for start in sorted(series)],
+        hour_of_day=hour_of_day,
+        since=min(result['since'] for result in results),
+        **{name: sorted(counts.values(), key=lambda item: -item['count'])[:top] for name, counts in tops.items()}
+    )
+    return merged
@@ -4,12 +4,14 @@
 التصميم: iOS Style - نظيف وأنيق ومريح للعين
 """
 
-from flask import Flask, request, abort, jsonify
-from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError, LineBotApiError
+from flask import Flask, Response, request, abort, jsonify
+from werkzeug.local import LocalProxy
+from linebot import WebhookHandler
+from linebot.exceptions import LineBotApiError
 from linebot.models import (
-    MessageEvent, TextMessage, FlexSendMessage,
-    QuickReply, QuickReplyButton, MessageAction
+    MessageEvent, TextMessage, TextSendMessage, FlexSendMessage,
+    QuickReply, QuickReplyButton, MessageAction, JoinEvent, LeaveEvent,
+    MemberJoinedEvent, MemberLeftEvent
 )
 import os
 import sys
@@ -21,6 +23,32 @@ from collections import defaultdict
 from threading import Lock, Thread
 import time
 import random
+import hmac
+import uuid
+import hashlib
+import base64
+
+from router import RoomRouter
+from dedup import SeenFilter
+from outbox import Outbox
+from channels import Channel, ChannelRegistry, DEFAULT_CHANNEL
+from arbiter import AnswerArbiter
+from analytics import Analytics, merge_queries
+from floodguard import FloodGuard
+from transfer import Importer, export_lines
+from leaderboard import Leaderboards
+from profiler import SamplingProfiler, format_collapsed, parse_collapsed
+from recorder import TrafficRecorder
+from memwatch import MemoryWatchdog
+from lifecycle import Lifecycle
+from roster import RosterService
+from admission import AdmissionController, CRITICAL, NORMAL, LOW
+from assets import AssetStore
+from content.games import FastAnswerGame, CompatibilityGame, DifferenceGame, FAST_QUESTIONS, POINTS_CORRECT
+from scheduler import BroadcastScheduler, RoomRegistry
+from line_stub import StubLineApi
+from user_store import UserTable
+from snapshot import Snapshot, write_snapshot
 
 # ═══════════════════════════════════════════════════════════════
 # إعداد Logging المتقدم
@@ -41,6 +69,7 @@ logger = logging.getLogger("whale-bot")
 LINE_TOKEN = os.getenv('LINE_CHANNEL_ACCESS_TOKEN', '')
 LINE_SECRET = os.getenv('LINE_CHANNEL_SECRET', '')
 ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', 'admin_whale_2025')
+LINE_API_ENDPOINT = os.getenv('LINE_API_ENDPOINT', '')  # LINE وهمي محلي لإعادة تشغيل الحركة
 
 # مفاتيح Gemini للذكاء الاصطناعي
 GEMINI_KEYS = [
@@ -59,8 +88,40 @@ if not LINE_TOKEN or not LINE_SECRET:
 # ═══════════════════════════════════════════════════════════════
 VERSION = "3.0.0"
 BOT_NAME = "بوت الحوت"
-CLEANUP_DAYS = 45  # حذف المستخدمين غير النشطين بعد 45 يوم
+HOT_USER_DAYS = int(os.getenv('HOT_USER_DAYS', 7))  # غير النشطين بعدها ينتقلون من الذاكرة إلى لقطة القرص
 MAX_MESSAGES_PER_MINUTE = 10  # حماية من السبام
+ROOM_ROUTING = os.getenv('ROOM_ROUTING', '1') == '1'  # توجيه كل غرفة لعامل واحد
+ROOM_ROUTER_DIR = os.getenv('ROOM_ROUTER_DIR', '/tmp/whale-bot-router')
+ROOM_ROUTER_KEY = hashlib.sha256(f"router:{LINE_SECRET}".encode('utf-8')).digest()  # توقيع الأحداث المحوّلة بين العمال
+# تحميل كل المستخدمين عند الإقلاع بدل التحميل الكسول (مفيد مع gunicorn --preload)
+SNAPSHOT_FULL_LOAD = os.getenv('SNAPSHOT_FULL_LOAD', '0') == '1'
+DEDUP_FILE = os.getenv('DEDUP_FILE', '/tmp/whale-bot-seen.bloom')  # مشترك بين العمال
+DEDUP_WINDOW_SECONDS = int(os.getenv('DEDUP_WINDOW_SECONDS', 3600))
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', 100))  # رسالة push في الثانية
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 8))
+BROADCAST_DRY_RUN = os.getenv('BROADCAST_DRY_RUN', '0') == '1'  # إرسال لـ LINE وهمي محلي
+CHANNELS_FILE = os.getenv('CHANNELS_FILE', 'channels.json')  # قنوات إضافية (/callback/<channel>)
+ARBITER_FILE = os.getenv('ARBITER_FILE', '/tmp/whale-bot-arbiter.sqlite')  # تحكيم أسرع بين العمال
+ARBITER_WINDOW_MS = int(os.getenv('ARBITER_WINDOW_MS', 300))  # نافذة جمع الإجابات
+FLOOD_THRESHOLD = int(os.getenv('FLOOD_THRESHOLD', 8))  # تكرار نفس الأمر في الغرفة خلال ~10 ثوانٍ
+FLOOD_WINDOW_SECONDS = int(os.getenv('FLOOD_WINDOW_SECONDS', 30))  # رد واحد لكل أمر متكرر أثناء الإغراق
+LEADERBOARD_HALF_LIFE_DAYS = float(os.getenv('LEADERBOARD_HALF_LIFE_DAYS', 14))  # 0 = بدون لوحة النشاط
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/whale-bot-profiles')  # نتائج رسائل التحكم (profiler والإحصائيات) من كل العمال
+MAX_PROFILE_SECONDS = 60
+# تسجيل حركة Webhook بعد إخفاء الهوية (فارغ = معطل)، انظر benchmarks/replay.py
+ADMISSION_TARGET_MS = int(os.getenv('ADMISSION_TARGET_MS', 500))  # زمن المعالجة المستهدف قبل تقليص التزامن
+ADMISSION_MAX_CONCURRENCY = int(os.getenv('ADMISSION_MAX_CONCURRENCY', 200))
+ROSTER_TTL_SECONDS = int(os.getenv('ROSTER_TTL_SECONDS', 3600))  # إعادة جلب قائمة أعضاء المجموعة
+TRAFFIC_RECORD_DIR = os.getenv('TRAFFIC_RECORD_DIR', '')
+MEMORY_SOFT_LIMIT_MB = int(os.getenv('MEMORY_SOFT_LIMIT_MB', 0))  # تقليص الـ caches فوق هذا الحد (0 = معطل)
+MEMORY_CHECK_SECONDS = int(os.getenv('MEMORY_CHECK_SECONDS', 300))
+STALE_GAME_HOURS = 6  # الألعاب المتروكة أقدم من هذا تُحذف عند التقليص
+DRAIN_SECONDS = int(os.getenv('DRAIN_SECONDS', 10))  # أقل من graceful_timeout في gunicorn (30)
+HANDOFF_DIR = os.getenv('HANDOFF_DIR', 'handoff')  # تقارير التسليم بين العامل المتوقف والتالي
+ASSETS_DIR = os.getenv('ASSETS_DIR', 'static/assets')  # ناتج python assets.py
+ASSETS_BASE_URL = os.getenv('ASSETS_BASE_URL', '').rstrip('/')  # عنوان https العام للبوت (فارغ = بدون صور)
+ASSETS_CACHE_MB = int(os.getenv('ASSETS_CACHE_MB', 8))
+TRAFFIC_RECORD_KEY = os.getenv('TRAFFIC_RECORD_KEY', '') or hashlib.sha256(f"traffic:{LINE_SECRET}".encode('utf-8')).hexdigest()
 
 # ألوان iOS Style - هادئة ومريحة
 COLORS = {
@@ -76,6 +137,14 @@ COLORS = {
     'border': '#E5E5EA'        # حدود
 }
 
+# لوحات الصدارة الموسمية: الأمر → اللوحة
+LEADERBOARD_COMMANDS = {
+    'الصدارة الأسبوعية': 'week', 'الصدارة الأسبوع': 'week',
+    'الصدارة الشهرية': 'month', 'الصدارة الشهر': 'month',
+    'الصدارة النشاط': 'decay'
+}
+LEADERBOARD_TITLES = {'week': 'صدارة الأسبوع', 'month': 'صدارة الشهر', 'decay': 'صدارة النشاط'}
+
 # الأوامر المقبولة فقط
 VALID_COMMANDS = {
     'البداية', 'مساعدة', 'انضم', 'انسحب', 'نقاطي', 'الصدارة',
@@ -84,6 +153,13 @@ VALID_COMMANDS = {
     'لمح', 'جاوب', 'ايقاف', 'اعادة', 'الحل'
 }
 
+# أولوية الأوامر تحت الضغط (الباقي NORMAL): الألعاب والنقاط أولاً والترفيه يُرفض أولاً
+COMMAND_PRIORITIES = {
+    **dict.fromkeys(['أسرع', 'انضم', 'انسحب', 'لمح', 'جاوب', 'ايقاف', 'اعادة', 'الحل'], CRITICAL),
+    **dict.fromkeys(['سؤال', 'سوال', 'تحدي', 'اعتراف', 'منشن', 'توافق',
+                     'أغنية', 'لعبة', 'سلسلة', 'ضد', 'تكوين', 'اختلاف'], LOW)
+}
+
 # ═══════════════════════════════════════════════════════════════
 # تهيئة Flask و LINE Bot
 # ═══════════════════════════════════════════════════════════════
@@ -91,49 +167,102 @@ app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False
 app.config['JSON_SORT_KEYS'] = False
 
-line_bot_api = LineBotApi(LINE_TOKEN)
+# معالج الأحداث الداخلي: كل القنوات تُوزّع عبره بعد التحقق من توقيعها
 handler = WebhookHandler(LINE_SECRET)
 
 # ═══════════════════════════════════════════════════════════════
-# قاعدة البيانات البسيطة (في الذاكرة + ملف JSON)
+# قاعدة البيانات البسيطة (في الذاكرة + ملف JSON + لقطة المستخدمين)
+# لكل قناة ملفاتها: whale_bot_db.json للقناة الافتراضية و whale_bot_<channel>_db.json للبقية
 # ═══════════════════════════════════════════════════════════════
-DB_FILE = 'whale_bot_db.json'
+JOBS_FILE = 'whale_bot_jobs.json'  # مهام البث المجدول
+ROOMS_FILE = 'whale_bot_rooms.sqlite'  # مجموعات كل القنوات للبث (مشتركة بين العمال)
 db_lock = Lock()
+room_registry = RoomRegistry(ROOMS_FILE)
+
+def load_users(snapshot_path):
+    """فتح لقطة المستخدمين بدون فك ترميزها"""
+    if os.path.exists(snapshot_path):
+        try:
+            return UserTable(snapshot=Snapshot(snapshot_path))
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ خطأ في فتح لقطة المستخدمين: {e}")
+    return UserTable()
 
-def load_db():
-    """تحميل قاعدة البيانات"""
-    if os.path.exists(DB_FILE):
+def load_db(channel):
+    """تحميل قاعدة بيانات القناة"""
+    started = time.perf_counter()
+    data = None
+    if os.path.exists(channel.db_file):
         try:
-            with open(DB_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(channel.db_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
         except:
             pass
-    return {
-        'users': {},      # {user_id: {name, points, last_active, games_played}}
-        'games': {},      # {room_id: {game_type, data, players, started_at}}
-        'questions_used': [], # أسئلة مستخدمة لتجنب التكرار
-        'stats': {'total_games': 0, 'total_players': 0}
-    }
+    if data is None:
+        data = {
+            'games': {},      # {room_id: {game_type, data, players, started_at}}
+            'questions_used': [], # أسئلة مستخدمة لتجنب التكرار
+            'stats': {'total_games': 0, 'total_players': 0}
+        }
+    if data.get('rooms'):
+        # تنسيق قديم: المجموعات داخل JSON تنتقل لسجل المجموعات المشترك
+        room_registry.add_many(channel.name, data.pop('rooms'))
+    if data.get('users'):
+        # تنسيق قديم: المستخدمون داخل JSON، تُكتب اللقطة عند أول حفظ
+        data['users'] = UserTable(data['users'])
+    else:
+        data['users'] = load_users(channel.users_snapshot)  # {user_id: {name, points, last_active, games_played}}
+    if SNAPSHOT_FULL_LOAD:
+        data['users'].load_all()
+    logger.info(f"✅ تم تحميل DB [{channel.name}]: {len(data['users'])} مستخدم، {len(data['games'])} لعبة نشطة "
+                f"({(time.perf_counter() - started) * 1000:.1f}ms)")
+    return data
 
 def save_db(data):
-    """حفظ قاعدة البيانات"""
+    """حفظ قاعدة بيانات القناة الحالية (اللقطة تُعاد كتابتها فقط إذا تغير مستخدم)"""
+    channel = channels.current()
     with db_lock:
         try:
-            with open(DB_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            users = data['users']
+            if users.changed():
+                write_snapshot(channel.users_snapshot, users.snapshot_records())
+                users.rebind(Snapshot(channel.users_snapshot))
+            meta = {key: value for key, value in data.items() if key != 'users'}
+            with open(channel.db_file, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
             return True
         except Exception as e:
             logger.error(f"❌ خطأ في حفظ DB: {e}")
             return False
 
-db = load_db()
-logger.info(f"✅ تم تحميل DB: {len(db['users'])} مستخدم، {len(db['games'])} لعبة نشطة")
+# ═══════════════════════════════════════════════════════════════
+# القنوات - line_bot_api و db يشيران دائماً لقناة الحدث الحالي
+# ═══════════════════════════════════════════════════════════════
+default_channel = Channel(DEFAULT_CHANNEL, LINE_TOKEN, LINE_SECRET, load_db, api_endpoint=LINE_API_ENDPOINT or None)
+
+def retire_channel(channel):
+    """قناة تغير token أو secret أو حُذفت: حفظ بياناتها وإرسال طابورها قبل استبدالها"""
+    if channel.loaded:
+        with channels.use(channel):
+            save_db(channel.db)
+    channel.push_queue.flush()
+
+channels = ChannelRegistry(CHANNELS_FILE, default_channel, load_db, api_endpoint=LINE_API_ENDPOINT or None,
+                           retire=retire_channel)
+line_bot_api = LocalProxy(lambda: channels.current().api)
+db = LocalProxy(lambda: channels.current().db)
+
+default_channel.db  # القناة الافتراضية تُحمّل عند الإقلاع، والبقية عند أول حدث
 
 # ═══════════════════════════════════════════════════════════════
 # Cache للأداء
 # ═══════════════════════════════════════════════════════════════
 names_cache = {}  # {user_id: name}
+flood_guard = FloodGuard(threshold=FLOOD_THRESHOLD, window=FLOOD_WINDOW_SECONDS)
 rate_limit_cache = defaultdict(lambda: {'count': 0, 'reset_at': datetime.now()})
+admission = AdmissionController(target=ADMISSION_TARGET_MS / 1000, maximum=ADMISSION_MAX_CONCURRENCY)
+roster_service = RosterService(ttl=ROSTER_TTL_SECONDS, names=names_cache)  # أعضاء المجموعات لمنشن وتوافق
+asset_store = AssetStore(ASSETS_DIR, cache_bytes=ASSETS_CACHE_MB * 1024 * 1024)  # صور لعبة اختلاف
 
 # ═══════════════════════════════════════════════════════════════
 # تحميل المحتوى
@@ -171,16 +300,21 @@ logger.info(f"📚 المحتوى: {len(QUESTIONS)} سؤال، {len(CHALLENGES)}
 # ═══════════════════════════════════════════════════════════════
 # دوال مساعدة
 # ═══════════════════════════════════════════════════════════════
-def is_valid_command(text):
-    """التحقق من أن الرسالة أمر صالح"""
+def match_command(text):
+    """الأمر الذي تبدأ به الرسالة (None إذا لم تكن أمراً)"""
     if not text:
-        return False
+        return None
     text = text.strip()
     # تحقق من الأوامر الأساسية
     for cmd in VALID_COMMANDS:
         if text.startswith(cmd) or text == cmd:
-            return True
-    return False
+            return cmd
+    return None
+
+def is_exact_command(text):
+    """الرسالة أمر فقط بدون أي نص بعده (ما يُسمح بتسجيله كما هو في حركة Webhook)"""
+    text = (text or '').strip()
+    return text in VALID_COMMANDS or text in LEADERBOARD_COMMANDS
 
 def get_user_name(user_id):
     """الحصول على اسم المستخدم من Cache أو LINE"""
@@ -189,7 +323,7 @@ def get_user_name(user_id):
     
     try:
         profile = line_bot_api.get_profile(user_id)
-        name = profile.display_name
+        name = sys.intern(profile.display_name)  # نفس الكائن في الجدول والـ Cache
         names_cache[user_id] = name
         return name
     except LineBotApiError as e:
@@ -217,36 +351,53 @@ def check_rate_limit(user_id):
     return user_data['count'] <= MAX_MESSAGES_PER_MINUTE
 
 def get_or_create_user(user_id):
-    """الحصول على المستخدم أو إنشاؤه"""
+    """الحصول على المستخدم أو إنشاؤه (المستخدم غير النشط يُعاد من اللقطة إلى الذاكرة تلقائياً)"""
     if user_id not in db['users']:
         name = get_user_name(user_id)
         db['users'][user_id] = {
             'name': name,
             'points': 0,
-            'last_active': datetime.now().isoformat(),
+            'last_active': time.time(),
             'games_played': 0,
             'registered': False
         }
         save_db(db)
         logger.info(f"➕ مستخدم جديد: {name} ({user_id})")
-    else:
-        # تحديث آخر نشاط
-        db['users'][user_id]['last_active'] = datetime.now().isoformat()
-        # تحديث الاسم إذا تغير
-        new_name = get_user_name(user_id)
-        if new_name != db['users'][user_id]['name']:
-            db['users'][user_id]['name'] = new_name
-            save_db(db)
+        return db['users'][user_id]
+    
+    user = db['users'][user_id]
+    # تحديث آخر نشاط
+    user['last_active'] = time.time()
+    # تحديث الاسم إذا تغير
+    new_name = get_user_name(user_id)
+    if new_name != user['name']:
+        user['name'] = new_name
+        save_db(db)
     
-    return db['users'][user_id]
+    return user
 
 def update_user_points(user_id, points_change):
     """تحديث نقاط المستخدم"""
     user = get_or_create_user(user_id)
     user['points'] = max(0, user['points'] + points_change)
+    leaderboards().add(user_id, points_change)
     save_db(db)
     return user['points']
 
+def roster_key(room_id):
+    """مفتاح قائمة أعضاء الغرفة في القناة الحالية"""
+    return f"{channels.current().name}:{room_id}"
+
+def pick_members(room_id, count=1, exclude=None):
+    """[(user_id, name)] أعضاء عشوائيون من المجموعة، أو [] خارج المجموعات"""
+    if not room_id:
+        return []
+    return roster_service.pick(channels.current().api, roster_key(room_id), room_id, count, exclude)
+
+def leaderboards():
+    """لوحات الصدارة الموسمية للقناة الحالية"""
+    return Leaderboards(db.setdefault('leaderboards', {}), LEADERBOARD_HALF_LIFE_DAYS)
+
 def get_random_unused(items_list, used_key):
     """اختيار عنصر عشوائي لم يُستخدم مؤخراً"""
     if not items_list:
@@ -416,6 +567,7 @@ def get_help_flex():
                 {"type": "text", "text": "▫️ انسحب - إلغاء التسجيل", "size": "sm", "color": COLORS['text_secondary'], "wrap": True, "margin": "sm"},
                 {"type": "text", "text": "▫️ نقاطي - عرض نقاطك", "size": "sm", "color": COLORS['text_secondary'], "wrap": True, "margin": "sm"},
                 {"type": "text", "text": "▫️ الصدارة - أفضل اللاعبين", "size": "sm", "color": COLORS['text_secondary'], "wrap": True, "margin": "sm"},
+                {"type": "text", "text": "▫️ الصدارة الأسبوعية / الشهرية / النشاط", "size": "sm", "color": COLORS['text_secondary'], "wrap": True, "margin": "sm"},
                 {"type": "text", "text": "▫️ ايقاف - إيقاف اللعبة", "size": "sm", "color": COLORS['text_secondary'], "wrap": True, "margin": "sm"}
             ],
             "margin": "md"
@@ -559,11 +711,16 @@ def get_stats_flex(user_id):
     
     return create_flex_bubble("نقاطي", content, buttons, COLORS['primary'])
 
-def get_leaderboard_flex():
-    """بطاقة لوحة الصدارة"""
-    # ترتيب المستخدمين المسجلين حسب النقاط
-    registered_users = [(uid, u) for uid, u in db['users'].items() if u.get('registered', False)]
-    top_users = sorted(registered_users, key=lambda x: x[1]['points'], reverse=True)[:10]
+def get_leaderboard_flex(board=None):
+    """بطاقة لوحة الصدارة (board: week أو month أو decay، والافتراضي كل الأوقات)"""
+    if board is None:
+        # ترتيب المسجلين حسب النقاط من الذاكرة واللقطة معاً بدون تحميل غير النشطين
+        top_users = db['users'].top_registered(10)
+        title = "الصدارة"
+    else:
+        top_users = [(uid, (db['users'].peek(uid) or {}).get('name', 'لاعب'), points)
+                     for uid, points in leaderboards().top(board) if points > 0]
+        title = LEADERBOARD_TITLES[board]
     
     if not top_users:
         content = [
@@ -578,15 +735,15 @@ def get_leaderboard_flex():
         ]
     else:
         content = []
-        for i, (uid, user) in enumerate(top_users, 1):
+        for i, (uid, name, points) in enumerate(top_users, 1):
             medal = "🏆" if i == 1 else "🥇" if i == 2 else "▫️"
             content.append({
                 "type": "box",
                 "layout": "horizontal",
                 "contents": [
                     {"type": "text", "text": f"{medal} {i}", "size": "sm", "color": COLORS['text_secondary'], "flex": 0},
-                    {"type": "text", "text": user['name'], "size": "sm", "color": COLORS['text_primary'], "flex": 2},
-                    {"type": "text", "text": str(user['points']), "size": "sm", "color": COLORS['primary'], "align": "end", "weight": "bold", "flex": 1}
+                    {"type": "text", "text": name, "size": "sm", "color": COLORS['text_primary'], "flex": 2},
+                    {"type": "text", "text": str(points), "size": "sm", "color": COLORS['primary'], "align": "end", "weight": "bold", "flex": 1}
                 ],
                 "margin": "md" if i > 1 else "none"
             })
@@ -601,7 +758,7 @@ def get_leaderboard_flex():
         }
     ]
     
-    return create_flex_bubble("الصدارة", content, buttons, COLORS['primary'])
+    return create_flex_bubble(title, content, buttons, COLORS['primary'])
 
 def get_quick_reply_buttons():
     """أزرار الرد السريع الثابتة"""
@@ -622,16 +779,60 @@ def get_quick_reply_buttons():
 # ═══════════════════════════════════════════════════════════════
 # معالجة الرسائل الرئيسية
 # ═══════════════════════════════════════════════════════════════
+def new_outbox(event):
+    """صندوق رسائل الحدث - كل الردود تُرسل في reply_message واحد"""
+    room_id = getattr(event.source, 'group_id', None) or getattr(event.source, 'room_id', None)
+    channel = channels.current()
+    return Outbox(channel.api, event.reply_token, room_id or event.source.user_id, channel.push_queue)
+
+def asset_images(set_name):
+    """صور المجموعة بروابطها العامة، أو [] إذا لم يُضبط ASSETS_BASE_URL"""
+    if not ASSETS_BASE_URL:
+        return []
+    return [{'original': f"{ASSETS_BASE_URL}/assets/{image['original']}",
+             'preview': f"{ASSETS_BASE_URL}/assets/{image['preview']}"}
+            for image in asset_store.images(set_name)]
+
+def message_priority(event, command):
+    """فئة أولوية الرسالة، أو None للرسائل العادية التي لا تكلف شيئاً"""
+    if command is not None:
+        return COMMAND_PRIORITIES.get(command, NORMAL)
+    room_key = getattr(event.source, 'group_id', None) or getattr(event.source, 'room_id', None) or event.source.user_id
+    state = db['games'].get(room_key)
+    return CRITICAL if state and state.get('game_type') == 'أسرع' else None
+
 @handler.add(MessageEvent, message=TextMessage)
 def handle_message(event):
+    """قبول الرسالة حسب أولويتها والضغط الحالي، ثم معالجتها"""
+    command = match_command(event.message.text.strip())
+    # إجابات أسرع تنتظر نافذة الحكم عمداً، فلا تدخل في قياس زمن المعالجة
+    with admission.slot(message_priority(event, command), observe=command is not None) as admitted:
+        if admitted:
+            process_message(event)
+
+def process_message(event):
     """معالجة الرسائل - يستجيب فقط للأوامر"""
+    outbox = new_outbox(event)
     try:
         text = event.message.text.strip()
         user_id = event.source.user_id
         room_id = getattr(event.source, 'group_id', None) or getattr(event.source, 'room_id', None)
         
-        # تجاهل الرسائل التي ليست أوامر
-        if not is_valid_command(text):
+        # إجابات الألعاب الجارية (ليست أوامر)
+        room_key = room_id or user_id
+        if room_id:
+            roster_service.observe(roster_key(room_id), user_id)
+        command = match_command(text)
+        profiler.label(command or 'answer')
+        analytics.record(command, room_key, user_id)
+        if command is None:
+            state = db['games'].get(room_key)
+            if state and state.get('game_type') == 'أسرع' and check_rate_limit(user_id):
+                handle_fast_answer(event, outbox, room_key, user_id, text, state)
+            return
+        
+        # حماية الغرفة من الإغراق بنفس الأمر من عدة حسابات
+        if not flood_guard.allow(room_key, text):
             return
         
         # التحقق من Rate Limit
@@ -639,18 +840,22 @@ def handle_message(event):
             logger.warning(f"⚠️ تجاوز معدل الرسائل: {user_id}")
             return
         
+        # تسجيل المجموعة لاستقبال البث المجدول
+        if room_id:
+            room_registry.add(channels.current().name, room_id)
+        
         # تحديث بيانات المستخدم
         user = get_or_create_user(user_id)
         
         # ═══════════════ الأوامر الأساسية ═══════════════
         if text in ['البداية', 'بداية']:
             flex = FlexSendMessage(alt_text="البداية", contents=get_welcome_flex())
-            line_bot_api.reply_message(event.reply_token, flex)
+            outbox.add(flex)
             return
         
         elif text in ['مساعدة', 'المساعدة']:
             flex = FlexSendMessage(alt_text="مساعدة", contents=get_help_flex())
-            line_bot_api.reply_message(event.reply_token, flex)
+            outbox.add(flex)
             return
         
         elif text in ['انضم', 'تسجيل']:
@@ -674,9 +879,9 @@ def handle_message(event):
                         ]
                     )
                 )
-                line_bot_api.reply_message(event.reply_token, flex)
+                outbox.add(flex)
                 return
-            line_bot_api.reply_message(event.reply_token, msg)
+            outbox.add(msg)
             return
         
         elif text in ['انسحب', 'الغاء']:
@@ -698,97 +903,434 @@ def handle_message(event):
                         ]
                     )
                 )
-                line_bot_api.reply_message(event.reply_token, flex)
+                outbox.add(flex)
                 return
-            line_bot_api.reply_message(event.reply_token, msg)
+            outbox.add(msg)
             return
         
         elif text in ['نقاطي', 'نقاط']:
             flex = FlexSendMessage(alt_text="نقاطي", contents=get_stats_flex(user_id))
-            line_bot_api.reply_message(event.reply_token, flex)
+            outbox.add(flex)
             return
         
         elif text in ['الصدارة', 'صدارة']:
             flex = FlexSendMessage(alt_text="الصدارة", contents=get_leaderboard_flex())
-            line_bot_api.reply_message(event.reply_token, flex)
+            outbox.add(flex)
+            return
+        
+        elif text in LEADERBOARD_COMMANDS:
+            board = LEADERBOARD_COMMANDS[text]
+            flex = FlexSendMessage(alt_text=LEADERBOARD_TITLES[board], contents=get_leaderboard_flex(board))
+            outbox.add(flex)
             return
         
         # ═══════════════ ألعاب الترفيه (بدون نقاط) ═══════════════
         elif text in ['سؤال', 'سوال']:
             question = get_random_unused(QUESTIONS, 'questions_used')
             msg = TextMessage(text=f"▫️ {question}", quick_reply=get_quick_reply_buttons())
-            line_bot_api.reply_message(event.reply_token, msg)
+            outbox.add(msg)
             return
         
         elif text == 'تحدي':
             challenge = get_random_unused(CHALLENGES, 'challenges_used')
             msg = TextMessage(text=f"▫️ {challenge}", quick_reply=get_quick_reply_buttons())
-            line_bot_api.reply_message(event.reply_token, msg)
+            outbox.add(msg)
             return
         
         elif text == 'اعتراف':
             confession = get_random_unused(CONFESSIONS, 'confessions_used')
             msg = TextMessage(text=f"▫️ {confession}", quick_reply=get_quick_reply_buttons())
-            line_bot_api.reply_message(event.reply_token, msg)
+            outbox.add(msg)
             return
         
         elif text == 'منشن':
             mention = get_random_unused(MENTIONS, 'mentions_used')
+            picked = pick_members(room_id, exclude=user_id)
+            if picked:
+                mention = f"{mention}\n\n🎯 {picked[0][1]}"
             msg = TextMessage(text=f"▫️ {mention}", quick_reply=get_quick_reply_buttons())
-            line_bot_api.reply_message(event.reply_token, msg)
+            outbox.add(msg)
+            return
+        
+        elif text == 'توافق':
+            if not room_id:
+                msg = TextMessage(text="▫️ التوافق يعمل داخل المجموعات فقط", quick_reply=get_quick_reply_buttons())
+            else:
+                picked = pick_members(room_id, exclude=user_id)
+                if picked:
+                    partner = picked[0][1]
+                    score = CompatibilityGame(db).calculate_compatibility(user['name'], partner)
+                    msg = TextMessage(text=f"▫️ التوافق بين {user['name']} و {partner}\n\n{score}%",
+                                      quick_reply=get_quick_reply_buttons())
+                else:
+                    msg = TextMessage(text="▫️ لا يوجد أعضاء كافون في المجموعة بعد", quick_reply=get_quick_reply_buttons())
+            outbox.add(msg)
             return
         
         # ═══════════════ الألعاب التفاعلية ═══════════════
         # سيتم التعامل معها في ملفات الألعاب المنفصلة
-        elif text in ['أغنية', 'لعبة', 'سلسلة', 'أسرع', 'ضد', 'تكوين', 'اختلاف', 'توافق']:
+        elif text == 'أسرع':
+            game = FastAnswerGame(db)
+            question = game.start_game(FAST_QUESTIONS)
+            db['games'][room_key] = game.to_state()
+            db['stats']['total_games'] = db['stats'].get('total_games', 0) + 1
+            analytics.record_game()
+            save_db(db)
+            outbox.add(TextSendMessage(text=question))
+            return
+        
+        elif text == 'اختلاف':
+            state = db['games'].get(room_key)
+            if state and state.get('game_type') == 'اختلاف':
+                # لعبة جارية: الأمر نفسه ينتقل للصورة التالية
+                game = DifferenceGame.from_state(db, state)
+                round_text = game.next_image()
+            else:
+                images = asset_images('difference')
+                if not images:
+                    outbox.add(TextMessage(text="▫️ صور لعبة اختلاف غير متوفرة حالياً", quick_reply=get_quick_reply_buttons()))
+                    return
+                game = DifferenceGame(db)
+                round_text = game.start_game(images)
+                db['stats']['total_games'] = db['stats'].get('total_games', 0) + 1
+                analytics.record_game()
+            if game.finished():
+                db['games'].pop(room_key, None)
+                outbox.add(TextSendMessage(text=round_text, quick_reply=get_quick_reply_buttons()))
+            else:
+                db['games'][room_key] = game.to_state()
+                outbox.add(game.image_message(), TextSendMessage(text=f"{round_text}\n\n▫️ اكتب اختلاف للصورة التالية"))
+            save_db(db)
+            return
+        
+        elif text in ['أغنية', 'لعبة', 'سلسلة', 'ضد', 'تكوين']:
             # رسالة مؤقتة حتى يتم تطوير الألعاب
             msg = TextMessage(
                 text=f"▫️ لعبة {text} قيد التطوير\n\nاستخدم الأوامر الأخرى للتجربة!",
                 quick_reply=get_quick_reply_buttons()
             )
-            line_bot_api.reply_message(event.reply_token, msg)
+            outbox.add(msg)
             return
         
         elif text == 'ايقاف':
-            if room_id and room_id in db['games']:
-                del db['games'][room_id]
+            if room_key in db['games']:
+                del db['games'][room_key]
                 save_db(db)
                 msg = TextMessage(text="✓ تم إيقاف اللعبة")
-                line_bot_api.reply_message(event.reply_token, msg)
+                outbox.add(msg)
             return
         
     except Exception as e:
         logger.error(f"❌ خطأ في معالجة الرسالة: {e}", exc_info=True)
+    finally:
+        outbox.flush()
+
+@handler.add(JoinEvent)
+def handle_join(event):
+    """إضافة البوت لمجموعة - تسجيلها للبث"""
+    room_id = getattr(event.source, 'group_id', None) or getattr(event.source, 'room_id', None)
+    if room_id:
+        room_registry.add(channels.current().name, room_id, force=True)
+        logger.info(f"➕ انضمام لمجموعة: {room_id}")
+
+@handler.add(LeaveEvent)
+def handle_leave(event):
+    """خروج البوت من مجموعة"""
+    room_id = getattr(event.source, 'group_id', None) or getattr(event.source, 'room_id', None)
+    if room_id:
+        roster_service.drop(roster_key(room_id))
+    if room_id and room_registry.remove(channels.current().name, room_id):
+        logger.info(f"➖ مغادرة مجموعة: {room_id}")
+
+@handler.add(MemberJoinedEvent)
+def handle_member_joined(event):
+    """أعضاء جدد في المجموعة - تحديث قائمتها بدون إعادة الجلب"""
+    room_id = getattr(event.source, 'group_id', None) or getattr(event.source, 'room_id', None)
+    if room_id:
+        roster_service.joined(roster_key(room_id), [member.user_id for member in event.joined.members])
+
+@handler.add(MemberLeftEvent)
+def handle_member_left(event):
+    """أعضاء غادروا المجموعة"""
+    room_id = getattr(event.source, 'group_id', None) or getattr(event.source, 'room_id', None)
+    if room_id:
+        roster_service.left(roster_key(room_id), [member.user_id for member in event.left.members])
+
+# ═══════════════════════════════════════════════════════════════
+# البث المجدول
+# ═══════════════════════════════════════════════════════════════
+def render_broadcast(job):
+    """رسائل مهمة البث"""
+    if job['kind'] == 'question':
+        channel = channels.get(job.get('channel') or DEFAULT_CHANNEL) or default_channel
+        with channels.use(channel):
+            question = get_random_unused(QUESTIONS, 'questions_used')
+        return [TextSendMessage(text=f"▫️ سؤال اليوم\n\n{question}", quick_reply=get_quick_reply_buttons())]
+    if job.get('text'):
+        return [TextSendMessage(text=job['text'], quick_reply=get_quick_reply_buttons())]
+    return []
+
+def broadcast_api(name):
+    """عميل LINE الحالي للقناة وقت التنفيذ (يتبع إعادة تحميل القنوات و ASGI)"""
+    channel = channels.get(name)
+    return channel.api if channel is not None else None
+
+broadcaster = BroadcastScheduler(
+    JOBS_FILE, broadcast_api, render_broadcast, room_registry.rooms,
+    rate=BROADCAST_RATE, concurrency=BROADCAST_CONCURRENCY,
+    stub_api=StubLineApi(), dry_run=BROADCAST_DRY_RUN, default_channel=DEFAULT_CHANNEL
+)
+
+# ═══════════════════════════════════════════════════════════════
+# توجيه الأحداث بين العمال
+# ═══════════════════════════════════════════════════════════════
+def sign_body(body):
+    """توقيع جسم Webhook بسر القناة (لإعادة التوزيع داخلياً)"""
+    digest = hmac.new(LINE_SECRET.encode('utf-8'), body.encode('utf-8'), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('utf-8')
+
+def event_room_key(event):
+    """مفتاح التوجيه: المجموعة أو الغرفة أو المستخدم في المحادثة الفردية"""
+    source = event.get('source') or {}
+    return source.get('groupId') or source.get('roomId') or source.get('userId') or ''
+
+def handle_event_body(body):
+    """معالجة جسم Webhook محلياً"""
+    with profiler.task('event'):
+        handler.handle(body, sign_body(body))
+
+def handle_routed(payload):
+    """حدث محوّل من عامل آخر: اسم القناة ثم سطر جديد ثم جسم Webhook"""
+    name, body = payload.decode('utf-8').split('\n', 1)
+    if name == CONTROL_CHANNEL:
+        handle_control(json.loads(body))
+        return
+    channel = channels.get(name)
+    if channel is None:
+        logger.warning(f"⚠️ حدث محوّل لقناة غير معروفة: {name}")
+        return
+    with lifecycle.track(), channels.use(channel):
+        handle_event_body(body)
+
+def is_duplicate_event(event):
+    """هل سبقت معالجة هذا الحدث (إعادة إرسال من LINE)؟"""
+    key = event.get('webhookEventId') or event.get('replyToken')
+    if not key:
+        return False
+    redelivery = (event.get('deliveryContext') or {}).get('isRedelivery', False)
+    return seen_events.seen(key, redelivery)
+
+def dispatch_event(channel, destination, event):
+    """إرسال الحدث لعامل الغرفة المالك أو معالجته هنا"""
+    if is_duplicate_event(event):
+        logger.info(f"♻️ تجاهل حدث مكرر: {event.get('webhookEventId')}")
+        return
+    body = json.dumps({'destination': destination, 'events': [event]}, ensure_ascii=False)
+    key = f"{channel.name}:{event_room_key(event)}"
+    if ROOM_ROUTING and room_router.route(key, f"{channel.name}\n{body}".encode('utf-8')):
+        return
+    with channels.use(channel):
+        handle_event_body(body)
+
+def handle_control(message):
+    """رسالة تحكم من عامل آخر"""
+    action = message.get('action')
+    if action == 'profile':
+        try:
+            samples = profiler.run(message['seconds'], message['interval'])
+        except RuntimeError as e:
+            logger.warning(f"⚠️ {e}")
+            return
+        write_control_result(message['id'], 'txt', format_collapsed(samples))
+    elif action == 'stats':
+        result = analytics.query(message['from'], message['to'], message['resolution'], message['top'])
+        write_control_result(message['id'], 'json', json.dumps(result))
+
+def write_control_result(request_id, ext, text):
+    """نتيجة رسالة تحكم يقرأها العامل الذي أرسلها"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{request_id}-{os.getpid()}.{ext}")
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(f"{path}.tmp", path)
+
+def collect_control_results(request_id, workers, ext, timeout=5):
+    """انتظار نتائج رسالة تحكم من العمال، ويرجع ({pid: text}, من لم يرد)"""
+    pending = {pid: os.path.join(PROFILE_DIR, f"{request_id}-{pid}.{ext}") for pid in workers}
+    results = {}
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        for pid, path in list(pending.items()):
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    results[pid] = f.read()
+                os.unlink(path)
+                del pending[pid]
+        if pending:
+            time.sleep(0.1)
+    if pending:
+        logger.warning(f"⚠️ لم تصل نتائج رسالة التحكم من العمال: {list(pending)}")
+    return results, list(pending)
+
+CONTROL_CHANNEL = '@control'  # ليس اسم قناة صالحاً، فلا يتعارض مع الأحداث
+room_router = RoomRouter(ROOM_ROUTER_DIR, handle_routed, ROOM_ROUTER_KEY)
+profiler = SamplingProfiler()
+recorder = TrafficRecorder(TRAFFIC_RECORD_DIR, TRAFFIC_RECORD_KEY, keep_text=is_exact_command) if TRAFFIC_RECORD_DIR else None
+seen_events = SeenFilter(DEDUP_FILE, window=DEDUP_WINDOW_SECONDS)
+
+def handle_fast_answer(event, outbox, room_key, user_id, text, state):
+    """إجابة في لعبة أسرع: الفائز يُحدد بـ timestamp الحدث عبر كل العمال"""
+    game = FastAnswerGame.from_state(db, state)
+    if not game.is_correct(text):
+        return
+    
+    room = f"{channels.current().name}:{room_key}"
+    winner, award = answer_arbiter.submit(room, game.round_id, user_id, event.timestamp)
+    if not award:
+        return
+    
+    current = db['games'].get(room_key)
+    if current and current.get('round') == game.round_id:
+        del db['games'][room_key]
+    points = update_user_points(winner, POINTS_CORRECT)
+    name = get_or_create_user(winner)['name']
+    outbox.add(TextSendMessage(
+        text=f"⚡ {name} أسرع إجابة صحيحة!\n\n✓ {game.answer}\n▫️ +{POINTS_CORRECT} نقاط (المجموع: {points})",
+        quick_reply=get_quick_reply_buttons()
+    ))
+
+answer_arbiter = AnswerArbiter(ARBITER_FILE, window=ARBITER_WINDOW_MS / 1000)
+analytics = Analytics()  # لكل عامل (الغرفة الواحدة تبقى على عاملها مع ROOM_ROUTING)
 
 # ═══════════════════════════════════════════════════════════════
 # نظام التنظيف التلقائي
 # ═══════════════════════════════════════════════════════════════
+def demote_idle_users(cutoff_ts):
+    """نقل غير النشطين منذ cutoff_ts من الذاكرة إلى لقطة القرص في كل القنوات المحمّلة"""
+    demoted = 0
+    for channel in channels.all():
+        if not channel.loaded:
+            continue
+        with channels.use(channel):
+            if not save_db(db):  # الحفظ أولاً: لا يخرج من الذاكرة إلا ما وصل للقرص
+                continue
+            idle = db['users'].demote(cutoff_ts)
+            for user_id in idle:
+                names_cache.pop(user_id, None)
+            if idle:
+                logger.info(f"🧊 نقل {len(idle)} مستخدم غير نشط إلى القرص [{channel.name}]")
+            demoted += len(idle)
+    return demoted
+
+cleanup_pid = None  # العامل الذي بدأ حلقة التنظيف (تُعاد بعد fork)
+
+def start_cleanup():
+    """تشغيل حلقة التنظيف مرة واحدة لكل عامل"""
+    global cleanup_pid
+    if cleanup_pid == os.getpid():
+        return
+    cleanup_pid = os.getpid()
+    Thread(target=cleanup_inactive_users, daemon=True).start()
+    logger.info("✅ تم تشغيل نظام التنظيف التلقائي")
+
 def cleanup_inactive_users():
-    """حذف المستخدمين غير النشطين"""
+    """نقل المستخدمين غير النشطين إلى القرص (نقاطهم تبقى وتعود مع أول رسالة)"""
     while True:
         try:
             time.sleep(86400)  # كل 24 ساعة
-            
-            cutoff_date = datetime.now() - timedelta(days=CLEANUP_DAYS)
-            removed = 0
-            
-            for user_id in list(db['users'].keys()):
-                user = db['users'][user_id]
-                last_active = datetime.fromisoformat(user['last_active'])
-                
-                if last_active < cutoff_date:
-                    del db['users'][user_id]
-                    if user_id in names_cache:
-                        del names_cache[user_id]
-                    removed += 1
-            
-            if removed > 0:
-                save_db(db)
-                logger.info(f"🧹 تم حذف {removed} مستخدم غير نشط")
-        
+            demote_idle_users((datetime.now() - timedelta(days=HOT_USER_DAYS)).timestamp())
         except Exception as e:
             logger.error(f"❌ خطأ في التنظيف: {e}")
 
+# ═══════════════════════════════════════════════════════════════
+# مراقبة الذاكرة
+# ═══════════════════════════════════════════════════════════════
+def loaded_channels():
+    return [channel for channel in channels.all() if channel.loaded]
+
+def shrink_names_cache():
+    """حذف النصف الأقدم من cache الأسماء"""
+    oldest = list(names_cache)[:len(names_cache) // 2]
+    for user_id in oldest:
+        names_cache.pop(user_id, None)
+    return len(oldest)
+
+def shrink_rate_limit_cache():
+    """حذف عدادات السبام المنتهية"""
+    now = datetime.now()
+    expired = [user_id for user_id, data in list(rate_limit_cache.items()) if data['reset_at'] < now]
+    for user_id in expired:
+        rate_limit_cache.pop(user_id, None)
+    return len(expired)
+
+def shrink_stale_games():
+    """حذف الألعاب المتروكة من كل القنوات المحمّلة"""
+    cutoff = datetime.now() - timedelta(hours=STALE_GAME_HOURS)
+    removed = 0
+    for channel in loaded_channels():
+        with channels.use(channel):
+            stale = [room for room, state in list(db['games'].items())
+                     if datetime.fromisoformat(state.get('started_at', datetime.now().isoformat())) < cutoff]
+            for room in stale:
+                db['games'].pop(room, None)
+            if stale:
+                save_db(db)
+            removed += len(stale)
+    return removed
+
+memory_watchdog = MemoryWatchdog(MEMORY_SOFT_LIMIT_MB, MEMORY_CHECK_SECONDS)
+memory_watchdog.register('names_cache', lambda: len(names_cache), shrink_names_cache)
+memory_watchdog.register('rate_limit_cache', lambda: len(rate_limit_cache), shrink_rate_limit_cache)
+memory_watchdog.register('games', lambda: sum(len(ch.db['games']) for ch in loaded_channels()), shrink_stale_games)
+memory_watchdog.register('users_loaded', lambda: sum(ch.db['users'].loaded_count() for ch in loaded_channels()),
+                         lambda: demote_idle_users(time.time() - 86400))  # تحت الضغط: كل من لم ينشط اليوم
+memory_watchdog.register('users_total', lambda: sum(len(ch.db['users']) for ch in loaded_channels()))
+memory_watchdog.register('season_players', lambda: sum(
+    len(board) for ch in loaded_channels() for board in ch.db.get('leaderboards', {}).get('boards', {}).values()))
+memory_watchdog.register('channels', lambda: len(channels.all()))
+memory_watchdog.register('roster_members', lambda: roster_service.status()['members'], roster_service.prune)
+memory_watchdog.register('asset_cache', lambda: len(asset_store), asset_store.clear)
+
+# ═══════════════════════════════════════════════════════════════
+# الإيقاف المنظم (SIGTERM)
+# ═══════════════════════════════════════════════════════════════
+def flush_push_queues():
+    for channel in loaded_channels():
+        channel.push_queue.flush()
+
+def save_all_channels():
+    """حفظ كل القنوات المحمّلة - الألعاب النشطة في db['games'] فيكملها العامل التالي"""
+    for channel in loaded_channels():
+        with channels.use(channel):
+            save_db(db)
+
+def handoff_state():
+    """ما يحتاجه العامل التالي: القنوات التي فيها ألعاب نشطة، وآخر العدادات"""
+    return {
+        'games': {channel.name: list(channel.db['games']) for channel in loaded_channels() if channel.db['games']},
+        'metrics': {
+            'channels': channels_status(),
+            'router': room_router.stats,
+            'dedup': seen_events.stats,
+            'flood': flood_guard.status(),
+            'arbiter': answer_arbiter.stats
+        }
+    }
+
+def resume_handoff(reports):
+    """تحميل قنوات الألعاب النشطة قبل وصول أحداثها"""
+    for name in {name for report in reports for name in report.get('games', {})}:
+        channel = channels.get(name)
+        if channel is not None:
+            channel.db
+
+lifecycle = Lifecycle(HANDOFF_DIR, DRAIN_SECONDS, handoff=handoff_state, resume=resume_handoff)
+lifecycle.register('room_router', room_router.stop, phase='stop')  # العمال الآخرون يعالجون غرفنا محلياً
+lifecycle.register('push_queues', flush_push_queues)
+lifecycle.register('save_db', save_all_channels)
+if recorder is not None:
+    lifecycle.register('recorder', recorder.close)
+
 # ═══════════════════════════════════════════════════════════════
 # Routes
 # ═══════════════════════════════════════════════════════════════
@@ -887,7 +1429,7 @@ def home():
                 </div>
                 <div class="stat-item">
                     <span class="stat-label">▫️ المسجلين</span>
-                    <span class="stat-value">{sum(1 for u in db['users'].values() if u.get('registered'))}</span>
+                    <span class="stat-value">{db['users'].count_registered()}</span>
                 </div>
                 <div class="stat-item">
                     <span class="stat-label">▫️ الألعاب النشطة</span>
@@ -907,6 +1449,13 @@ def home():
     </html>
     """
 
+def channels_status():
+    """حالة وإحصائيات كل قناة"""
+    return {
+        channel.name: dict(channel.metrics, loaded=channel.loaded, push_queue=channel.push_queue.stats)
+        for channel in channels.all()
+    }
+
 @app.route("/health", methods=['GET'])
 def health():
     """فحص صحة السيرفر"""
@@ -915,24 +1464,77 @@ def health():
         "version": VERSION,
         "timestamp": datetime.now().isoformat(),
         "users": len(db['users']),
-        "registered": sum(1 for u in db['users'].values() if u.get('registered')),
-        "active_games": len(db['games'])
+        "registered": db['users'].count_registered(),
+        "user_tiers": db['users'].tier_status(),
+        "active_games": len(db['games']),
+        "router": room_router.stats,
+        "dedup": seen_events.stats,
+        "channels": channels_status(),
+        "arbiter": answer_arbiter.stats,
+        "flood": flood_guard.status(),
+        "recorder": recorder.stats if recorder is not None else None,
+        "lifecycle": lifecycle.stats,
+        "roster": roster_service.status(),
+        "admission": admission.status(),
+        "assets": asset_store.status()
     }), 200
 
+def start_background():
+    """خيوط العامل الحالي (آمنة للاستدعاء مع كل طلب وبعد fork)"""
+    if ROOM_ROUTING:
+        room_router.start()
+    broadcaster.start()
+    memory_watchdog.start()
+    start_cleanup()
+    lifecycle.start()
+
+def process_webhook(channel, body, arrived_at):
+    """معالجة جسم Webhook بعد التحقق من توقيعه (مشتركة مع asgi.py)"""
+    with lifecycle.track():
+        try:
+            payload = json.loads(body)
+            if recorder is not None:
+                recorder.record(channel.name, payload, arrived_at)
+        except Exception as e:
+            logger.error(f"❌ خطأ في Callback: {e}")
+            return
+        for event in payload.get('events', []):
+            if not channel.allow():
+                logger.warning(f"⚠️ تجاوز حد معدل القناة: {channel.name}")
+                continue
+            try:
+                dispatch_event(channel, payload.get('destination'), event)
+            except Exception as e:
+                # خطأ حدث واحد لا يُسقط بقية أحداث الطلب (وقد سُجّلت كمعالجة في فلتر التكرار)
+                logger.error(f"❌ خطأ في معالجة حدث: {e}")
+
+@app.route("/assets/<name>", methods=['GET'])
+def serve_asset(name):
+    """صور الألعاب بأسماء محتواها - LINE يجلبها عند عرض الرسالة"""
+    response = asset_store.response(name, request)
+    if response is None:
+        abort(404)
+    return response
+
 @app.route("/callback", methods=['POST'])
-def callback():
+@app.route("/callback/<channel_name>", methods=['POST'])
+def callback(channel_name=DEFAULT_CHANNEL):
     """Webhook LINE"""
+    arrived_at = time.time()
+    channel = channels.get(channel_name)
+    if channel is None:
+        abort(404)
+    
     signature = request.headers.get('X-Line-Signature', '')
     body = request.get_data(as_text=True)
     
-    try:
-        handler.handle(body, signature)
-    except InvalidSignatureError:
-        logger.error("❌ توقيع LINE غير صالح")
+    if not channel.validator.validate(body, signature):
+        channel.metrics['invalid_signature'] += 1
+        logger.error(f"❌ توقيع LINE غير صالح [{channel.name}]")
         abort(400)
-    except Exception as e:
-        logger.error(f"❌ خطأ في Callback: {e}")
     
+    start_background()
+    process_webhook(channel, body, arrived_at)
     return 'OK'
 
 @app.route("/admin/reload", methods=['POST'])
@@ -948,12 +1550,258 @@ def admin_reload():
         CHALLENGES = load_content('challenges.txt')
         CONFESSIONS = load_content('confessions.txt')
         MENTIONS = load_content('mentions.txt')
+        asset_store.reload()
         logger.info("✅ تم إعادة تحميل المحتوى")
         return jsonify({"status": "reloaded"}), 200
     except Exception as e:
         logger.error(f"❌ خطأ في إعادة التحميل: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/admin/channels", methods=['GET', 'POST'])
+def admin_channels():
+    """عرض القنوات (GET) أو إعادة تحميل ملف القنوات فوراً (POST) - Admin فقط"""
+    token = request.headers.get('X-Admin-Token', '')
+    if token != ADMIN_TOKEN:
+        abort(403)
+    
+    if request.method == 'POST':
+        channels.reload(force=True)
+    return jsonify(channels_status()), 200
+
+@app.route("/admin/stats", methods=['GET'])
+def admin_stats():
+    """إحصائيات الاستخدام لفترة زمنية مجمّعة من كل العمال (Admin فقط)
+
+    ?from=epoch&to=epoch&resolution=60|3600|86400&top=10&scope=all|worker
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if token != ADMIN_TOKEN:
+        abort(403)
+    
+    start = request.args.get('from', type=float)
+    end = request.args.get('to', type=float)
+    resolution = request.args.get('resolution', type=int)
+    top = max(1, min(request.args.get('top', 10, type=int), 100))
+    if start is not None and end is not None and start >= end:
+        return jsonify({"error": "from يجب أن يكون قبل to"}), 400
+    
+    result = analytics.query(start, end, resolution, top)
+    workers = []
+    if request.args.get('scope', 'all') == 'all' and ROOM_ROUTING:
+        # نفس الفترة والدقة في كل العمال حتى تتطابق الحاويات عند الدمج
+        room_router.start()
+        request_id = uuid.uuid4().hex[:12]
+        message = {'action': 'stats', 'id': request_id, 'from': result['from'], 'to': result['to'],
+                   'resolution': result['resolution'], 'top': top}
+        workers = room_router.broadcast(f"{CONTROL_CHANNEL}\n{json.dumps(message)}".encode('utf-8'))
+    if workers:
+        results, _ = collect_control_results(request_id, workers, 'json')
+        result = merge_queries([result] + [json.loads(text) for text in results.values()], top)
+        result['workers'] = [os.getpid()] + list(results)
+    else:
+        result['workers'] = [os.getpid()]
+    result['all_time'] = db['stats']
+    return jsonify(result), 200
+
+@app.route("/admin/export", methods=['GET'])
+def admin_export():
+    """تصدير المستخدمين والألعاب والمحتوى المستخدم بصيغة NDJSON متدفقة (Admin فقط)
+
+    ?channel=<name> (الافتراضية إذا لم تُحدد)
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if token != ADMIN_TOKEN:
+        abort(403)
+    
+    channel = channels.get(request.args.get('channel', DEFAULT_CHANNEL))
+    if channel is None:
+        abort(404)
+    
+    filename = f"{os.path.splitext(channel.db_file)[0]}_{datetime.now():%Y%m%d_%H%M%S}.ndjson"
+    logger.info(f"📤 تصدير بيانات القناة {channel.name}")
+    return Response(
+        export_lines(channel.db, channel.name, room_registry.items(channel.name)),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@app.route("/admin/import", methods=['POST'])
+def admin_import():
+    """استيراد NDJSON بالتدريج ودمجه مع البيانات الحالية (Admin فقط)
+
+    ?channel=<name>&dry_run=1 للتحقق فقط بدون تطبيق
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if token != ADMIN_TOKEN:
+        abort(403)
+    
+    channel = channels.get(request.args.get('channel', DEFAULT_CHANNEL))
+    if channel is None:
+        abort(404)
+    
+    def persist(user_ids):
+        """حفظ الدفعة ثم إخراج مستخدميها إلى اللقطة حتى لا يبقى الملف كله في الذاكرة"""
+        with channels.use(channel):
+            if save_db(db):
+                db['users'].demote(user_ids=user_ids)
+    
+    importer = Importer(channel.db, dry_run=request.args.get('dry_run') == '1', persist=persist,
+                        add_rooms=lambda rooms: room_registry.add_many(channel.name, rooms))
+    for line in request.stream:
+        importer.feed(line)
+    result = importer.finish()
+    
+    logger.info(f"📥 استيراد [{channel.name}]: {result['imported']}، مرفوض {result['rejected']}")
+    return jsonify(result), 200
+
+@app.route("/admin/leaderboard", methods=['GET'])
+def admin_leaderboard():
+    """لوحات الصدارة الموسمية والمؤرشفة (Admin فقط)
+
+    ?board=week|month|decay|<season_id>&top=10&channel=<name>
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if token != ADMIN_TOKEN:
+        abort(403)
+    
+    channel = channels.get(request.args.get('channel', DEFAULT_CHANNEL))
+    if channel is None:
+        abort(404)
+    
+    with channels.use(channel):
+        boards = leaderboards()
+        board = request.args.get('board')
+        if not board:
+            return jsonify(boards.seasons()), 200
+        top = boards.top(board, max(1, min(request.args.get('top', 10, type=int), 100)))
+        if top is None:
+            return jsonify({"error": "الموسم غير موجود"}), 404
+        users = db['users']
+        return jsonify({
+            "board": board,
+            "top": [{"id": uid, "name": (users.peek(uid) or {}).get('name', 'لاعب'), "points": points}
+                    for uid, points in top]
+        }), 200
+
+@app.route("/admin/profile", methods=['POST'])
+def admin_profile():
+    """تحليل أداء إحصائي لمدة ثوانٍ محددة، والنتيجة collapsed stacks لأدوات flame graph (Admin فقط)
+
+    ?seconds=10&interval_ms=10&scope=worker|all
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if token != ADMIN_TOKEN:
+        abort(403)
+    
+    seconds = request.args.get('seconds', 10, type=float)
+    interval_ms = request.args.get('interval_ms', 10, type=float)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 1 <= interval_ms <= 1000:
+        return jsonify({"error": f"seconds بين 0 و {MAX_PROFILE_SECONDS}، و interval_ms بين 1 و 1000"}), 400
+    if profiler.active:
+        return jsonify({"error": "الـ profiler يعمل بالفعل"}), 409
+    
+    request_id = uuid.uuid4().hex[:12]
+    workers = []
+    if request.args.get('scope') == 'all' and ROOM_ROUTING:
+        room_router.start()
+        message = {'action': 'profile', 'id': request_id, 'seconds': seconds, 'interval': interval_ms / 1000}
+        workers = room_router.broadcast(f"{CONTROL_CHANNEL}\n{json.dumps(message)}".encode('utf-8'))
+    
+    logger.info(f"🔬 تحليل الأداء لمدة {seconds}s في {len(workers) + 1} عامل")
+    try:
+        samples = profiler.run(seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    
+    # انتظار نتائج بقية العمال
+    results, pending = collect_control_results(request_id, workers, 'txt')
+    for text in results.values():
+        parse_collapsed(text, samples)
+    
+    return Response(format_collapsed(samples), mimetype='text/plain', headers={
+        'X-Profile-Workers': str(len(results) + 1),
+        'X-Profile-Samples': str(profiler.stats['samples'])
+    })
+
+@app.route("/admin/memory", methods=['GET'])
+def admin_memory():
+    """الذاكرة الحالية وأحجام الـ caches في هذا العامل (Admin فقط)"""
+    token = request.headers.get('X-Admin-Token', '')
+    if token != ADMIN_TOKEN:
+        abort(403)
+    
+    return jsonify(dict(memory_watchdog.status(), worker=os.getpid())), 200
+
+@app.route("/admin/memory/snapshot", methods=['POST', 'DELETE'])
+def admin_memory_snapshot():
+    """لقطة tracemalloc: أول POST يبدأ التتبع، وكل POST بعده يرجع أكثر المواضع نمواً، و DELETE يوقفه (Admin فقط)
+
+    ?top=20&frames=1
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if token != ADMIN_TOKEN:
+        abort(403)
+    
+    if request.method == 'DELETE':
+        memory_watchdog.stop_tracing()
+        return jsonify({"status": "stopped"}), 200
+    top = max(1, min(request.args.get('top', 20, type=int), 100))
+    frames = max(1, min(request.args.get('frames', 1, type=int), 25))
+    return jsonify(dict(memory_watchdog.snapshot_diff(top, frames), worker=os.getpid())), 200
+
+@app.route("/admin/memory/shrink", methods=['POST'])
+def admin_memory_shrink():
+    """تقليص الـ caches فوراً (Admin فقط)"""
+    token = request.headers.get('X-Admin-Token', '')
+    if token != ADMIN_TOKEN:
+        abort(403)
+    
+    return jsonify({"freed": memory_watchdog.shrink(), "memory": memory_watchdog.status()}), 200
+
+@app.route("/admin/broadcast", methods=['GET', 'POST'])
+def admin_broadcast():
+    """إدارة البث المجدول (Admin فقط)
+
+    POST: {"kind": "question"|"text", "text": "...", "run_at": epoch,
+           "repeat_seconds": 86400, "targets": "all"|[ids], "dry_run": false, "channel": "default"}
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if token != ADMIN_TOKEN:
+        abort(403)
+    
+    if request.method == 'GET':
+        return jsonify({"jobs": broadcaster.list_jobs(), "stats": broadcaster.stats, "quota": broadcaster.quota}), 200
+    
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind', 'text')
+    if kind not in ('question', 'text') or (kind == 'text' and not data.get('text')):
+        return jsonify({"error": "kind يجب أن يكون question أو text مع نص"}), 400
+    targets = data.get('targets', 'all')
+    if targets != 'all' and not isinstance(targets, list):
+        return jsonify({"error": "targets يجب أن يكون all أو قائمة"}), 400
+    channel = channels.get(data.get('channel', DEFAULT_CHANNEL))
+    if channel is None:
+        return jsonify({"error": "القناة غير موجودة"}), 404
+    
+    job = broadcaster.add_job(
+        kind=kind, text=data.get('text', ''), run_at=data.get('run_at'),
+        repeat_seconds=data.get('repeat_seconds'), targets=targets, dry_run=data.get('dry_run', False),
+        channel=channel.name
+    )
+    broadcaster.start()
+    return jsonify(job), 201
+
+@app.route("/admin/broadcast/<job_id>", methods=['DELETE'])
+def admin_broadcast_cancel(job_id):
+    """إلغاء مهمة بث (Admin فقط)"""
+    token = request.headers.get('X-Admin-Token', '')
+    if token != ADMIN_TOKEN:
+        abort(403)
+    
+    if not broadcaster.cancel_job(job_id):
+        return jsonify({"error": "المهمة غير موجودة"}), 404
+    return jsonify({"status": "cancelled"}), 200
+
 # ═══════════════════════════════════════════════════════════════
 # تشغيل البوت
 # ═══════════════════════════════════════════════════════════════
@@ -964,9 +1812,8 @@ if __name__ == "__main__":
     print("═"*70 + "\n")
     
     # تشغيل نظام التنظيف
-    cleanup_thread = Thread(target=cleanup_inactive_users, daemon=True)
-    cleanup_thread.start()
-    logger.info("✅ تم تشغيل نظام التنظيف التلقائي")
+    start_cleanup()
+    lifecycle.start()
     
     # تشغيل السيرفر
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,123 @@
+"""
+تحكيم أسرع إجابة - الفائز هو صاحب أقدم timestamp من LINE وليس أول من وصل للعامل
+كل جولة تجمع الإجابات الصحيحة لفترة قصيرة ثم تثبت الفائز بعملية CAS ذرية في SQLite مشترك
+"""
+
+import os
+import time
+import sqlite3
+import logging
+from threading import Lock, Event
+
+logger = logging.getLogger("whale-bot")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS winners (
+    room TEXT NOT NULL,
+    round TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    closes_at REAL NOT NULL,
+    awarded INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (room, round)
+)
+"""
+
+# يستبدل الفائز فقط إذا كانت الجولة لم تُحسم والمرشح الجديد أسبق (أو نفس الوقت بمعرف أصغر)
+UPSERT = """
+INSERT INTO winners (room, round, user_id, ts, closes_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (room, round) DO UPDATE SET user_id = excluded.user_id, ts = excluded.ts
+WHERE winners.awarded = 0 AND (excluded.ts < winners.ts
+    OR (excluded.ts = winners.ts AND excluded.user_id < winners.user_id))
+"""
+
+
+class _Round:
+    """مرشحو جولة واحدة داخل هذا العامل"""
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.best = None  # (timestamp, user_id)
+        self.candidates = 0
+        self.winner = None
+        self.done = Event()
+
+    def offer(self, timestamp, user_id):
+        self.candidates += 1
+        if self.best is None or (timestamp, user_id) < self.best:
+            self.best = (timestamp, user_id)
+
+
+class AnswerArbiter:
+    """اختيار فائز واحد عادل لكل جولة عبر كل العمال
+
+    الزمن الإضافي على الرد محدود بـ window + grace
+    """
+
+    def __init__(self, path, window=0.3, grace=0.1, retention=86400):
+        self.path = path
+        self.window = window
+        self.grace = grace
+        self.retention = retention
+        self.stats = {'rounds': 0, 'candidates': 0, 'awarded': 0, 'contested': 0}
+        self._rounds = {}  # {(room, round): _Round}
+        self._lock = Lock()
+        self._conn = None
+        self._pid = None
+
+    def _db(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(SCHEMA)
+            self._conn.execute("DELETE FROM winners WHERE closes_at < ?", (time.time() - self.retention,))
+        return self._conn
+
+    def submit(self, room, round_id, user_id, timestamp):
+        """تقديم إجابة صحيحة، يرجع (الفائز، هل على هذا المستدعي منح النقاط)"""
+        key = (room, round_id)
+        with self._lock:
+            state = self._rounds.get(key)
+            closer = state is None
+            if closer:
+                state = self._rounds[key] = _Round(time.monotonic() + self.window)
+            state.offer(timestamp, user_id)
+            self.stats['candidates'] += 1
+        if not closer:
+            state.done.wait(self.window + self.grace + 5)
+            return state.winner, False
+
+        try:
+            time.sleep(max(0.0, state.deadline - time.monotonic()))
+            with self._lock:
+                self._rounds.pop(key, None)
+                best = state.best
+                if state.candidates > 1:
+                    self.stats['contested'] += 1
+            winner, award = self._commit(room, round_id, best)
+            state.winner = winner
+        finally:
+            state.done.set()
+        self.stats['rounds'] += 1
+        if award:
+            self.stats['awarded'] += 1
+        return winner, award
+
+    def _commit(self, room, round_id, best):
+        """تثبيت أفضل مرشح محلي ثم انتظار إغلاق الجولة ومحاولة حجز المنح"""
+        timestamp, user_id = best
+        with self._lock:
+            conn = self._db()
+            conn.execute(UPSERT, (room, round_id, user_id, timestamp, time.time() + self.grace))
+            (closes_at,) = conn.execute(
+                "SELECT closes_at FROM winners WHERE room = ? AND round = ?", (room, round_id)).fetchone()
+        time.sleep(max(0.0, closes_at - time.time()))
+        with self._lock:
+            conn = self._db()
+            claimed = conn.execute(
+                "UPDATE winners SET awarded = 1 WHERE room = ? AND round = ? AND awarded = 0",
+                (room, round_id)).rowcount == 1
+            (winner,) = conn.execute(
+                "SELECT user_id FROM winners WHERE room = ? AND round = ?", (room, round_id)).fetchone()
+        return winner, claimed
@@ -0,0 +1,258 @@
+"""
+نقطة دخول ASGI - بديل لـ app:app تحت gevent بنفس المعالجات
+
+- استدعاءات LINE تمر عبر AsyncLineBotApi وجلسة aiohttp واحدة لكل عامل:
+  الإرسال (reply/push/multicast) يُجدول على حلقة الأحداث بدون انتظار، والقراءة (get_profile...) تنتظر نتيجتها
+- المعالجات نفسها (متزامنة) تعمل في ThreadPoolExecutor، ومعها حفظ DB وقراءة ملف القنوات وتسجيل الحركة
+- كتابة السجلات تنتقل لخيط QueueListener فلا تحجز حلقة الأحداث
+- بقية المسارات (/health و /admin/...) تُخدم من تطبيق Flask نفسه داخل الـ executor،
+  وجسم الطلب يُقرأ من ASGI عند الحاجة فيبقى /admin/import متدفقاً
+
+الاستخدام:
+    uvicorn asgi:application --workers 4 --host 0.0.0.0 --port $PORT
+"""
+
+import io
+import os
+import time
+import queue
+import asyncio
+import logging
+import logging.handlers
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from linebot import AsyncLineBotApi
+from linebot.aiohttp_async_http_client import AiohttpAsyncHttpClient
+from linebot.exceptions import LineBotApiError
+
+import app as bot
+
+logger = logging.getLogger("whale-bot")
+
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 32))  # حجم الـ executor للمعالجات المتزامنة
+LINE_API_TIMEOUT = 5
+FIRE_AND_FORGET = ('reply_message', 'push_message', 'multicast', 'broadcast')
+
+
+def move_logging_off_loop():
+    """كل handlers الجذر تعمل من خيط واحد عبر طابور"""
+    root = logging.getLogger()
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
+
+class LoopApi:
+    """واجهة LineBotApi متزامنة فوق AsyncLineBotApi - للمعالجات التي تعمل في خيوط الـ executor"""
+
+    def __init__(self, async_api, loop, pending, timeout=LINE_API_TIMEOUT):
+        self.async_api = async_api
+        self.loop = loop
+        self.pending = pending  # الإرسال الجاري (ينتظره الإيقاف)
+        self.timeout = timeout
+
+    def __getattr__(self, name):
+        method = getattr(self.async_api, name)
+
+        def call(*args, **kwargs):
+            future = asyncio.run_coroutine_threadsafe(method(*args, **kwargs), self.loop)
+            if name in FIRE_AND_FORGET:
+                self.pending.add(future)
+                future.add_done_callback(self._report)
+                return None
+            return future.result(self.timeout)
+
+        return call
+
+    def _report(self, future):
+        self.pending.discard(future)
+        error = future.exception()
+        if isinstance(error, LineBotApiError):
+            logger.warning(f"⚠️ فشل إرسال الرسائل: {error}")
+        elif error is not None:
+            logger.error(f"❌ خطأ في إرسال الرسائل: {error}")
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+class ReceiveStream(io.RawIOBase):
+    """wsgi.input يسحب قطع الجسم من receive عند القراءة (من خيط الـ executor وليس من حلقة الأحداث)"""
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.chunk = b''
+        self.position = 0
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while self.position >= len(self.chunk) and not self.finished:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            self.chunk, self.position = message.get('body', b''), 0
+            self.finished = message['type'] == 'http.disconnect' or not message.get('more_body')
+        size = min(len(target), len(self.chunk) - self.position)
+        target[:size] = self.chunk[self.position:self.position + size]
+        self.position += size
+        return size
+
+
+async def respond(send, status, body=b'', headers=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain; charset=utf-8'), *headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def wsgi_environ(scope, stream):
+    """environ لتطبيق Flask من طلب ASGI (stream هو wsgi.input)"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': stream,
+        'wsgi.input_terminated': True,  # الجسم ينتهي بانتهاء قطع ASGI (مع chunked أيضاً)
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[key] = value
+        else:
+            key = f"HTTP_{key}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class AsyncBot:
+    """تطبيق ASGI لعامل واحد"""
+
+    def __init__(self, threads=ASGI_THREADS):
+        self.threads = threads
+        self.loop = None
+        self.session = None
+        self.executor = None
+        self.listener = None
+        self.pending = set()
+
+    # ─────────────── دورة الحياة ───────────────
+    async def startup(self):
+        self.loop = asyncio.get_running_loop()
+        self.executor = ThreadPoolExecutor(self.threads, thread_name_prefix='whale-bot')
+        self.loop.set_default_executor(self.executor)
+        self.session = aiohttp.ClientSession()
+        self.listener = move_logging_off_loop()
+        self.bridge(bot.default_channel)
+        logger.info(f"⚡ وضع ASGI للعامل {os.getpid()} ({self.threads} خيط للمعالجات)")
+
+    async def shutdown(self):
+        if self.pending:
+            await asyncio.wait([asyncio.wrap_future(f) for f in list(self.pending)], timeout=LINE_API_TIMEOUT)
+        self.executor.shutdown(wait=False)
+        await self.session.close()
+        self.listener.stop()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def bridge(self, channel):
+        """عميل LINE غير متزامن للقناة (القنوات المضافة بإعادة التحميل تُربط عند أول حدث)"""
+        if not isinstance(channel.api, LoopApi):
+            async_api = AsyncLineBotApi(channel.access_token, AiohttpAsyncHttpClient(self.session),
+                                        endpoint=channel.api_endpoint or 'https://api.line.me')
+            channel.api = LoopApi(async_api, self.loop, self.pending)
+            channel.push_queue.api = channel.api
+        return channel
+
+    # ─────────────── الطلبات ───────────────
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        if self.session is None:
+            await self.startup()  # خوادم بدون lifespan
+        path = scope['path']
+        if scope['method'] == 'POST' and (path == '/callback' or path.startswith('/callback/')):
+            await self.callback(scope, receive, send, path[len('/callback/'):] or bot.DEFAULT_CHANNEL)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def callback(self, scope, receive, send, channel_name):
+        """Webhook LINE - نفس منطق app.callback مع المعالجة في الـ executor"""
+        arrived_at = time.time()
+        body = (await read_body(receive)).decode('utf-8')
+        channel = await self.loop.run_in_executor(None, bot.channels.get, channel_name)
+        if channel is None:
+            await respond(send, 404, b'Not Found')
+            return
+
+        signature = next((value.decode('latin-1') for name, value in scope['headers']
+                          if name == b'x-line-signature'), '')
+        if not channel.validator.validate(body, signature):
+            channel.metrics['invalid_signature'] += 1
+            logger.error(f"❌ توقيع LINE غير صالح [{channel.name}]")
+            await respond(send, 400, b'Bad Request')
+            return
+
+        bot.start_background()  # من الخيط الرئيسي حتى يُثبّت معالج SIGTERM
+        self.bridge(channel)
+        await self.loop.run_in_executor(None, bot.process_webhook, channel, body, arrived_at)
+        await respond(send, 200, b'OK')
+
+    async def wsgi(self, scope, receive, send):
+        """تمرير الطلب لتطبيق Flask (الاستجابات المتدفقة تُرسل قطعة قطعة)"""
+        environ = wsgi_environ(scope, io.BufferedReader(ReceiveStream(receive, self.loop)))
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+        result = await self.loop.run_in_executor(None, bot.app, environ, start_response)
+        chunks = iter(result)
+        try:
+            chunk = await self.loop.run_in_executor(None, next, chunks, None)
+            await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+            while chunk is not None:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await self.loop.run_in_executor(None, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await self.loop.run_in_executor(None, result.close)
+
+
+application = AsyncBot()
@@ -0,0 +1,222 @@
+"""
+أصول الصور (لعبة اختلاف) - تُجهّز مسبقاً وتُخدم بأسماء مشتقة من محتواها
+
+البناء (خارج السيرفر، يحتاج Pillow):
+    python assets.py content/images static/assets
+كل صورة تُنسخ باسم <sha256>.<ext> مع صورة معاينة مصغرة، ويُكتب manifest.json بالمجموعات
+(كل مجلد داخل content/images مجموعة، مثل difference/)
+
+الخدمة: /assets/<name> من الملفات المذكورة في manifest فقط، مع Cache-Control طويل و ETag
+وطلبات If-None-Match و Range، والملفات الصغيرة المطلوبة كثيراً تبقى في الذاكرة (LRU)
+الاسم لا يتغير إلا بتغير المحتوى، فيمكن لـ LINE وأي CDN تخزينها بلا حدود
+"""
+
+import io
+import os
+import sys
+import json
+import hashlib
+import logging
+import mimetypes
+from collections import OrderedDict
+from threading import Lock
+
+from werkzeug.wrappers import Response
+
+logger = logging.getLogger("whale-bot")
+
+MANIFEST = 'manifest.json'
+MAX_AGE = 365 * 24 * 3600
+IMAGE_TYPES = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG'}  # الصيغ التي يقبلها LINE كما هي
+ORIGINAL_MAX_BYTES = 10 * 1024 * 1024  # حدود LINE لرسالة الصورة
+PREVIEW_MAX_BYTES = 1024 * 1024
+PREVIEW_SIZE = 240
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+class AssetStore:
+    """الملفات المبنية في directory مع LRU بحجم cache_bytes"""
+
+    def __init__(self, directory, cache_bytes=8 * 1024 * 1024, max_age=MAX_AGE):
+        self.directory = directory
+        self.cache_bytes = cache_bytes
+        self.max_age = max_age
+        self.sets = {}
+        self.files = set()  # الأسماء المسموح بخدمتها
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'partial': 0, 'not_found': 0}
+        self._cache = OrderedDict()  # {name: bytes} بترتيب آخر استخدام
+        self._cached_bytes = 0
+        self._lock = Lock()
+        self.reload()
+
+    def reload(self):
+        path = os.path.join(self.directory, MANIFEST)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ خطأ في قراءة {path}: {e}")
+            manifest = {}
+        self.sets = manifest.get('sets', {})
+        self.files = {entry[key] for entries in self.sets.values() for entry in entries
+                      for key in ('original', 'preview')}
+        self.clear()
+        if self.files:
+            logger.info(f"🖼️ تم تحميل {len(self.files)} ملف صور في {len(self.sets)} مجموعة")
+
+    def images(self, set_name):
+        return self.sets.get(set_name, [])
+
+    # ─────────────── الذاكرة ───────────────
+    def read(self, name):
+        """محتوى الملف من الذاكرة أو القرص (الملفات الأكبر من ربع الـ cache لا تُحفظ فيه)"""
+        with self._lock:
+            data = self._cache.get(name)
+            if data is not None:
+                self._cache.move_to_end(name)
+                self.stats['hits'] += 1
+                return data
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            data = f.read()
+        self.stats['misses'] += 1
+        if len(data) <= self.cache_bytes // 4:
+            with self._lock:
+                if name not in self._cache:
+                    self._cache[name] = data
+                    self._cached_bytes += len(data)
+                while self._cached_bytes > self.cache_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_bytes -= len(evicted)
+        return data
+
+    def clear(self):
+        with self._lock:
+            count = len(self._cache)
+            self._cache.clear()
+            self._cached_bytes = 0
+        return count
+
+    def __len__(self):
+        return len(self._cache)
+
+    # ─────────────── الخدمة ───────────────
+    def response(self, name, request):
+        """Response للملف مع دعم الطلبات الشرطية و Range، أو None إذا لم يكن من الأصول"""
+        if name not in self.files:
+            self.stats['not_found'] += 1
+            return None
+        etag = name.split('.', 1)[0]
+        if request.if_none_match.contains(etag):
+            # الحالة الأكثر تكراراً مع التخزين المؤقت: بدون قراءة الملف
+            self.stats['not_modified'] += 1
+            return self._cacheable(Response(status=304), etag)
+        try:
+            data = self.read(name)
+        except OSError as e:
+            logger.error(f"❌ ملف صورة مفقود {name}: {e}")
+            self.stats['not_found'] += 1
+            return None
+        response = self._cacheable(Response(data, mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream'), etag)
+        response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+        if response.status_code == 304:
+            self.stats['not_modified'] += 1
+        elif response.status_code == 206:
+            self.stats['partial'] += 1
+        return response
+
+    def _cacheable(self, response, etag):
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.cache_control.immutable = True
+        return response
+
+    def status(self):
+        return dict(self.stats, files=len(self.files), cached=len(self._cache),
+                    cached_kb=round(self._cached_bytes / 1024, 1))
+
+
+# ═══════════════ البناء ═══════════════
+def _encode(image, fmt, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def _write(output_dir, data, ext):
+    name = f"{_digest(data)}{ext}"
+    path = os.path.join(output_dir, name)
+    if not os.path.exists(path):
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+    return name
+
+
+def build_image(source, output_dir, preview_size=PREVIEW_SIZE):
+    """نسخ الصورة باسم محتواها (أو تحويلها إلى JPEG) وإنشاء معاينتها"""
+    from PIL import Image
+
+    with open(source, 'rb') as f:
+        data = f.read()
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    ext = os.path.splitext(source)[1].lower()
+    if IMAGE_TYPES.get(ext) != image.format or len(data) > ORIGINAL_MAX_BYTES:
+        image = image.convert('RGB')
+        data, ext = _encode(image, 'JPEG', quality=90, optimize=True), '.jpg'
+    if ext == '.jpeg':
+        ext = '.jpg'
+
+    preview = image.convert('RGB')
+    preview.thumbnail((preview_size, preview_size))
+    quality = 80
+    preview_data = _encode(preview, 'JPEG', quality=quality, optimize=True)
+    while len(preview_data) > PREVIEW_MAX_BYTES and quality > 30:
+        quality -= 10
+        preview_data = _encode(preview, 'JPEG', quality=quality, optimize=True)
+
+    return {
+        'source': source,
+        'original': _write(output_dir, data, ext),
+        'preview': _write(output_dir, preview_data, '.jpg'),
+        'width': image.width,
+        'height': image.height
+    }
+
+
+def build_assets(source_dir, output_dir, preview_size=PREVIEW_SIZE):
+    """بناء كل المجموعات وكتابة manifest.json - الملفات القديمة تبقى حتى لا تنكسر الروابط المخزنة"""
+    os.makedirs(output_dir, exist_ok=True)
+    sets = {}
+    for set_name in sorted(os.listdir(source_dir)):
+        folder = os.path.join(source_dir, set_name)
+        if not os.path.isdir(folder):
+            continue
+        entries = []
+        for filename in sorted(os.listdir(folder)):
+            if os.path.splitext(filename)[1].lower() not in ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp'):
+                continue
+            entry = build_image(os.path.join(folder, filename), output_dir, preview_size)
+            entry['source'] = f"{set_name}/{filename}"
+            entries.append(entry)
+        if entries:
+            sets[set_name] = entries
+    path = os.path.join(output_dir, MANIFEST)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump({'sets': sets}, f, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+    return sets
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("الاستخدام: python assets.py <مجلد الصور> <مجلد الناتج>")
+    built = build_assets(sys.argv[1], sys.argv[2])
+    for name, images in built.items():
+        print(f"{name}: {len(images)} صورة")
@@ -0,0 +1,117 @@
+"""
+مقارنة نشر gevent الحالي (gunicorn app:app) مع وضع ASGI (uvicorn asgi:application)
+
+نفس الأحداث الاصطناعية تُرسل لكل خادم مع LINE وهمي بزمن شبكة محدد، وتُقاس:
+الإنتاجية، وزمن استجابة Webhook، وزمن وصول الرد إلى LINE الوهمي
+
+الاستخدام:
+    python benchmarks/bench_asgi.py [--events 2000] [--concurrency 64] [--workers 2] [--stub-latency-ms 50]
+"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from replay import StubLine, replay, wait_for
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = 'bench'
+COMMANDS = ('سؤال', 'تحدي', 'اعتراف', 'نقاطي', 'الصدارة', 'مساعدة')
+
+SERVERS = {
+    'gevent': "gunicorn app:app -w {workers} -k gevent -b 127.0.0.1:{port} --log-level warning",
+    'asgi': "uvicorn asgi:application --workers {workers} --host 127.0.0.1 --port {port} --log-level warning",
+}
+
+
+def make_records(count):
+    """أحداث رسائل في مجموعات كثيرة حتى لا تتدخل حدود السبام والإغراق"""
+    now = time.time()
+    records = []
+    for i in range(count):
+        event = {
+            'type': 'message', 'mode': 'active', 'timestamp': 0,
+            'source': {'type': 'group', 'groupId': f"C{i // 4:032x}", 'userId': f"U{i // 2:032x}"},
+            'replyToken': '', 'webhookEventId': '', 'deliveryContext': {'isRedelivery': False},
+            'message': {'type': 'text', 'id': str(i), 'text': COMMANDS[i % len(COMMANDS)]}
+        }
+        records.append({'t': now + i / 1000, 'c': 'default', 'b': {'destination': 'Ubench', 'events': [event]}})
+    return records
+
+
+def run_server(mode, args):
+    """تشغيل الخادم في مجلد مؤقت (قاعدة بيانات فارغة) ثم إعادة التشغيل"""
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, LINE_API_ENDPOINT=f"http://127.0.0.1:{args.stub_port}",
+                   LINE_CHANNEL_SECRET=SECRET, LINE_CHANNEL_ACCESS_TOKEN='bench',
+                   ROOM_ROUTER_DIR=os.path.join(directory, 'router'), PYTHONPATH=ROOT)
+        command = SERVERS[mode].format(workers=args.workers, port=args.port)
+        stub = StubLine(args.stub_port, args.stub_latency_ms / 1000)
+        process = subprocess.Popen(command, shell=True, cwd=directory, env=env, start_new_session=True,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            target = f"http://127.0.0.1:{args.port}"
+            if not wait_for(target):
+                sys.exit(f"{mode}: الخادم لم يبدأ")
+            replay(make_records(args.workers * 20), target, SECRET, None, args.concurrency, stub, 0.5)  # إحماء
+            stub.counts = dict.fromkeys(stub.counts, 0)
+            report, _ = replay(make_records(args.events), target, SECRET, None, args.concurrency, stub, args.drain)
+            return report
+        finally:
+            stub.close()
+            stop(process)
+
+
+def stop(process, timeout=30):
+    """SIGTERM لكل عمليات الخادم وانتظار خروجها (تحفظ بياناتها أثناء الإيقاف المنظم)"""
+    os.killpg(process.pid, signal.SIGTERM)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            os.killpg(process.pid, 0)
+        except ProcessLookupError:
+            break
+        process.poll()
+        time.sleep(0.1)
+    process.wait(timeout=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gevent مقابل ASGI")
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--stub-port', type=int, default=9101)
+    parser.add_argument('--stub-latency-ms', type=float, default=50.0)
+    parser.add_argument('--drain', type=float, default=2.0)
+    parser.add_argument('--modes', default='gevent,asgi')
+    args = parser.parse_args()
+
+    reports = {mode: run_server(mode, args) for mode in args.modes.split(',')}
+
+    rows = [
+        ('throughput req/s', lambda r: r['throughput_rps']),
+        ('webhook p50 ms', lambda r: r['webhook_latency_ms']['p50']),
+        ('webhook p99 ms', lambda r: r['webhook_latency_ms']['p99']),
+        ('reply p50 ms', lambda r: r['reply_latency_ms']['p50']),
+        ('reply p99 ms', lambda r: r['reply_latency_ms']['p99']),
+        ('replies', lambda r: r['replies']),
+        ('no reply', lambda r: r['events_without_reply']),
+        ('http status', lambda r: r['http_status']),
+    ]
+    print(f"{args.events} حدث، تزامن {args.concurrency}، {args.workers} عامل، "
+          f"زمن LINE {args.stub_latency_ms}ms\n")
+    print(f"{'':<18}" + ''.join(f"{mode:>22}" for mode in reports))
+    for title, value in rows:
+        print(f"{title:<18}" + ''.join(f"{str(value(report)):>22}" for report in reports.values()))
+
+
+if __name__ == '__main__':
+    main()
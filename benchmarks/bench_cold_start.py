@@ -0,0 +1,60 @@
+"""
+زمن الإقلاع: json.load للملف كاملاً مقابل فتح لقطة المستخدمين عبر mmap
+
+الاستخدام:
+    python benchmarks/bench_cold_start.py [عدد المستخدمين ...]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_store import UserTable
+from snapshot import Snapshot, write_snapshot
+from bench_user_store import make_rows
+
+
+def prepare(directory, count):
+    """كتابة نفس البيانات بالتنسيقين"""
+    json_path = os.path.join(directory, f"users-{count}.json")
+    snap_path = os.path.join(directory, f"users-{count}.snap")
+    table = UserTable(dict(make_rows(count)))
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({'users': table.to_dict()}, f, ensure_ascii=False)
+    write_snapshot(snap_path, table.snapshot_records())
+    return json_path, snap_path
+
+
+def boot_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return UserTable(json.load(f)['users'])
+
+
+def boot_snapshot(path):
+    return UserTable(snapshot=Snapshot(path))
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main(sizes):
+    print(f"{'users':>10} {'json boot s':>12} {'snap boot ms':>13} {'first lookup ms':>16} {'full load s':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in sizes:
+            json_path, snap_path = prepare(directory, count)
+            _, json_s = timed(boot_json, json_path)
+            table, snap_s = timed(boot_snapshot, snap_path)
+            _, lookup_s = timed(table.__getitem__, f"U{count // 2:032x}")
+            _, full_s = timed(table.load_all)
+            print(f"{count:>10} {json_s:>12.2f} {snap_s * 1000:>13.3f} {lookup_s * 1000:>16.3f} {full_s:>12.2f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
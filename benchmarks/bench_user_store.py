@@ -0,0 +1,72 @@
+"""
+مقارنة استهلاك الذاكرة: dict لكل مستخدم (الشكل القديم) مقابل UserTable
+
+الاستخدام:
+    python benchmarks/bench_user_store.py [عدد المستخدمين ...]
+"""
+
+import os
+import sys
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_store import UserTable
+
+
+def make_rows(count):
+    """بيانات مستخدمين شبيهة بالإنتاج (معرفات LINE بطول 33 حرف)"""
+    now = time.time()
+    for i in range(count):
+        yield f"U{i:032x}", {
+            'name': f"لاعب {i % 5000}",
+            'points': i % 997,
+            'last_active': now - (i % 86400),
+            'games_played': i % 53,
+            'registered': i % 3 == 0,
+        }
+
+
+def build_dicts(count):
+    """الشكل القديم: dict لكل مستخدم + تاريخ ISO + names_cache"""
+    users, names_cache = {}, {}
+    for user_id, row in make_rows(count):
+        name = f"{row['name']}"
+        users[user_id] = dict(row, name=name, last_active=datetime.fromtimestamp(row['last_active']).isoformat())
+        names_cache[user_id] = f"{row['name']}"
+    return users, names_cache
+
+
+def build_table(count):
+    table = UserTable()
+    for user_id, row in make_rows(count):
+        table[user_id] = row
+    return table
+
+
+def measure(builder, count):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = builder(count)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    return current, elapsed
+
+
+def main(sizes):
+    print(f"{'users':>10} {'layout':>10} {'MB':>10} {'bytes/user':>12} {'build s':>9}")
+    for count in sizes:
+        for label, builder in (('dict', build_dicts), ('table', build_table)):
+            used, elapsed = measure(builder, count)
+            print(f"{count:>10} {label:>10} {used / 1e6:>10.1f} {used / count:>12.0f} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,346 @@
+"""
+إعادة تشغيل حركة Webhook المسجلة (recorder.py) على نسخة محلية من البوت مع LINE وهمي
+
+يعيد توقيع كل طلب بسر قناته المحلية (الافتراضية من --secret والبقية من channels.json كما يقرؤها البوت)،
+ويولّد replyToken و webhookEventId جديدة،
+ويقيس زمن استجابة Webhook وزمن وصول الرد إلى LINE الوهمي
+
+الاستخدام:
+    # تشغيل البوت موجهاً للـ LINE الوهمي:
+    LINE_API_ENDPOINT=http://127.0.0.1:9100 LINE_CHANNEL_SECRET=replay LINE_CHANNEL_ACCESS_TOKEN=replay \\
+        gunicorn app:app -w 4 -k gevent -b 127.0.0.1:5055
+    python benchmarks/replay.py traffic/*.ndjson.gz --target http://127.0.0.1:5055 --speed 10
+
+    # أو تشغيله من الأداة نفسها:
+    python benchmarks/replay.py traffic/*.ndjson.gz --spawn "gunicorn app:app -w 4 -k gevent -b 127.0.0.1:5055"
+
+    --channels channels.json   أسرار القنوات الإضافية (/callback/<channel>)
+    --speed 1 | 10 | max      سرعة إعادة التشغيل (max = بدون انتظار، محدود بـ --concurrency)
+    --save run.json            حفظ ردود كل حدث للمقارنة لاحقاً
+    --compare baseline.json    نسبة الأحداث التي اختلفت ردودها عن تشغيل سابق
+"""
+
+import os
+import sys
+import json
+import hmac
+import time
+import uuid
+import base64
+import signal
+import hashlib
+import argparse
+import subprocess
+import urllib.parse
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recorder import read_segments
+
+
+# ═══════════════════════════════════════════════════════════════
+# LINE وهمي
+# ═══════════════════════════════════════════════════════════════
+class StubLine:
+    """خادم HTTP يحاكي LINE Messaging API ويسجل الردود"""
+
+    def __init__(self, port, latency=0.0, members=50):
+        self.latency = latency
+        self.members = members  # عدد أعضاء كل مجموعة وهمية
+        self.replies = {}   # {replyToken: (arrived_at, [ملخص الرسائل])}
+        self.counts = {'reply': 0, 'push': 0, 'multicast': 0, 'profile': 0, 'member_ids': 0, 'other': 0}
+        self.lock = Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, status=200, body=None):
+                data = json.dumps(body if body is not None else {}).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if self.path.startswith('/v2/bot/profile/'):
+                    user_id = self.path.rsplit('/', 1)[-1]
+                    stub.count('profile')
+                    return self._respond(body={'userId': user_id, 'displayName': f"لاعب {user_id[-4:]}"})
+                url = urllib.parse.urlsplit(self.path)
+                parts = url.path.strip('/').split('/')  # v2 bot group <id> members ids | member <user>
+                if len(parts) >= 5 and parts[2] in ('group', 'room'):
+                    if parts[4:] == ['members', 'ids']:
+                        stub.count('member_ids')
+                        start = int(urllib.parse.parse_qs(url.query).get('start', ['0'])[0])
+                        return self._respond(body=stub.member_page(parts[3], start))
+                    if len(parts) == 6 and parts[4] == 'member':
+                        stub.count('profile')
+                        return self._respond(body={'userId': parts[5], 'displayName': f"عضو {parts[5][-4:]}"})
+                if self.path == '/v2/bot/message/quota':
+                    return self._respond(body={'type': 'none'})
+                if self.path == '/v2/bot/message/quota/consumption':
+                    return self._respond(body={'totalUsage': 0})
+                stub.count('other')
+                return self._respond(404, {'message': 'Not found'})
+
+            def do_POST(self):
+                arrived_at = time.perf_counter()
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if self.path == '/v2/bot/message/reply':
+                    stub.reply(body.get('replyToken'), arrived_at, body.get('messages', []))
+                elif self.path == '/v2/bot/message/push':
+                    stub.count('push')
+                elif self.path == '/v2/bot/message/multicast':
+                    stub.count('multicast')
+                else:
+                    stub.count('other')
+                return self._respond()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def member_page(self, group_id, start, page_size=100):
+        """صفحة من أعضاء ثابتين لكل مجموعة"""
+        ids = [f"U{hashlib.md5(f'{group_id}:{i}'.encode()).hexdigest()}"
+               for i in range(start, min(start + page_size, self.members))]
+        page = {'memberIds': ids}
+        if start + page_size < self.members:
+            page['next'] = str(start + page_size)
+        return page
+
+    def count(self, kind):
+        with self.lock:
+            self.counts[kind] += 1
+
+    def reply(self, token, arrived_at, messages):
+        summary = [[m.get('type'), m.get('text') or m.get('altText') or ''] for m in messages]
+        with self.lock:
+            self.counts['reply'] += 1
+            self.replies[token] = (arrived_at, summary)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# ═══════════════════════════════════════════════════════════════
+# إعادة التشغيل
+# ═══════════════════════════════════════════════════════════════
+def sign(secret, body):
+    digest = hmac.new(secret.encode('utf-8'), body.encode('utf-8'), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('utf-8')
+
+
+def channel_secrets(path, default_secret):
+    """{اسم القناة: السر} من ملف القنوات بنفس قواعد ChannelRegistry"""
+    secrets = {'default': default_secret}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            configs = json.load(f)
+    except FileNotFoundError:
+        return secrets
+    except (OSError, ValueError) as e:
+        sys.exit(f"خطأ في قراءة ملف القنوات {path}: {e}")
+    for name, config in configs.items():
+        secret = config.get('secret') or os.getenv(config.get('secret_env', ''), '')
+        if name != 'default' and secret:
+            secrets[name] = secret
+    return secrets
+
+
+def prepare(record, now_ms):
+    """جسم جديد للطلب: معرفات جديدة و timestamp بتوقيت الإعادة"""
+    body = record['b']
+    tokens = []
+    for event in body['events']:
+        if 'replyToken' in event:
+            event['replyToken'] = uuid.uuid4().hex
+            tokens.append(event['replyToken'])
+        event['webhookEventId'] = uuid.uuid4().hex.upper()
+        event['timestamp'] = now_ms
+        event['deliveryContext'] = {'isRedelivery': False}
+    return json.dumps(body, ensure_ascii=False), tokens
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return round(values[index] * 1000, 2)
+
+
+def latency_summary(values):
+    return {f"p{p}": percentile(values, p) for p in (50, 90, 99)} | {
+        'max': round(max(values) * 1000, 2) if values else None}
+
+
+def wait_for(target, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"{target}/health", timeout=2).read()
+            return True
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.3)
+    return False
+
+
+def replay(records, target, secrets, speed, concurrency, stub, drain):
+    sent = []      # [(index, [tokens], send_time)]
+    http_latency = []
+    statuses = {}
+    lock = Lock()
+
+    def send(index, record):
+        channel = record.get('c', 'default')
+        path = '/callback' if channel == 'default' else f"/callback/{channel}"
+        body, tokens = prepare(record, int(time.time() * 1000))
+        secret = secrets.get(channel, secrets['default'])
+        request = urllib.request.Request(
+            target + path, data=body.encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'X-Line-Signature': sign(secret, body)})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            status = 'error'
+        elapsed = time.perf_counter() - started
+        with lock:
+            sent.append((index, tokens, started))
+            http_latency.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    first = records[0]['t'] if records else 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for index, record in enumerate(records):
+            if speed:
+                delay = (record['t'] - first) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(send, index, record)
+    duration = time.perf_counter() - started
+    time.sleep(drain)  # ردود الطابور والعمال الآخرين
+
+    reply_latency = []
+    replies = {}
+    missing = 0
+    with stub.lock:
+        for index, tokens, send_time in sent:
+            summaries = []
+            for token in tokens:
+                reply = stub.replies.get(token)
+                if reply is None:
+                    missing += 1
+                    continue
+                reply_latency.append(reply[0] - send_time)
+                summaries.append(reply[1])
+            replies[index] = summaries
+    events = sum(len(r['b']['events']) for r in records)
+    return {
+        'requests': len(records),
+        'events': events,
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(len(records) / duration, 1) if duration else None,
+        'http_status': {str(k): v for k, v in statuses.items()},
+        'webhook_latency_ms': latency_summary(http_latency),
+        'reply_latency_ms': latency_summary(reply_latency),
+        'replies': len(reply_latency),
+        'events_without_reply': missing,
+        'line_calls': dict(stub.counts)
+    }, replies
+
+
+def divergence(replies, baseline, strict):
+    """نسبة الأحداث التي اختلف عدد أو نوع (أو نص مع strict) رسائل ردها"""
+    def shape(summaries):
+        return [[m if strict else m[0] for m in summary] for summary in summaries]
+
+    compared = differing = 0
+    examples = []
+    for index, summaries in replies.items():
+        expected = baseline.get(str(index))
+        if expected is None:
+            continue
+        compared += 1
+        if shape(summaries) != shape(expected):
+            differing += 1
+            if len(examples) < 5:
+                examples.append({'event': index, 'expected': shape(expected), 'actual': shape(summaries)})
+    return {'compared': compared, 'differing': differing,
+            'ratio': round(differing / compared, 4) if compared else None, 'examples': examples}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="إعادة تشغيل حركة Webhook المسجلة")
+    parser.add_argument('segments', nargs='+')
+    parser.add_argument('--target', default='http://127.0.0.1:5055')
+    parser.add_argument('--secret', default=os.getenv('LINE_CHANNEL_SECRET', 'replay'))
+    parser.add_argument('--channels', default=os.getenv('CHANNELS_FILE', 'channels.json'),
+                        help="ملف القنوات الإضافية لأسرارها (نفس ملف البوت)")
+    parser.add_argument('--speed', default='1', help="1 أو 10 أو max")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--stub-port', type=int, default=9100)
+    parser.add_argument('--stub-latency-ms', type=float, default=0.0, help="محاكاة زمن شبكة LINE")
+    parser.add_argument('--stub-members', type=int, default=50, help="عدد أعضاء كل مجموعة في LINE الوهمي")
+    parser.add_argument('--drain', type=float, default=2.0, help="ثوانٍ لانتظار الردود المتأخرة")
+    parser.add_argument('--spawn', help="أمر تشغيل البوت (يُضبط LINE_API_ENDPOINT والسر تلقائياً)")
+    parser.add_argument('--save')
+    parser.add_argument('--compare')
+    parser.add_argument('--strict', action='store_true', help="مقارنة نصوص الرسائل وليس أنواعها فقط")
+    args = parser.parse_args()
+
+    records = read_segments(args.segments)
+    if not records:
+        sys.exit("لا توجد سجلات في المقاطع")
+    speed = None if args.speed == 'max' else float(args.speed)
+    secrets = channel_secrets(args.channels, args.secret)
+    unknown = {record.get('c', 'default') for record in records} - set(secrets)
+    if unknown:
+        print(f"⚠️ قنوات بدون سر في {args.channels} (تُوقّع بالسر الافتراضي): {', '.join(sorted(unknown))}",
+              file=sys.stderr)
+
+    stub = StubLine(args.stub_port, args.stub_latency_ms / 1000, args.stub_members)
+    process = None
+    if args.spawn:
+        env = dict(os.environ, LINE_API_ENDPOINT=f"http://127.0.0.1:{args.stub_port}",
+                   LINE_CHANNEL_SECRET=args.secret, LINE_CHANNEL_ACCESS_TOKEN='replay')
+        process = subprocess.Popen(args.spawn, shell=True, env=env, start_new_session=True)
+    try:
+        if not wait_for(args.target):
+            sys.exit(f"البوت غير متاح على {args.target}")
+        report, replies = replay(records, args.target, secrets, speed, args.concurrency, stub, args.drain)
+        if args.compare:
+            with open(args.compare, 'r', encoding='utf-8') as f:
+                report['divergence'] = divergence(replies, json.load(f), args.strict)
+        if args.save:
+            with open(args.save, 'w', encoding='utf-8') as f:
+                json.dump(replies, f, ensure_ascii=False)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    finally:
+        stub.close()
+        if process is not None:
+            os.killpg(process.pid, signal.SIGTERM)  # الـ shell وكل عمال gunicorn
+            process.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
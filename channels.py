@@ -0,0 +1,206 @@
+"""
+استضافة عدة قنوات LINE في نفس العملية
+لكل قناة: عميل API بـ connection pool خاص، تخزين منفصل، حد معدل، وإحصائيات
+إعدادات القنوات في ملف JSON يُعاد تحميله تلقائياً عند تغييره
+"""
+
+import os
+import json
+import time
+import logging
+from contextlib import contextmanager
+from threading import Lock, local
+
+import requests
+from requests.adapters import HTTPAdapter
+from linebot import LineBotApi
+from linebot.http_client import RequestsHttpClient, RequestsHttpResponse
+from linebot.webhook import SignatureValidator
+
+from outbox import PushQueue
+from scheduler import TokenBucket
+
+logger = logging.getLogger("whale-bot")
+
+DEFAULT_CHANNEL = 'default'
+POOL_SIZE = 10
+
+
+class SessionHttpClient(RequestsHttpClient):
+    """عميل HTTP بجلسة requests دائمة (connection pool لكل قناة)"""
+
+    def __init__(self, timeout=RequestsHttpClient.DEFAULT_TIMEOUT):
+        super().__init__(timeout)
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE))
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        return RequestsHttpResponse(self.session.get(
+            url, headers=headers, params=params, stream=stream, timeout=timeout or self.timeout))
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        return RequestsHttpResponse(self.session.post(
+            url, headers=headers, data=data, timeout=timeout or self.timeout))
+
+    def delete(self, url, headers=None, data=None, timeout=None):
+        return RequestsHttpResponse(self.session.delete(
+            url, headers=headers, data=data, timeout=timeout or self.timeout))
+
+    def put(self, url, headers=None, data=None, timeout=None):
+        return RequestsHttpResponse(self.session.put(
+            url, headers=headers, data=data, timeout=timeout or self.timeout))
+
+
+class Channel:
+    """قناة LINE واحدة مع حالتها المعزولة"""
+
+    def __init__(self, name, access_token, secret, loader, rate_limit=None, api_endpoint=None):
+        self.name = name
+        self.access_token = access_token
+        self.secret = secret
+        self.rate_limit = rate_limit
+        self.api_endpoint = api_endpoint
+        self.api = self._make_api(api_endpoint)
+        self.validator = SignatureValidator(secret)
+        self.push_queue = PushQueue(self.api)
+        self.limiter = TokenBucket(rate_limit) if rate_limit else None
+        self.lock = Lock()
+        self.metrics = {'events': 0, 'throttled': 0, 'invalid_signature': 0}
+        prefix = 'whale_bot' if name == DEFAULT_CHANNEL else f'whale_bot_{name}'
+        self.db_file = f'{prefix}_db.json'
+        self.users_snapshot = f'{prefix}_users.snap'
+        self._loader = loader
+        self._db = None
+
+    @property
+    def db(self):
+        """قاعدة بيانات القناة - تُحمّل عند أول استخدام فقط"""
+        if self._db is None:
+            with self.lock:
+                if self._db is None:
+                    self._db = self._loader(self)
+        return self._db
+
+    @property
+    def loaded(self):
+        return self._db is not None
+
+    def allow(self):
+        """حد معدل الأحداث للقناة"""
+        self.metrics['events'] += 1
+        if self.limiter is not None and not self.limiter.try_acquire():
+            self.metrics['throttled'] += 1
+            return False
+        return True
+
+    def _make_api(self, api_endpoint):
+        if api_endpoint:
+            return LineBotApi(self.access_token, endpoint=api_endpoint, http_client=SessionHttpClient)
+        return LineBotApi(self.access_token, http_client=SessionHttpClient)
+
+    def same_credentials(self, access_token, secret):
+        return (self.access_token, self.secret) == (access_token, secret)
+
+    def reconfigure(self, rate_limit, api_endpoint):
+        """تحديث الإعدادات التي لا تمس البيانات في نفس القناة (db والطابور يبقيان)"""
+        if rate_limit != self.rate_limit:
+            self.rate_limit = rate_limit
+            self.limiter = TokenBucket(rate_limit) if rate_limit else None
+        if api_endpoint != self.api_endpoint:
+            self.api_endpoint = api_endpoint
+            self.api = self.push_queue.api = self._make_api(api_endpoint)
+
+
+class ChannelRegistry:
+    """سجل القنوات - القناة الافتراضية من متغيرات البيئة والبقية من ملف JSON
+
+    مثال channels.json:
+        {"brand2": {"access_token_env": "BRAND2_TOKEN", "secret_env": "BRAND2_SECRET", "rate_limit": 50}}
+    """
+
+    def __init__(self, config_path, default_channel, loader, reload_interval=5.0, api_endpoint=None,
+                 retire=None):
+        self.config_path = config_path
+        self.loader = loader
+        self.retire = retire  # retire(channel): حفظ بيانات قناة تغير token/secret أو حُذفت قبل التخلي عنها
+        self.reload_interval = reload_interval
+        self.api_endpoint = api_endpoint
+        self.default = default_channel
+        self._channels = {DEFAULT_CHANNEL: default_channel}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = Lock()
+        self._local = local()
+        self.reload()
+
+    def reload(self, force=False):
+        """إعادة تحميل ملف القنوات إذا تغير"""
+        try:
+            mtime = os.stat(self.config_path).st_mtime
+        except OSError:
+            mtime = None
+        if not force and mtime == self._mtime:
+            return False
+        configs = {}
+        if mtime is not None:
+            try:
+                with open(self.config_path, 'r', encoding='utf-8') as f:
+                    configs = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"❌ خطأ في تحميل ملف القنوات: {e}")
+                return False
+        with self._lock:
+            channels = {DEFAULT_CHANNEL: self.default}
+            for name, config in configs.items():
+                if name == DEFAULT_CHANNEL or not name.isidentifier():
+                    logger.warning(f"⚠️ اسم قناة غير صالح: {name}")
+                    continue
+                token = config.get('access_token') or os.getenv(config.get('access_token_env', ''), '')
+                secret = config.get('secret') or os.getenv(config.get('secret_env', ''), '')
+                if not token or not secret:
+                    logger.warning(f"⚠️ القناة {name} بدون token أو secret")
+                    continue
+                rate_limit = config.get('rate_limit')
+                endpoint = config.get('api_endpoint', self.api_endpoint)
+                existing = self._channels.get(name)
+                if existing is not None and existing.same_credentials(token, secret):
+                    existing.reconfigure(rate_limit, endpoint)
+                    channels[name] = existing
+                else:
+                    channels[name] = Channel(name, token, secret, self.loader, rate_limit, endpoint)
+            retired = [channel for name, channel in self._channels.items() if channels.get(name) is not channel]
+            if self.retire is not None:
+                # قبل الاستبدال حتى تقرأ القناة الجديدة ما حُفظ (تحت القفل فلا يُحمّل أحد نسخة قديمة)
+                for channel in retired:
+                    try:
+                        self.retire(channel)
+                    except Exception as e:
+                        logger.error(f"❌ خطأ في حفظ القناة {channel.name} قبل استبدالها: {e}")
+            self._channels = channels
+            self._mtime = mtime
+        logger.info(f"📺 تم تحميل {len(channels)} قناة")
+        return True
+
+    def get(self, name):
+        now = time.monotonic()
+        if now - self._checked_at > self.reload_interval:
+            self._checked_at = now
+            self.reload()
+        return self._channels.get(name)
+
+    def all(self):
+        return list(self._channels.values())
+
+    # ─────────────── القناة الحالية ───────────────
+    def current(self):
+        """قناة الحدث الجاري معالجته (الافتراضية خارج أي حدث)"""
+        return getattr(self._local, 'channel', None) or self.default
+
+    @contextmanager
+    def use(self, channel):
+        previous = getattr(self._local, 'channel', None)
+        self._local.channel = channel
+        try:
+            yield channel
+        finally:
+            self._local.channel = previous
@@ -1,6 +1,6 @@
 import random
 from datetime import datetime
-from linebot.models import TextSendMessage
+from linebot.models import TextSendMessage, ImageSendMessage
 
 # ===== نقاط الألعاب =====
 POINTS_CORRECT = 2
@@ -74,24 +74,60 @@ class ChainWordsGame:
         return False
 
 # ===== لعبة الإجابة السريعة =====
+FAST_QUESTIONS = [
+    ("ما عاصمة السعودية؟", "الرياض"),
+    ("كم عدد أيام الأسبوع؟", "7"),
+    ("ما لون السماء؟", "أزرق"),
+    ("ما أكبر كوكب في المجموعة الشمسية؟", "المشتري"),
+    ("كم عدد أركان الإسلام؟", "5"),
+    ("ما عاصمة مصر؟", "القاهرة"),
+    ("ما الحيوان الملقب بسفينة الصحراء؟", "الجمل"),
+    ("كم عدد ألوان قوس قزح؟", "7"),
+]
+
+def normalize_answer(text):
+    """توحيد الإجابة: إزالة التشكيل وتوحيد الألف والتاء المربوطة والياء"""
+    text = ''.join(c for c in text.strip() if not '\u064b' <= c <= '\u0652')
+    for src, dst in (('أ', 'ا'), ('إ', 'ا'), ('آ', 'ا'), ('ة', 'ه'), ('ى', 'ي')):
+        text = text.replace(src, dst)
+    return ' '.join(text.lower().split())
+
 class FastAnswerGame:
     def __init__(self, db):
         self.db = db
         self.question = None
+        self.answer = None
+        self.round_id = None
         self.answered = False
 
     def start_game(self, questions):
-        self.question = random.choice(questions)
+        self.question, self.answer = random.choice(questions)
+        self.round_id = f"{datetime.now().timestamp():.6f}"
         self.answered = False
         return f"⚡ أسرع إجابة: {self.question}"
 
+    def is_correct(self, answer):
+        return normalize_answer(answer) == normalize_answer(self.answer)
+
     def check_answer(self, user_id, answer):
-        if not self.answered:
+        if not self.answered and self.is_correct(answer):
             self.answered = True
             self.db['users'][user_id]['points'] += POINTS_CORRECT
             return True
         return False
 
+    def to_state(self):
+        return {'game_type': 'أسرع', 'question': self.question, 'answer': self.answer,
+                'round': self.round_id, 'started_at': datetime.now().isoformat()}
+
+    @classmethod
+    def from_state(cls, db, state):
+        game = cls(db)
+        game.question = state['question']
+        game.answer = state['answer']
+        game.round_id = state['round']
+        return game
+
 # ===== لعبة ضد =====
 class OppositeGame:
     def __init__(self, db):
@@ -128,23 +164,47 @@ class WordComposerGame:
         return False
 
 # ===== لعبة الاختلاف =====
+DIFFERENCE_ROUNDS = 5
+
 class DifferenceGame:
+    """الصور: [{'original': url, 'preview': url}] من AssetStore"""
     def __init__(self, db):
         self.db = db
         self.images = []
         self.current_index = 0
 
     def start_game(self, images_list):
-        self.images = images_list
+        self.images = random.sample(images_list, min(DIFFERENCE_ROUNDS, len(images_list)))
         self.current_index = 0
-        return f"🔎 اكتشف الاختلاف في الصورة: {self.images[self.current_index]}"
+        return self.round_text()
+
+    def round_text(self):
+        return f"🔎 اكتشف الاختلاف في الصورة ({self.current_index + 1}/{len(self.images)})"
+
+    def image_message(self):
+        image = self.images[self.current_index]
+        return ImageSendMessage(original_content_url=image['original'], preview_image_url=image['preview'])
 
     def next_image(self):
         self.current_index += 1
         if self.current_index < len(self.images):
-            return f"🔎 اكتشف الاختلاف في الصورة: {self.images[self.current_index]}"
+            return self.round_text()
         return "✅ انتهت اللعبة"
 
+    def finished(self):
+        return self.current_index >= len(self.images)
+
+    def to_state(self):
+        return {'game_type': 'اختلاف', 'images': self.images, 'index': self.current_index,
+                'started_at': datetime.now().isoformat()}
+
+    @classmethod
+    def from_state(cls, db, state):
+        game = cls(db)
+        game.images = state['images']
+        game.current_index = state['index']
+        return game
+
 # ===== لعبة التوافق =====
 class CompatibilityGame:
     def __init__(self, db):
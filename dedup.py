@@ -0,0 +1,120 @@
+"""
+منع تكرار معالجة أحداث Webhook عند إعادة إرسالها من LINE
+Bloom filter دوّار بفترات زمنية (مشترك بين العمال عبر mmap) + مجموعة دقيقة للنافذة الأخيرة
+"""
+
+import os
+import mmap
+import time
+import struct
+import fcntl
+import hashlib
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+
+logger = logging.getLogger("whale-bot")
+
+HEADER = struct.Struct('<qq')  # رقم الفترة الزمنية لكل جيل
+
+
+class SeenFilter:
+    """مجموعة أحداث معالجة محدودة الذاكرة
+
+    - المجموعة الدقيقة: آخر الأحداث في هذا العامل (بدون أخطاء)
+    - Bloom filter بجيلين: يغطي كل العمال، كل جيل = فترة window ثانية
+    عند تطابق Bloom فقط يُعتبر الحدث مكرراً إذا كان isRedelivery، وإلا يُحسب false positive
+    """
+
+    def __init__(self, path, window=3600, bits=1 << 23, hashes=7, exact_size=20000):
+        self.window = window
+        self.bits = bits
+        self.hashes = hashes
+        self.exact_size = exact_size
+        self.generation_bytes = bits // 8
+        self._exact = OrderedDict()  # {key: seen_at}
+        self._lock = Lock()
+        self._lock_fd = None
+        self.stats = {'checked': 0, 'duplicates': 0, 'exact_hits': 0, 'bloom_hits': 0, 'false_positives': 0}
+        size = HEADER.size + 2 * self.generation_bytes
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+            self._lock_fd = fd
+        except OSError as e:
+            logger.warning(f"⚠️ تعذر مشاركة فلتر التكرار بين العمال: {e}")
+            self._mm = bytearray(size)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    @contextmanager
+    def _shared_lock(self):
+        """قفل بين العمال حول الفحص والإضافة، فلا يرى عاملان نفس الحدث جديداً معاً"""
+        if self._lock_fd is None:
+            yield
+            return
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _generation(self, bucket):
+        """بداية بيانات الجيل للفترة bucket، مع تصفيره إذا كان قديماً (تحت _shared_lock)"""
+        slot = bucket % 2
+        (stored,) = struct.unpack_from('<q', self._mm, slot * 8)
+        if stored != bucket:
+            start = HEADER.size + slot * self.generation_bytes
+            self._mm[start:start + self.generation_bytes] = bytes(self.generation_bytes)
+            struct.pack_into('<q', self._mm, slot * 8, bucket)
+        return HEADER.size + slot * self.generation_bytes
+
+    def _bloom_contains(self, positions, bucket):
+        for b in (bucket, bucket - 1):
+            (stored,) = struct.unpack_from('<q', self._mm, (b % 2) * 8)
+            if stored != b:
+                continue
+            start = HEADER.size + (b % 2) * self.generation_bytes
+            if all(self._mm[start + p // 8] & (1 << (p % 8)) for p in positions):
+                return True
+        return False
+
+    def _bloom_add(self, positions, bucket):
+        start = self._generation(bucket)
+        for p in positions:
+            self._mm[start + p // 8] |= 1 << (p % 8)
+
+    def seen(self, key, redelivery=False):
+        """يرجع True إذا سبقت معالجة الحدث (ويسجله إن كان جديداً)"""
+        now = time.time()
+        bucket = int(now // self.window)
+        with self._lock:
+            self.stats['checked'] += 1
+            while self._exact:
+                seen_at = next(iter(self._exact.values()))
+                if now - seen_at < self.window and len(self._exact) < self.exact_size:
+                    break
+                self._exact.popitem(last=False)
+            if key in self._exact:
+                self.stats['exact_hits'] += 1
+                self.stats['duplicates'] += 1
+                return True
+            positions = self._positions(key)
+            with self._shared_lock():
+                bloom_hit = self._bloom_contains(positions, bucket)
+                self._bloom_add(positions, bucket)
+            self._exact[key] = now
+            if bloom_hit:
+                self.stats['bloom_hits'] += 1
+                if redelivery:
+                    self.stats['duplicates'] += 1
+                    return True
+                self.stats['false_positives'] += 1
+            return False
@@ -0,0 +1,136 @@
+"""
+حماية المجموعات من الإغراق الجماعي (عدة حسابات ترسل نفس الأمر)
+Count-min sketch متناقص لتكرار (الغرفة، النص) بذاكرة ثابتة مهما كان عدد الغرف أو المهاجمين
+"""
+
+import time
+import logging
+from array import array
+from collections import OrderedDict
+from threading import Lock
+
+from content.games import normalize_answer
+
+logger = logging.getLogger("whale-bot")
+
+# تطويل وأحرف غير مرئية تُستخدم لتجاوز المطابقة
+INVISIBLE = dict.fromkeys(map(ord, '\u0640\u200b\u200c\u200d\u200e\u200f\u2060\ufeff'))
+REBASE_FACTOR = 2.0 ** 30  # إعادة ضبط epoch قبل أن يكبر المعامل كثيراً (كل 30 فترة نصف عمر)
+
+
+def normalize_text(text):
+    """نص الأمر بعد التوحيد (تشكيل، تطويل، أحرف مخفية، مسافات)"""
+    return normalize_answer(text.translate(INVISIBLE))
+
+
+class DecayingCountMin:
+    """Count-min sketch بتحديث محافظ، قيمه تنتصف كل half_life ثانية
+
+    التناقص كسول: الجدول يخزن القيم مضروبة في 2^((now - epoch) / half_life)، فالإضافة تزيد
+    بالمعامل الحالي والقراءة تقسم عليه، ولا يُعاد بناء الجدول إلا عند _rebase النادر
+    """
+
+    def __init__(self, width=4096, depth=4, half_life=10.0, clock=time.monotonic):
+        self.width = width
+        self.depth = depth
+        self.half_life = half_life
+        self.clock = clock
+        self.table = array('f', bytes(4 * width * depth))
+        self.epoch = clock()
+
+    def _scale(self, now):
+        return 2.0 ** ((now - self.epoch) / self.half_life)
+
+    def _rebase(self, now):
+        """نقل epoch للحظة الحالية (مرة كل ~30 فترة نصف عمر)"""
+        factor = 1.0 / self._scale(now)
+        self.table = array('f', map(factor.__mul__, self.table))
+        self.epoch = now
+
+    def _cells(self, key):
+        h1 = hash(key)
+        h2 = hash((key, 1)) | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add(self, key):
+        """زيادة العداد وإرجاع التقدير الجديد"""
+        now = self.clock()
+        scale = self._scale(now)
+        if scale > REBASE_FACTOR:
+            self._rebase(now)
+            scale = 1.0
+        table = self.table
+        cells = self._cells(key)
+        scaled = min(table[cell] for cell in cells) + scale
+        for cell in cells:
+            if table[cell] < scaled:
+                table[cell] = scaled
+        return scaled / scale
+
+    def estimate(self, key):
+        return min(self.table[cell] for cell in self._cells(key)) / self._scale(self.clock())
+
+
+class FloodGuard:
+    """يُستدعى قبل تنفيذ أي أمر: allow(room, text) -> هل يُنفّذ الأمر؟
+
+    عند تجاوز (الغرفة، النص) للحد تدخل الغرفة وضع الحماية لمدة cooldown ثانية:
+    كل أمر متطابق يُنفذ مرة واحدة فقط كل window ثانية والباقي يُتجاهل
+    """
+
+    def __init__(self, threshold=8, window=30, cooldown=60, half_life=10.0,
+                 max_rooms=1024, max_commands=64, clock=time.monotonic):
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.max_rooms = max_rooms
+        self.max_commands = max_commands
+        self.clock = clock
+        self.sketch = DecayingCountMin(half_life=half_life, clock=clock)
+        self._degraded = OrderedDict()  # {room: [until, OrderedDict{text: answered_at}]}
+        self._lock = Lock()
+        self.stats = {'checked': 0, 'suppressed': 0, 'floods': 0}
+
+    def allow(self, room, text):
+        now = self.clock()
+        text = normalize_text(text)
+        with self._lock:
+            self.stats['checked'] += 1
+            over = self.sketch.add(f"{room}\x00{text}") >= self.threshold
+            state = self._degraded.get(room)
+            if state is not None and state[0] < now:
+                del self._degraded[room]
+                state = None
+
+            if state is None:
+                if not over:
+                    return True
+                # بداية الإغراق: الرد الأول على هذه الدفعة أُرسل بالفعل
+                self.stats['floods'] += 1
+                logger.warning(f"🌊 إغراق في {room}: تفعيل وضع الحماية ({text[:20]})")
+                state = self._degraded[room] = [now + self.cooldown, OrderedDict({text: now})]
+                if len(self._degraded) > self.max_rooms:
+                    self._degraded.popitem(last=False)
+                self.stats['suppressed'] += 1
+                return False
+
+            if over:
+                state[0] = now + self.cooldown
+            self._degraded.move_to_end(room)
+            answered = state[1]
+            answered_at = answered.get(text)
+            if answered_at is not None and now - answered_at < self.window:
+                self.stats['suppressed'] += 1
+                return False
+            answered[text] = now
+            answered.move_to_end(text)
+            if len(answered) > self.max_commands:
+                answered.popitem(last=False)
+            return True
+
+    def status(self):
+        now = self.clock()
+        with self._lock:
+            active = sum(1 for until, _ in self._degraded.values() if until >= now)
+        return dict(self.stats, degraded_rooms=active)
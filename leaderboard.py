@@ -0,0 +1,147 @@
+"""
+لوحات الصدارة الموسمية (أسبوعية/شهرية) ولوحة النشاط المتناقص
+الحالة محفوظة داخل db['leaderboards'] فتُحفظ مع save_db، ولا توجد مهمة دورية تمر على كل المستخدمين:
+- بداية موسم جديد = تبديل معرف اللوحة فقط، واللوحة القديمة تُجمّد لاحقاً عند أول حاجة
+- التناقص يُطبق بمعامل عام: النقاط تُخزن مضروبة في e^(λ·(t - epoch)) والقراءة تقسم على المعامل الحالي
+"""
+
+import math
+import time
+import heapq
+from datetime import datetime
+
+PERIODS = ('week', 'month')
+ARCHIVE_TOP = 100      # عدد اللاعبين المحفوظين في اللوحة المجمّدة
+MAX_ARCHIVED = 120     # عدد المواسم المؤرشفة
+REBASE_FACTOR = 1e9    # إعادة ضبط epoch قبل أن يكبر المعامل كثيراً
+MIN_DECAYED = 0.01     # النقاط المتناقصة الأقل من هذا تُحذف عند إعادة الضبط
+
+
+def season_id(period, ts):
+    """معرف الموسم الذي يحتوي ts: 2025-W07 أو 2025-02"""
+    moment = datetime.fromtimestamp(ts)
+    if period == 'week':
+        year, week, _ = moment.isocalendar()
+        return f"{year}-W{week:02d}"
+    return f"{moment.year}-{moment.month:02d}"
+
+
+class Leaderboards:
+    """واجهة على db['leaderboards']
+
+    state = {
+        'current': {'week': season_id, 'month': season_id},
+        'boards': {season_id: {user_id: points}},        # المواسم الجارية
+        'pending': {season_id: {user_id: points}},       # مواسم انتهت ولم تُجمّد بعد
+        'archive': {season_id: {'top': [[user_id, points]], 'players': n, 'total': n, 'frozen_at': ts}},
+        'decay': {'epoch': ts, 'scores': {user_id: scaled}}
+    }
+    """
+
+    def __init__(self, state, half_life_days=14, clock=time.time):
+        self.state = state
+        self.clock = clock
+        self.rate = math.log(2) / (half_life_days * 86400) if half_life_days else 0.0
+        state.setdefault('current', {})
+        state.setdefault('boards', {})
+        state.setdefault('pending', {})
+        state.setdefault('archive', {})
+        state.setdefault('decay', {'epoch': clock(), 'scores': {}})
+
+    # ─────────────── المواسم ───────────────
+    def _board(self, period, now):
+        """لوحة الموسم الجاري، مع تبديلها إذا بدأ موسم جديد - O(1)"""
+        current = season_id(period, now)
+        previous = self.state['current'].get(period)
+        if previous != current:
+            # المواسم الأقدم المعلقة تُجمّد الآن، فلا يبقى أكثر من موسم معلق لكل نوع
+            for season in [s for s in self.state['pending'] if self._period_of(s) == period]:
+                self._freeze(season)
+            if previous is not None and previous in self.state['boards']:
+                self.state['pending'][previous] = self.state['boards'].pop(previous)
+            self.state['current'][period] = current
+        return self.state['boards'].setdefault(current, {})
+
+    @staticmethod
+    def _period_of(season):
+        return 'week' if '-W' in season else 'month'
+
+    def _freeze(self, season):
+        """تحويل موسم منتهٍ إلى لقطة مضغوطة (أعلى ARCHIVE_TOP فقط)"""
+        scores = self.state['pending'].pop(season)
+        top = heapq.nlargest(ARCHIVE_TOP, scores.items(), key=lambda item: item[1])
+        self.state['archive'][season] = {
+            'top': [[user_id, points] for user_id, points in top],
+            'players': len(scores),
+            'total': sum(scores.values()),
+            'frozen_at': self.clock()
+        }
+        archive = self.state['archive']
+        while len(archive) > MAX_ARCHIVED:
+            oldest = min(archive, key=lambda s: archive[s]['frozen_at'])
+            del archive[oldest]
+
+    def freeze_pending(self):
+        for season in list(self.state['pending']):
+            self._freeze(season)
+
+    # ─────────────── التناقص ───────────────
+    def _scale(self, now):
+        return math.exp(self.rate * (now - self.state['decay']['epoch']))
+
+    def _rebase(self, now):
+        """نقل epoch للحظة الحالية (نادر: مرة كل ~30 فترة نصف عمر)"""
+        decay = self.state['decay']
+        factor = 1.0 / self._scale(now)
+        decay['scores'] = {user_id: scaled * factor for user_id, scaled in decay['scores'].items()
+                           if scaled * factor >= MIN_DECAYED}
+        decay['epoch'] = now
+
+    # ─────────────── التحديث والاستعلام ───────────────
+    def add(self, user_id, points):
+        """إضافة نقاط (أو خصمها) للموسم الجاري ولوحة النشاط"""
+        now = self.clock()
+        for period in PERIODS:
+            board = self._board(period, now)
+            board[user_id] = max(0, board.get(user_id, 0) + points)
+        if self.rate:
+            scale = self._scale(now)
+            if scale > REBASE_FACTOR:
+                self._rebase(now)
+                scale = 1.0
+            scores = self.state['decay']['scores']
+            scores[user_id] = max(0.0, scores.get(user_id, 0.0) + points * scale)
+
+    def top(self, board, n=10):
+        """[(user_id, points)] لـ week أو month أو decay أو معرف موسم مؤرشف"""
+        now = self.clock()
+        if board in PERIODS:
+            scores = self._board(board, now)
+        elif board == 'decay':
+            scale = self._scale(now)
+            scores = self.state['decay']['scores']
+            top = heapq.nlargest(n, scores.items(), key=lambda item: item[1])
+            return [(user_id, round(scaled / scale, 1)) for user_id, scaled in top]
+        else:
+            if board in self.state['pending']:
+                self._freeze(board)
+            frozen = self.state['archive'].get(board)
+            if frozen is None:
+                return None
+            return [tuple(entry) for entry in frozen['top'][:n]]
+        return heapq.nlargest(n, scores.items(), key=lambda item: item[1])
+
+    def score(self, user_id, board):
+        now = self.clock()
+        if board == 'decay':
+            return round(self.state['decay']['scores'].get(user_id, 0.0) / self._scale(now), 1)
+        return self._board(board, now).get(user_id, 0)
+
+    def seasons(self):
+        """المواسم الجارية والمؤرشفة"""
+        self.freeze_pending()
+        return {
+            'current': dict(self.state['current']),
+            'archived': {season: {'players': frozen['players'], 'total': frozen['total']}
+                         for season, frozen in sorted(self.state['archive'].items())}
+        }
@@ -0,0 +1,202 @@
+"""
+دورة حياة العامل - إيقاف منظم عند SIGTERM (إعادة تشغيل Heroku أو gunicorn)
+الإشارة تُمرر فوراً لمعالج الخادم (gunicorn/uvicorn) فيغلق المستمع ويكمل الطلبات المقبولة،
+وبالتوازي تُصرّف الأحداث الجارية (ومنها الموجهة من عمال آخرين) حتى مهلة محددة ثم يُحفظ كل شيء
+ويُكتب تقرير تسليم يقرأه العامل التالي ليحمّل القنوات النشطة مبكراً ويقيس زمن التوقف
+العملية لا تخرج قبل انتهاء الحفظ (atexit)
+"""
+
+import os
+import json
+import time
+import atexit
+import signal
+import _thread
+import logging
+from contextlib import contextmanager
+from threading import Lock, Event
+
+from router import _pid_alive
+
+logger = logging.getLogger("whale-bot")
+
+PHASES = ('stop', 'flush')  # stop: فور الإشارة، flush: بعد انتهاء الأحداث الجارية
+
+
+class Lifecycle:
+    """مدير إيقاف العامل
+
+    - track(): يحيط بكل حدث لعدّ الأحداث الجارية
+    - register(name, fn, phase): دوال تُستدعى عند الإيقاف بالترتيب
+    - handoff(): دالة ترجع ما يحتاجه العامل التالي (مثل الألعاب النشطة لكل قناة)
+    - resume(reports): تُستدعى في العامل الجديد بتقارير العمال السابقين
+    """
+
+    def __init__(self, handoff_dir, drain_seconds=10, handoff=None, resume=None):
+        self.handoff_dir = handoff_dir
+        self.drain_seconds = drain_seconds
+        self.handoff = handoff or (lambda: {})
+        self.resume = resume or (lambda reports: None)
+        self.hooks = {phase: [] for phase in PHASES}
+        self.stats = {'in_flight': 0, 'late': 0, 'draining': False, 'last_shutdown': None}
+        self._previous = None
+        self._chained = False
+        self._flushing = False
+        self._stopped_at = None
+        self._done = None
+        self._lock = Lock()
+        self._pid = None
+
+    def register(self, name, fn, phase='flush'):
+        self.hooks[phase].append((name, fn))
+
+    # ─────────────── التشغيل ───────────────
+    def start(self):
+        """تثبيت معالج SIGTERM وقراءة تقارير العمال السابقين (آمن بعد fork)"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self.stats.update(in_flight=0, late=0, draining=False)
+        self._stopped_at = None
+        self._chained = self._flushing = False
+        self._done = Event()
+        try:
+            self._previous = signal.signal(signal.SIGTERM, self._on_signal)
+        except ValueError:
+            logger.warning("⚠️ تعذر تثبيت معالج SIGTERM خارج الخيط الرئيسي")
+        else:
+            atexit.register(self._before_exit, self._pid)
+        self._consume_handoffs()
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self.stats['in_flight'] += 1
+            if self._flushing:
+                self.stats['late'] += 1  # طلب قبله الخادم أثناء الإغلاق بعد بدء الحفظ
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stats['in_flight'] -= 1
+
+    # ─────────────── الإيقاف ───────────────
+    def _on_signal(self, signum, frame):
+        if self.stats['draining']:
+            return
+        self.stats['draining'] = True
+        self._stopped_at = time.time()
+        logger.info(f"🛑 SIGTERM: إغلاق المستمع وتصريف {self.stats['in_flight']} حدث جارٍ")
+        # الانتظار والحفظ خارج معالج الإشارة: تحت gevent يعمل المعالج داخل الـ hub فلا يمكنه الانتظار
+        # حتى Thread.start() تنتظر، لذا start_new_thread مباشرة (greenlet إذا كان threading مرقّعاً)
+        _thread.start_new_thread(self._drain, (signum, frame))
+        if callable(self._previous):
+            # معالج الخادم فوراً: يتوقف عن القبول فيذهب الجديد للعمال الآخرين، ويكمل ما قبله
+            self._chained = True
+            self._previous(signum, frame)
+
+    def _run_hooks(self, phase, results):
+        for name, fn in self.hooks[phase]:
+            started = time.perf_counter()
+            try:
+                fn()
+                results[name] = round((time.perf_counter() - started) * 1000, 1)
+            except Exception as e:
+                results[name] = f"error: {e}"
+                logger.error(f"❌ فشل {name} أثناء الإيقاف: {e}")
+
+    def _drain(self, signum, frame):
+        results = {}
+        self._run_hooks('stop', results)
+        deadline = self._stopped_at + self.drain_seconds
+        while self.stats['in_flight'] and time.time() < deadline:
+            time.sleep(0.05)
+        drained_at = time.time()
+        abandoned = self.stats['in_flight']
+        self._flushing = True
+        self._run_hooks('flush', results)
+        report = {
+            'pid': os.getpid(),
+            'stopped_at': self._stopped_at,
+            'drained_at': drained_at,
+            'drain_ms': round((drained_at - self._stopped_at) * 1000, 1),
+            'flushed_at': time.time(),
+            'abandoned': abandoned,
+            'hooks_ms': results
+        }
+        try:
+            report.update(self.handoff())
+        except Exception as e:
+            logger.error(f"❌ فشل تجهيز بيانات التسليم: {e}")
+        self._write_report(report)
+        self.stats['last_shutdown'] = report
+        logger.info(f"✅ تم الإيقاف المنظم خلال {report['drain_ms']}ms (متروك: {abandoned})")
+        self._done.set()
+        if not self._chained:
+            self._chain(signum)
+
+    def _chain(self, signum):
+        """بدون معالج خادم سابق (تشغيل مباشر): الإنهاء الافتراضي بعد الحفظ"""
+        if self._previous != signal.SIG_IGN:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    def _before_exit(self, pid):
+        """الخادم أنهى طلباته: انتظار الحفظ، ثم حفظ ثانٍ إذا وصلت أحداث بعد بدئه"""
+        if pid != os.getpid() or not self.stats['draining']:
+            return
+        self._done.wait(self.drain_seconds + 5)
+        if not self.stats['late']:
+            return
+        deadline = time.time() + self.drain_seconds
+        while self.stats['in_flight'] and time.time() < deadline:
+            time.sleep(0.05)
+        results = {}
+        self._run_hooks('flush', results)
+        logger.info(f"✅ حفظ {self.stats['late']} حدث وصل أثناء الإغلاق")
+
+    # ─────────────── التسليم ───────────────
+    def _write_report(self, report):
+        try:
+            os.makedirs(self.handoff_dir, exist_ok=True)
+            path = os.path.join(self.handoff_dir, f"{report['pid']}.json")
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.error(f"❌ فشل كتابة تقرير التسليم: {e}")
+
+    def _consume_handoffs(self):
+        """تقارير العمال المتوقفين: زمن التوقف حتى أول حدث هنا، وتحميل ما سلموه"""
+        try:
+            names = os.listdir(self.handoff_dir)
+        except OSError:
+            return
+        reports = []
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.handoff_dir, name)
+            try:
+                if _pid_alive(int(name[:-5])):
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    report = json.load(f)
+                os.unlink(path)  # عامل واحد فقط يستلم كل تقرير
+            except (OSError, ValueError):
+                continue
+            reports.append(report)
+        if not reports:
+            return
+        last = max(reports, key=lambda report: report['stopped_at'])
+        downtime = round((time.time() - last['stopped_at']) * 1000, 1)
+        self.stats['resumed'] = {
+            'workers': len(reports),
+            'downtime_ms': downtime,
+            'abandoned': sum(report.get('abandoned', 0) for report in reports)
+        }
+        logger.info(f"♻️ استلام {len(reports)} تقرير تسليم، زمن التوقف {downtime}ms")
+        try:
+            self.resume(reports)
+        except Exception as e:
+            logger.error(f"❌ فشل استئناف التسليم: {e}")
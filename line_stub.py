@@ -0,0 +1,88 @@
+"""
+LINE API محلي وهمي - للتجربة (dry-run) والاختبار بدون استهلاك حصة الرسائل
+"""
+
+import time
+from threading import Lock
+
+
+class StubQuota:
+    def __init__(self, value):
+        self.type = 'limited'
+        self.value = value
+
+
+class StubConsumption:
+    def __init__(self, total_usage):
+        self.total_usage = total_usage
+
+
+class StubMemberIds:
+    def __init__(self, member_ids, next=None):
+        self.member_ids = member_ids
+        self.next = next
+
+
+class StubProfile:
+    def __init__(self, user_id, display_name):
+        self.user_id = user_id
+        self.display_name = display_name
+
+
+class StubLineApi:
+    """بديل LineBotApi يسجل الاستدعاءات بدلاً من إرسالها
+
+    members: {group_id: [user_ids]} لمحاكاة قوائم الأعضاء بصفحات من page_size
+    """
+
+    def __init__(self, quota=1000, latency=0.0, members=None, page_size=100):
+        self.quota = quota
+        self.latency = latency  # محاكاة زمن الشبكة
+        self.calls = []         # [(method, to, messages)]
+        self.usage = 0
+        self.members = members if members is not None else {}
+        self.page_size = page_size
+        self._lock = Lock()
+
+    def _record(self, method, to, messages, recipients):
+        if self.latency:
+            time.sleep(self.latency)
+        if not isinstance(messages, (list, tuple)):
+            messages = [messages]
+        with self._lock:
+            self.calls.append((method, to, list(messages)))
+            self.usage += recipients
+
+    def reply_message(self, reply_token, messages, **kwargs):
+        self._record('reply', reply_token, messages, 0)
+
+    def push_message(self, to, messages, **kwargs):
+        # LINE يحسب push المجموعة مرة لكل عضو
+        self._record('push', to, messages, 1 if to.startswith('U') else self.get_group_members_count(to))
+
+    def multicast(self, to, messages, **kwargs):
+        self._record('multicast', list(to), messages, len(to))
+
+    def get_message_quota(self, **kwargs):
+        return StubQuota(self.quota)
+
+    def get_message_quota_consumption(self, **kwargs):
+        return StubConsumption(self.usage)
+
+    def get_group_member_ids(self, group_id, start=None, **kwargs):
+        self._record('member_ids', group_id, [], 0)
+        members = self.members.get(group_id, [])
+        offset = int(start or 0)
+        end = offset + self.page_size
+        return StubMemberIds(members[offset:end], str(end) if end < len(members) else None)
+
+    def get_group_member_profile(self, group_id, user_id, **kwargs):
+        self._record('member_profile', user_id, [], 0)
+        return StubProfile(user_id, f"عضو {user_id[-4:]}")
+
+    def get_group_members_count(self, group_id, **kwargs):
+        return len(self.members.get(group_id, ())) or 1
+
+    get_room_member_ids = get_group_member_ids
+    get_room_members_count = get_group_members_count
+    get_room_member_profile = get_group_member_profile
@@ -0,0 +1,142 @@
+"""
+مراقبة الذاكرة - أحجام الـ caches والمخازن المعروفة، ومقارنة لقطات tracemalloc عند الطلب
+عند تجاوز الحد المرن (soft limit) تُستدعى دوال التقليص المسجلة قبل أن يقتل المنصة العملية
+"""
+
+import os
+import gc
+import time
+import logging
+import resource
+import tracemalloc
+from threading import Lock, Thread
+
+logger = logging.getLogger("whale-bot")
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss():
+    """الذاكرة المقيمة الحالية بالبايت (أقصى قيمة إذا لم يتوفر /proc)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryWatchdog:
+    """تقرير دوري بأحجام المخازن، وتقليصها عند تجاوز soft_limit_mb (0 = بدون حد)"""
+
+    def __init__(self, soft_limit_mb=0, interval=60):
+        self.soft_limit = soft_limit_mb * 1024 * 1024
+        self.interval = interval
+        self.sizers = {}      # {name: size()}
+        self.shrinkers = {}   # {name: shrink() -> عدد العناصر المحذوفة}
+        self.last_report = None
+        self.stats = {'checks': 0, 'shrinks': 0, 'freed_items': 0}
+        self._previous = None  # آخر لقطة tracemalloc
+        self._lock = Lock()
+        self._pid = None
+
+    def register(self, name, size, shrink=None):
+        self.sizers[name] = size
+        if shrink is not None:
+            self.shrinkers[name] = shrink
+
+    # ─────────────── التقارير الدورية ───────────────
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"❌ خطأ في مراقبة الذاكرة: {e}")
+
+    def sizes(self):
+        result = {}
+        for name, size in self.sizers.items():
+            try:
+                result[name] = size()
+            except Exception as e:
+                result[name] = f"error: {e}"
+        return result
+
+    def check(self):
+        """قياس الذاكرة والتقليص إذا لزم"""
+        rss = current_rss()
+        report = {'rss_mb': round(rss / 1048576, 1), 'sizes': self.sizes(), 'at': time.time()}
+        self.stats['checks'] += 1
+        if self.soft_limit and rss > self.soft_limit:
+            logger.warning(f"⚠️ الذاكرة {report['rss_mb']}MB تجاوزت الحد المرن، تقليص الـ caches")
+            report['shrunk'] = self.shrink()
+            report['rss_after_mb'] = round(current_rss() / 1048576, 1)
+        self.last_report = report
+        logger.info(f"🧠 الذاكرة {report['rss_mb']}MB: {report['sizes']}")
+        return report
+
+    def shrink(self):
+        """تشغيل كل دوال التقليص وإرجاع ما حذفته كل منها"""
+        freed = {}
+        with self._lock:
+            for name, shrink in self.shrinkers.items():
+                try:
+                    freed[name] = shrink()
+                except Exception as e:
+                    logger.error(f"❌ فشل تقليص {name}: {e}")
+            gc.collect()
+        self.stats['shrinks'] += 1
+        self.stats['freed_items'] += sum(n for n in freed.values() if isinstance(n, int))
+        return freed
+
+    def status(self):
+        return {
+            'rss_mb': round(current_rss() / 1048576, 1),
+            'soft_limit_mb': round(self.soft_limit / 1048576) if self.soft_limit else None,
+            'sizes': self.sizes(),
+            'tracing': tracemalloc.is_tracing(),
+            'stats': self.stats,
+            'last_report': self.last_report
+        }
+
+    # ─────────────── tracemalloc ───────────────
+    def snapshot_diff(self, top=20, frames=1):
+        """أول استدعاء يبدأ التتبع ويأخذ لقطة الأساس، وكل استدعاء بعده يرجع أكثر المواضع نمواً منذ السابق"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                self._previous = None
+            frames = tracemalloc.get_traceback_limit()
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ))
+            previous, self._previous = self._previous, snapshot
+        traced, peak = tracemalloc.get_traced_memory()
+        result = {'traced_mb': round(traced / 1048576, 2), 'peak_mb': round(peak / 1048576, 2)}
+        if previous is None:
+            result['status'] = 'baseline'
+            return result
+        key = 'traceback' if frames > 1 else 'lineno'
+        result['top_growth'] = [
+            {
+                'site': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+                        if frames > 1 else f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                'size_diff_kb': round(stat.size_diff / 1024, 1),
+                'count_diff': stat.count_diff,
+                'size_kb': round(stat.size / 1024, 1)
+            }
+            for stat in snapshot.compare_to(previous, key)[:top]
+        ]
+        return result
+
+    def stop_tracing(self):
+        with self._lock:
+            tracemalloc.stop()
+            self._previous = None
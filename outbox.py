@@ -0,0 +1,121 @@
+"""
+صندوق الرسائل الصادرة - دمج كل ردود الحدث في استدعاء reply_message واحد
+LINE يسمح بـ 5 رسائل لكل reply token، والزائد يذهب لطابور push مجمّع
+"""
+
+import os
+import json
+import time
+import logging
+from collections import OrderedDict
+from threading import Lock, Thread
+
+from linebot.exceptions import LineBotApiError
+
+logger = logging.getLogger("whale-bot")
+
+MAX_REPLY_MESSAGES = 5      # حد LINE لكل reply/push
+MAX_MULTICAST_USERS = 500   # حد LINE لكل multicast
+
+
+def _message_key(messages):
+    """مفتاح ثابت لمحتوى الرسائل (لتجميع المستلمين في multicast)"""
+    return json.dumps([m.as_json_dict() for m in messages], sort_keys=True, ensure_ascii=False)
+
+
+class PushQueue:
+    """طابور الرسائل الزائدة: يجمعها لكل وجهة ويرسلها بدفعات
+
+    - المجموعات والغرف: push_message بدفعات من 5 رسائل
+    - المستخدمون بنفس المحتوى: multicast واحد حتى 500 مستخدم
+    """
+
+    def __init__(self, api, flush_interval=0.5):
+        self.api = api
+        self.flush_interval = flush_interval
+        self.stats = {'queued': 0, 'push_calls': 0, 'multicast_calls': 0, 'errors': 0}
+        self._pending = OrderedDict()  # {to: [messages]}
+        self._lock = Lock()
+        self._pid = None
+
+    def enqueue(self, to, messages):
+        with self._lock:
+            self._pending.setdefault(to, []).extend(messages)
+            self.stats['queued'] += len(messages)
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ خطأ في إرسال طابور push: {e}")
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+        if not pending:
+            return
+
+        multicast = OrderedDict()  # {message_key: (messages, [user_ids])}
+        for to, messages in pending.items():
+            for i in range(0, len(messages), MAX_REPLY_MESSAGES):
+                batch = messages[i:i + MAX_REPLY_MESSAGES]
+                if to.startswith('U'):
+                    multicast.setdefault(_message_key(batch), (batch, []))[1].append(to)
+                else:
+                    self._send(self.api.push_message, to, batch, 'push_calls')
+
+        for batch, user_ids in multicast.values():
+            for i in range(0, len(user_ids), MAX_MULTICAST_USERS):
+                chunk = user_ids[i:i + MAX_MULTICAST_USERS]
+                if len(chunk) == 1:
+                    self._send(self.api.push_message, chunk[0], batch, 'push_calls')
+                else:
+                    self._send(self.api.multicast, chunk, batch, 'multicast_calls')
+
+    def _send(self, method, to, messages, counter):
+        try:
+            method(to, messages)
+            self.stats[counter] += 1
+        except LineBotApiError as e:
+            self.stats['errors'] += 1
+            logger.warning(f"⚠️ فشل إرسال رسائل push إلى {to}: {e}")
+
+
+class Outbox:
+    """رسائل حدث واحد - تُرسل كلها في reply_message واحد عند flush()"""
+
+    def __init__(self, api, reply_token, to=None, push_queue=None):
+        self.api = api
+        self.reply_token = reply_token
+        self.to = to                    # وجهة الرسائل الزائدة (المجموعة أو المستخدم)
+        self.push_queue = push_queue
+        self.messages = []
+
+    def add(self, *messages):
+        self.messages.extend(messages)
+
+    def flush(self):
+        """إرسال الرد المجمّع (حتى 5 رسائل) وتحويل الزائد لطابور push"""
+        messages, self.messages = self.messages, []
+        if not messages:
+            return
+        reply, overflow = messages[:MAX_REPLY_MESSAGES], messages[MAX_REPLY_MESSAGES:]
+        try:
+            self.api.reply_message(self.reply_token, reply)
+        except LineBotApiError as e:
+            logger.warning(f"⚠️ فشل إرسال الرد: {e}")
+        except Exception as e:
+            logger.error(f"❌ خطأ في إرسال الرد: {e}")
+        if overflow:
+            if self.push_queue is not None and self.to:
+                self.push_queue.enqueue(self.to, overflow)
+            else:
+                logger.warning(f"⚠️ تم تجاهل {len(overflow)} رسالة زائدة عن حد الرد")
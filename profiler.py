@@ -0,0 +1,161 @@
+"""
+Profiler إحصائي عند الطلب - عينات من مكدسات الاستدعاء كل بضعة ميلي ثوانٍ
+يعمل من خيط نظام حقيقي (وليس greenlet) فيرى الطلبات المعلقة على الشبكة أيضاً تحت gevent
+النتيجة بصيغة collapsed stacks (سطر لكل مكدس: الأمر;ملف:دالة;... العدد) لأدوات flame graph
+بدون تفعيله لا يوجد أي خيط أو hook، فقط فحص self.active
+"""
+
+import os
+import sys
+import time
+import logging
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from threading import Lock
+
+try:
+    from gevent import monkey
+    _start_thread = monkey.get_original('_thread', 'start_new_thread')
+    _real_sleep = monkey.get_original('time', 'sleep')
+    _real_ident = monkey.get_original('_thread', 'get_ident')
+    _gevent_patched = lambda: monkey.is_module_patched('threading')
+except ImportError:
+    import _thread
+    _start_thread = _thread.start_new_thread
+    _real_sleep = time.sleep
+    _real_ident = _thread.get_ident
+    _gevent_patched = lambda: False
+
+try:
+    from greenlet import getcurrent
+except ImportError:
+    getcurrent = None
+
+logger = logging.getLogger("whale-bot")
+
+MAX_DEPTH = 64
+_NO_TASK = nullcontext()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _collapse(frame):
+    """المكدس من الجذر إلى الإطار الحالي"""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class SamplingProfiler:
+    """عينات مكدسات المهام الجارية مجمعة حسب نوع الأمر
+
+    task(label): يحيط بمعالجة الحدث، و label(name): يغير تصنيف المهمة الحالية (مثلاً اسم الأمر)
+    """
+
+    def __init__(self):
+        self.active = False
+        self.samples = Counter()  # {"الأمر;مكدس": عدد}
+        self.stats = {'runs': 0, 'samples': 0, 'last_duration': 0.0}
+        self._tasks = {}           # {greenlet أو thread ident: label}
+        self._lock = Lock()
+        self._main_ident = _real_ident()
+
+    # ─────────────── تصنيف المهام ───────────────
+    def _current(self):
+        if getcurrent is not None and _gevent_patched():
+            return getcurrent()
+        return _real_ident()
+
+    def task(self, label):
+        """سياق مهمة واحدة (لا شيء إذا كان الـ profiler متوقفاً)"""
+        if not self.active:
+            return _NO_TASK
+        return self._task(label)
+
+    @contextmanager
+    def _task(self, label):
+        key = self._current()
+        self._tasks[key] = label
+        try:
+            yield
+        finally:
+            self._tasks.pop(key, None)
+
+    def label(self, name):
+        if self.active:
+            key = self._current()
+            if key in self._tasks:
+                self._tasks[key] = name
+
+    # ─────────────── التشغيل ───────────────
+    def run(self, seconds, interval=0.01):
+        """تشغيل العينات لمدة seconds (يحجز الطلب الحالي فقط) ويرجع Counter المكدسات"""
+        with self._lock:
+            if self.active:
+                raise RuntimeError("الـ profiler يعمل بالفعل")
+            self.active = True
+            self.samples = Counter()
+        done = []
+        started = time.monotonic()
+        try:
+            _start_thread(self._sample_loop, (started + seconds, interval, done))
+            while not done:
+                time.sleep(min(0.2, seconds))  # تحت gevent يُفسح المجال لبقية الطلبات
+        finally:
+            self.active = False
+            self._tasks.clear()
+        self.stats['runs'] += 1
+        self.stats['last_duration'] = round(time.monotonic() - started, 3)
+        logger.info(f"🔬 انتهى التحليل: {sum(self.samples.values())} عينة")
+        return self.samples
+
+    def _sample_loop(self, deadline, interval, done):
+        own = _real_ident()
+        try:
+            while self.active and time.monotonic() < deadline:
+                self._sample(own)
+                _real_sleep(interval)
+        except Exception as e:
+            logger.error(f"❌ خطأ في الـ profiler: {e}")
+        finally:
+            done.append(True)
+
+    def _sample(self, own):
+        frames = sys._current_frames()
+        frames.pop(own, None)
+        for key, label in list(self._tasks.items()):
+            if isinstance(key, int):
+                frame = frames.pop(key, None)
+            else:
+                if key.dead:
+                    continue
+                frame = key.gr_frame
+                if frame is None:
+                    # greenlet الجاري الآن: إطاره هو إطار الخيط الرئيسي
+                    frame = frames.pop(self._main_ident, None)
+            if frame is not None:
+                self.samples[f"{label};{_collapse(frame)}"] += 1
+        for frame in frames.values():
+            self.samples[f"other;{_collapse(frame)}"] += 1
+        self.stats['samples'] += 1
+
+
+def format_collapsed(samples):
+    """نص collapsed stacks مرتب تنازلياً حسب العدد"""
+    return ''.join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+def parse_collapsed(text, into=None):
+    """قراءة نص collapsed stacks (لدمج نتائج العمال)"""
+    samples = into if into is not None else Counter()
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack and count.isdigit():
+            samples[stack] += int(count)
+    return samples
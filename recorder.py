@@ -0,0 +1,171 @@
+"""
+تسجيل حركة Webhook الحقيقية لإعادة تشغيلها لاحقاً (benchmarks/replay.py)
+المعرفات تُستبدل بـ HMAC ثابت، والنصوص الحرة تُحجب، والأوامر تبقى كما هي
+في الرسالة تبقى الحقول البنيوية فقط (النوع، معرفات الملصقات، المدة، الحجم)، والإحداثيات تُقرّب
+كل عامل يكتب ملفات مقاطع مضغوطة: traffic-<pid>-<وقت البداية>.ndjson.gz
+سطر لكل طلب: {"t": وقت الوصول, "c": القناة, "b": جسم Webhook بعد إخفاء الهوية}
+"""
+
+import os
+import gzip
+import atexit
+import json
+import hmac
+import time
+import hashlib
+import logging
+from datetime import datetime
+from threading import Lock
+
+logger = logging.getLogger("whale-bot")
+
+ID_FIELDS = ('userId', 'groupId', 'roomId', 'destination')
+SECRET_FIELDS = ('replyToken', 'webhookEventId')
+REDACTED_CHAR = 'x'
+# حقول الرسالة التي تبقى كما هي (يحتاجها إعادة التشغيل ولا تحمل نصاً من المستخدم)
+MESSAGE_FIELDS = ('type', 'packageId', 'stickerId', 'stickerResourceType', 'productId', 'emojiId',
+                  'index', 'length', 'duration', 'fileSize')
+COORDINATE_FIELDS = ('latitude', 'longitude')
+COORDINATE_DIGITS = 1  # حوالي 10 كم
+
+
+class TrafficRecorder:
+    """كاتب مقاطع الحركة لعامل واحد
+
+    keep_text(text): هل يُحفظ النص كما هو (الأوامر)، وإلا يُستبدل بنص بنفس الطول
+    """
+
+    def __init__(self, directory, key, keep_text=None, segment_seconds=3600, flush_interval=5.0):
+        self.directory = directory
+        self.key = key if isinstance(key, bytes) else key.encode('utf-8')
+        self.keep_text = keep_text or (lambda text: False)
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_interval
+        self.stats = {'requests': 0, 'events': 0, 'segments': 0, 'errors': 0}
+        self._file = None
+        self._pid = None
+        self._opened_at = 0.0
+        self._flushed_at = 0.0
+        self._lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # ─────────────── إخفاء الهوية ───────────────
+    def _pseudonym(self, value):
+        """معرف ثابت بنفس الشكل (الحرف الأول + 32 hex) لا يمكن عكسه بدون المفتاح"""
+        if not isinstance(value, str) or not value:
+            return value
+        digest = hmac.new(self.key, value.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+        return f"{value[0]}{digest}"
+
+    def _anonymize(self, node):
+        if isinstance(node, list):
+            return [self._anonymize(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+        result = {}
+        for key, value in node.items():
+            if key in ID_FIELDS or key in SECRET_FIELDS:
+                result[key] = self._pseudonym(value)
+            elif key == 'message' and isinstance(value, dict):
+                result[key] = self._message(value)
+            elif key == 'postback' and isinstance(value, dict):
+                result[key] = self._postback(value)
+            else:
+                result[key] = self._anonymize(value)
+        return result
+
+    def _redact(self, node):
+        """كل نص يُستبدل بنص بنفس الطول عدا MESSAGE_FIELDS، والمعرفات تُستبدل بـ HMAC"""
+        if isinstance(node, list):
+            return [self._redact(item) for item in node]
+        if isinstance(node, str):
+            return REDACTED_CHAR * len(node)
+        if not isinstance(node, dict):
+            return node
+        result = {}
+        for key, value in node.items():
+            if key in ID_FIELDS:
+                result[key] = self._pseudonym(value)
+            elif key in MESSAGE_FIELDS:
+                result[key] = value
+            elif key in COORDINATE_FIELDS and isinstance(value, (int, float)):
+                result[key] = round(value, COORDINATE_DIGITS)
+            else:
+                result[key] = self._redact(value)
+        return result
+
+    def _message(self, original):
+        message = self._redact({k: v for k, v in original.items() if k not in ('text', 'id')})
+        if 'text' in original:
+            message['text'] = self._text(original['text'])
+        if 'id' in original:
+            message['id'] = self._pseudonym(str(original['id']))
+        return message
+
+    def _postback(self, original):
+        postback = self._redact({k: v for k, v in original.items() if k != 'data'})
+        if 'data' in original:
+            postback['data'] = self._text(original['data'])
+        return postback
+
+    def _text(self, text):
+        return text if self.keep_text(text) else REDACTED_CHAR * len(text)
+
+    def anonymize(self, payload):
+        """نسخة من جسم Webhook بدون بيانات شخصية"""
+        return {'destination': self._pseudonym(payload.get('destination')),
+                'events': self._anonymize(payload.get('events', []))}
+
+    # ─────────────── الكتابة ───────────────
+    def _segment(self, now):
+        if self._pid != os.getpid() or now - self._opened_at >= self.segment_seconds:
+            self.close()
+            self._pid = os.getpid()
+            name = f"traffic-{self._pid}-{datetime.fromtimestamp(now):%Y%m%d-%H%M%S}.ndjson.gz"
+            self._file = gzip.open(os.path.join(self.directory, name), 'at', encoding='utf-8')
+            if self._opened_at == 0.0:
+                atexit.register(self.close)
+            self._opened_at = now
+            self.stats['segments'] += 1
+            logger.info(f"🎙️ مقطع تسجيل جديد: {name}")
+        return self._file
+
+    def record(self, channel_name, payload, arrived_at=None):
+        now = arrived_at or time.time()
+        try:
+            line = json.dumps({'t': now, 'c': channel_name, 'b': self.anonymize(payload)},
+                              ensure_ascii=False, separators=(',', ':'))
+            with self._lock:
+                segment = self._segment(now)
+                segment.write(line + '\n')
+                if now - self._flushed_at >= self.flush_interval:
+                    segment.flush()
+                    self._flushed_at = now
+            self.stats['requests'] += 1
+            self.stats['events'] += len(payload.get('events', []))
+        except (OSError, TypeError, ValueError) as e:
+            self.stats['errors'] += 1
+            logger.warning(f"⚠️ فشل تسجيل الطلب: {e}")
+
+    def close(self):
+        if self._file is not None and self._pid == os.getpid():
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        self._file = None
+
+
+def read_segments(paths):
+    """كل السجلات من عدة مقاطع مرتبة حسب وقت الوصول"""
+    records = []
+    for path in paths:
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        records.append(json.loads(line))
+        except (EOFError, gzip.BadGzipFile):
+            pass  # مقطع عامل ما زال يكتب (آخر جزء غير مكتمل)
+    records.sort(key=lambda record: record['t'])
+    return records
@@ -0,0 +1,224 @@
+"""
+قوائم أعضاء المجموعات - لمنشن وتوافق بدون استدعاء LINE في كل مرة
+الصفحة الأولى من معرفات الأعضاء تُجلب عند أول طلب والباقي في الخلفية، ثم تُحدّث كل ttl ثانية
+أحداث الانضمام والمغادرة تعدّل القائمة مباشرة، والأسماء تُجلب فقط للأعضاء المختارين
+"""
+
+import time
+import random
+import logging
+from collections import OrderedDict
+from threading import Lock, Thread
+
+from linebot.exceptions import LineBotApiError
+
+logger = logging.getLogger("whale-bot")
+
+
+class Roster:
+    """أعضاء غرفة واحدة: قائمة + فهرس للإضافة والحذف والاختيار العشوائي في O(1)"""
+
+    __slots__ = ('members', 'index', 'fetched_at', 'refreshing', 'complete', 'unsupported')
+
+    def __init__(self):
+        self.members = []
+        self.index = {}         # {user_id: موضعه في members}
+        self.fetched_at = 0.0
+        self.refreshing = False
+        self.complete = False   # هل اكتمل جلب كل الصفحات
+        self.unsupported = False  # الحساب لا يملك صلاحية قائمة الأعضاء: نكتفي بمن يتكلم
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, user_id):
+        if user_id not in self.index:
+            self.index[user_id] = len(self.members)
+            self.members.append(user_id)
+
+    def remove(self, user_id):
+        position = self.index.pop(user_id, None)
+        if position is None:
+            return
+        last = self.members.pop()
+        if position < len(self.members):
+            self.members[position] = last
+            self.index[last] = position
+
+    def pick(self, count=1, exclude=None):
+        """count أعضاء مختلفين عشوائياً (بدون exclude)، أو [] إذا لم يكفِ العدد"""
+        available = len(self.members) - (1 if exclude in self.index else 0)
+        if available < count:
+            return []
+        if available <= count * 2:
+            return random.sample([m for m in self.members if m != exclude], count)
+        picked = []
+        while len(picked) < count:
+            member = random.choice(self.members)
+            if member != exclude and member not in picked:
+                picked.append(member)
+        return picked
+
+
+class RosterService:
+    """قوائم أعضاء كل الغرف (مفتاح الغرفة يتضمن اسم القناة)
+
+    names: dict مشترك للأسماء (names_cache) حتى لا يُجلب نفس الملف الشخصي مرتين
+    """
+
+    def __init__(self, ttl=3600, max_rooms=5000, names=None):
+        self.ttl = ttl
+        self.max_rooms = max_rooms
+        self.names = names if names is not None else {}
+        self.stats = {'hits': 0, 'misses': 0, 'refreshes': 0, 'id_pages': 0, 'profiles': 0, 'errors': 0}
+        self._rosters = OrderedDict()  # {key: Roster} بترتيب آخر استخدام
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._rosters)
+
+    # ─────────────── الجلب من LINE ───────────────
+    @staticmethod
+    def _is_room(room_id):
+        return room_id.startswith('R')
+
+    def _fetch_page(self, api, room_id, start):
+        method = api.get_room_member_ids if self._is_room(room_id) else api.get_group_member_ids
+        page = method(room_id, start=start)
+        self.stats['id_pages'] += 1
+        return page.member_ids, page.next
+
+    def _refresh(self, api, roster, room_id, start=None, fetched=None):
+        """جلب بقية الصفحات ثم حذف من غادر أثناء غياب القائمة"""
+        fetched = fetched if fetched is not None else set()
+        try:
+            while True:
+                member_ids, start = self._fetch_page(api, room_id, start)
+                fetched.update(member_ids)
+                for user_id in member_ids:
+                    roster.add(user_id)
+                if not start:
+                    break
+            for user_id in [m for m in roster.members if m not in fetched]:
+                roster.remove(user_id)
+            roster.complete = True
+            roster.unsupported = False
+        except LineBotApiError as e:
+            self._failed(roster, room_id, e)
+        finally:
+            roster.fetched_at = time.time()
+            roster.refreshing = False
+
+    def _failed(self, roster, room_id, error):
+        self.stats['errors'] += 1
+        if error.status_code == 403:
+            roster.unsupported = True
+            logger.info(f"ℹ️ لا صلاحية لقائمة أعضاء {room_id}، سيتم الاعتماد على المتحدثين")
+        else:
+            logger.warning(f"⚠️ فشل جلب أعضاء {room_id}: {error}")
+
+    def _load(self, api, key, room_id):
+        """أول طلب للغرفة: الصفحة الأولى الآن، والباقي في الخلفية"""
+        roster = Roster()
+        roster.refreshing = True
+        with self._lock:
+            self._rosters[key] = roster
+            while len(self._rosters) > self.max_rooms:
+                self._rosters.popitem(last=False)
+        try:
+            member_ids, start = self._fetch_page(api, room_id, None)
+        except LineBotApiError as e:
+            self._failed(roster, room_id, e)
+            roster.fetched_at = time.time()
+            roster.refreshing = False
+            return roster
+        for user_id in member_ids:
+            roster.add(user_id)
+        if start:
+            Thread(target=self._refresh, args=(api, roster, room_id, start, set(member_ids)), daemon=True).start()
+        else:
+            roster.complete = True
+            roster.fetched_at = time.time()
+            roster.refreshing = False
+        return roster
+
+    def roster(self, api, key, room_id):
+        """قائمة الغرفة - من الذاكرة إن وُجدت، مع تحديثها في الخلفية بعد انتهاء صلاحيتها"""
+        with self._lock:
+            roster = self._rosters.get(key)
+            if roster is not None:
+                self._rosters.move_to_end(key)
+        if roster is None:
+            self.stats['misses'] += 1
+            return self._load(api, key, room_id)
+        self.stats['hits'] += 1
+        if not roster.refreshing and time.time() - roster.fetched_at > self.ttl:
+            roster.refreshing = True
+            self.stats['refreshes'] += 1
+            Thread(target=self._refresh, args=(api, roster, room_id), daemon=True).start()
+        return roster
+
+    def name(self, api, room_id, user_id):
+        """اسم العضو من الـ cache أو من ملفه داخل المجموعة"""
+        name = self.names.get(user_id)
+        if name is not None:
+            return name
+        method = api.get_room_member_profile if self._is_room(room_id) else api.get_group_member_profile
+        try:
+            name = method(room_id, user_id).display_name
+            self.stats['profiles'] += 1
+        except LineBotApiError as e:
+            self.stats['errors'] += 1
+            logger.warning(f"⚠️ فشل جلب اسم العضو {user_id}: {e}")
+            return None
+        self.names[user_id] = name
+        return name
+
+    def pick(self, api, key, room_id, count=1, exclude=None):
+        """[(user_id, name)] لأعضاء عشوائيين مختلفين، أو [] إذا لم يكفِ العدد"""
+        roster = self.roster(api, key, room_id)
+        picked = []
+        for user_id in roster.pick(count, exclude):
+            name = self.name(api, room_id, user_id)
+            if name is None:
+                roster.remove(user_id)  # غادر أو حظر البوت
+                continue
+            picked.append((user_id, name))
+        return picked if len(picked) == count else []
+
+    # ─────────────── التحديث من الأحداث ───────────────
+    def observe(self, key, user_id):
+        """عضو تكلم في الغرفة (يكفي وحده إذا لم تتوفر صلاحية القائمة)"""
+        roster = self._rosters.get(key)
+        if roster is not None:
+            roster.add(user_id)
+
+    def joined(self, key, user_ids):
+        roster = self._rosters.get(key)
+        if roster is not None:
+            for user_id in user_ids:
+                roster.add(user_id)
+
+    def left(self, key, user_ids):
+        roster = self._rosters.get(key)
+        if roster is not None:
+            for user_id in user_ids:
+                roster.remove(user_id)
+
+    def drop(self, key):
+        with self._lock:
+            self._rosters.pop(key, None)
+
+    def prune(self):
+        """حذف القوائم المنتهية (لمراقبة الذاكرة)"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [key for key, roster in self._rosters.items()
+                       if roster.fetched_at < cutoff and not roster.refreshing]
+            for key in expired:
+                del self._rosters[key]
+        return len(expired)
+
+    def status(self):
+        return dict(self.stats, rooms=len(self._rosters),
+                    members=sum(len(roster) for roster in list(self._rosters.values())))
@@ -0,0 +1,257 @@
+"""
+توجيه الغرف - كل مجموعة تُخدم دائماً من نفس العامل
+يعتمد على Consistent Hashing بين عمال gunicorn عبر Unix Sockets محلية
+مجلد الـ sockets خاص بمستخدم العملية (0700)، وكل إطار موقّع بـ HMAC فلا تقبل العمال إلا بعضها
+"""
+
+import os
+import hmac
+import stat
+import socket
+import struct
+import hashlib
+import bisect
+import logging
+import atexit
+from threading import Lock, Thread
+import time
+
+logger = logging.getLogger("whale-bot")
+
+FRAME_HEADER = struct.Struct('!I')
+ACK = b'\x01'
+TAG_SIZE = hashlib.sha256().digest_size
+
+
+def _hash(key):
+    """Hash ثابت بين العمليات (بعكس hash() المدمجة)"""
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+def _pid_alive(pid):
+    """التحقق من أن العملية ما زالت تعمل"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def send_frame(sock, payload):
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("انقطع الاتصال")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock):
+    (size,) = FRAME_HEADER.unpack(recv_exact(sock, FRAME_HEADER.size))
+    return recv_exact(sock, size)
+
+
+def private_dir(path):
+    """إنشاء المجلد بصلاحية 0700 والتأكد أنه لمستخدم العملية وحده (OSError إذا لم يكن)"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"{path} ليس مجلداً مملوكاً لهذا المستخدم")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+
+
+class HashRing:
+    """حلقة Consistent Hashing مع عقد افتراضية"""
+
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        self.nodes = frozenset(nodes)
+        points = []
+        for node in self.nodes:
+            for i in range(replicas):
+                points.append((_hash(f"{node}#{i}"), node))
+        points.sort()
+        self._keys = [p[0] for p in points]
+        self._owners = [p[1] for p in points]
+
+    def owner(self, key):
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[i]
+
+
+class RoomRouter:
+    """موزع الأحداث: يحدد العامل المالك لكل غرفة ويحوّل الحدث إليه"""
+
+    def __init__(self, socket_dir, dispatch, key, replicas=64, refresh_interval=5.0, timeout=1.0):
+        self.socket_dir = socket_dir
+        self.dispatch = dispatch  # تستقبل bytes الحدث وتعالجه محلياً
+        self.key = key if isinstance(key, bytes) else key.encode('utf-8')  # مشترك بين العمال فقط
+        self.replicas = replicas
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.ring = HashRing(replicas=replicas)
+        self.stats = {'local': 0, 'forwarded': 0, 'received': 0, 'fallbacks': 0, 'rebalances': 0, 'rejected': 0}
+        self._pid = None
+        self._server = None
+        self._last_refresh = 0.0
+        self._lock = Lock()
+
+    def _path(self, pid):
+        return os.path.join(self.socket_dir, f"worker-{pid}.sock")
+
+    def start(self):
+        """تشغيل مستمع العامل الحالي (آمن بعد fork)"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._server = None
+            try:
+                private_dir(self.socket_dir)
+                path = self._path(pid)
+                if os.path.exists(path):
+                    os.unlink(path)
+                server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                server.bind(path)
+                os.chmod(path, 0o600)
+                server.listen(128)
+                self._server = server
+                atexit.register(self.stop)
+                Thread(target=self._accept_loop, args=(server,), daemon=True).start()
+                logger.info(f"🔀 موزع الغرف يعمل للعامل {pid}")
+            except OSError as e:
+                logger.warning(f"⚠️ تعذر تشغيل موزع الغرف، سيتم المعالجة محلياً: {e}")
+            self._last_refresh = 0.0
+        self.refresh()
+
+    def stop(self):
+        if self._server is not None and self._pid == os.getpid():
+            try:
+                self._server.close()
+                os.unlink(self._path(self._pid))
+            except OSError:
+                pass
+            self._server = None
+
+    def refresh(self, force=False):
+        """إعادة بناء الحلقة من العمال الأحياء"""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return
+        self._last_refresh = now
+        nodes = set()
+        try:
+            names = os.listdir(self.socket_dir)
+        except OSError:
+            names = []
+        for name in names:
+            if not (name.startswith('worker-') and name.endswith('.sock')):
+                continue
+            try:
+                pid = int(name[7:-5])
+            except ValueError:
+                continue
+            if _pid_alive(pid):
+                nodes.add(pid)
+            else:
+                try:
+                    os.unlink(os.path.join(self.socket_dir, name))
+                except OSError:
+                    pass
+        if self._server is not None:
+            nodes.add(self._pid)
+        if nodes != self.ring.nodes:
+            self.ring = HashRing(nodes, self.replicas)
+            self.stats['rebalances'] += 1
+            logger.info(f"⚖️ إعادة توزيع الغرف على {len(nodes)} عامل")
+
+    def owner(self, key):
+        self.refresh()
+        return self.ring.owner(key)
+
+    def route(self, key, payload):
+        """تحويل الحدث لمالك الغرفة، ويرجع False إذا يجب معالجته محلياً"""
+        if self._server is None:
+            self.stats['local'] += 1
+            return False
+        owner = self.owner(key)
+        if owner is None or owner == self._pid:
+            self.stats['local'] += 1
+            return False
+        try:
+            self._send(owner, payload)
+            self.stats['forwarded'] += 1
+            return True
+        except (OSError, ConnectionError) as e:
+            logger.warning(f"⚠️ العامل {owner} غير متاح، معالجة محلية: {e}")
+            self.stats['fallbacks'] += 1
+            self.refresh(force=True)
+            return False
+
+    def broadcast(self, payload):
+        """إرسال رسالة لكل العمال الآخرين، ويرجع pids من استلمها"""
+        if self._server is None:
+            return []
+        self.refresh(force=True)
+        reached = []
+        for pid in self.ring.nodes:
+            if pid == self._pid:
+                continue
+            try:
+                self._send(pid, payload)
+                reached.append(pid)
+            except (OSError, ConnectionError) as e:
+                logger.warning(f"⚠️ تعذر الوصول للعامل {pid}: {e}")
+        return reached
+
+    def _sign(self, payload):
+        return hmac.new(self.key, payload, hashlib.sha256).digest()
+
+    def _send(self, pid, payload):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self._path(pid))
+            send_frame(sock, self._sign(payload) + payload)
+            if sock.recv(1) != ACK:
+                raise ConnectionError("لم يتم تأكيد الاستلام")
+
+    def _accept_loop(self, server):
+        while self._server is server:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                break
+            Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                frame = recv_frame(conn)
+                tag, payload = frame[:TAG_SIZE], frame[TAG_SIZE:]
+                if not hmac.compare_digest(tag, self._sign(payload)):
+                    self.stats['rejected'] += 1
+                    logger.warning("⚠️ رفض إطار محوّل بتوقيع غير صالح")
+                    return
+                conn.sendall(ACK)
+            except (OSError, ConnectionError) as e:
+                logger.warning(f"⚠️ خطأ في استقبال حدث محوّل: {e}")
+                return
+        self.stats['received'] += 1
+        try:
+            self.dispatch(payload)
+        except Exception as e:
+            logger.error(f"❌ خطأ في معالجة حدث محوّل: {e}", exc_info=True)
@@ -0,0 +1,352 @@
+"""
+جدولة البث للمجموعات - أسئلة يومية وإعلانات بدء الألعاب
+مهام محفوظة في ملف JSON، إرسال متوازٍ محدود بمعدل token bucket، ومتابعة الحصة الشهرية
+LINE يحسب رسالة push للمجموعة مرة لكل عضو، فتكلفة كل مجموعة تُقدّر من عدد أعضائها
+والإرسال على دفعات تُعاد قراءة الاستهلاك قبل كل منها
+المجموعات المسجلة لكل قناة في SQLite مشترك، فكل عامل يسجل مجموعاته الموجّهة إليه والبث يرى الجميع
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import sqlite3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+
+logger = logging.getLogger("whale-bot")
+
+QUOTA_REFRESH_SECONDS = 600
+QUOTA_BATCH = 200                 # مستلمون بين كل إعادة قراءة لاستهلاك الحصة
+MEMBER_COUNT_TTL = 24 * 3600      # صلاحية عدد أعضاء المجموعة المحفوظ
+ROOM_TOUCH_SECONDS = 3600         # أقل فترة بين تحديثين لوقت آخر نشاط المجموعة
+
+ROOMS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rooms (
+    channel TEXT NOT NULL,
+    room TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (channel, room)
+)
+"""
+
+
+class TokenBucket:
+    """حد معدل: rate طلب/ثانية مع سماح بدفعة حتى capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """أخذ token بدون انتظار"""
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RoomRegistry:
+    """المجموعات التي يوجد فيها البوت لكل قناة - مشتركة بين العمال
+
+    add() على مسار الرسائل يكتب مرة كل ROOM_TOUCH_SECONDS لكل مجموعة فقط
+    """
+
+    def __init__(self, path, touch_interval=ROOM_TOUCH_SECONDS):
+        self.path = path
+        self.touch_interval = touch_interval
+        self._touched = {}  # {(channel, room): آخر كتابة}
+        self._lock = Lock()
+        self._conn = None
+        self._pid = None
+
+    def _db(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(ROOMS_SCHEMA)
+        return self._conn
+
+    def add(self, channel, room, force=False):
+        now = time.time()
+        key = (channel, room)
+        if not force and now - self._touched.get(key, 0.0) < self.touch_interval:
+            return
+        self._touched[key] = now
+        with self._lock:
+            self._db().execute("INSERT OR REPLACE INTO rooms (channel, room, seen_at) VALUES (?, ?, ?)",
+                               (channel, room, now))
+
+    def add_many(self, channel, rooms):
+        """rooms: {room: seen_at} (الاستيراد والتنسيق القديم داخل JSON)"""
+        with self._lock:
+            self._db().executemany("INSERT OR IGNORE INTO rooms (channel, room, seen_at) VALUES (?, ?, ?)",
+                                   [(channel, room, float(seen_at)) for room, seen_at in rooms.items()])
+
+    def remove(self, channel, room):
+        self._touched.pop((channel, room), None)
+        with self._lock:
+            return self._db().execute("DELETE FROM rooms WHERE channel = ? AND room = ?",
+                                      (channel, room)).rowcount == 1
+
+    def items(self, channel):
+        """[(room, seen_at)] لمجموعات القناة"""
+        with self._lock:
+            return self._db().execute("SELECT room, seen_at FROM rooms WHERE channel = ? ORDER BY seen_at",
+                                      (channel,)).fetchall()
+
+    def rooms(self, channel):
+        return [room for room, _ in self.items(channel)]
+
+
+class BroadcastScheduler:
+    """محرك البث المجدول
+
+    api(channel): عميل LINE الحقيقي لقناة المهمة (None إذا لم تعد موجودة)، و stub_api: عميل وهمي لوضع dry-run
+    render(job): يرجع الرسائل المراد إرسالها
+    recipients(channel): كل مجموعات القناة (عند targets == 'all')
+    المهام القديمة بدون channel تتبع default_channel، والحصة الشهرية تُتابع لكل قناة
+    """
+
+    def __init__(self, jobs_file, api, render, recipients, rate=100, concurrency=8,
+                 stub_api=None, dry_run=False, default_channel='default'):
+        self.jobs_file = jobs_file
+        self.default_channel = default_channel
+        self.api = api
+        self.stub_api = stub_api
+        self.render = render
+        self.recipients = recipients
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.dry_run = dry_run
+        self.quota = {}           # {channel: {'limit', 'used', 'checked_at', 'month'}}
+        self.dry_run_quota = {}
+        self._member_counts = {}  # {to: (عدد الأعضاء، وقت الجلب)}
+        self.stats = {'jobs_run': 0, 'sent': 0, 'failed': 0, 'skipped_quota': 0}
+        self._lock = Lock()
+        self._pid = None
+        self._leader_fd = None
+
+    # ─────────────── تخزين المهام ───────────────
+    def _load(self):
+        if not os.path.exists(self.jobs_file):
+            return {}
+        try:
+            with open(self.jobs_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ خطأ في تحميل مهام البث: {e}")
+            return {}
+
+    def _save(self, jobs):
+        tmp_path = f"{self.jobs_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(jobs, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.jobs_file)
+
+    def add_job(self, kind='text', text='', run_at=None, repeat_seconds=None, targets='all', dry_run=False,
+                channel=None):
+        """إضافة مهمة بث جديدة وإرجاعها"""
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'channel': channel,
+            'kind': kind,
+            'text': text,
+            'run_at': float(run_at or time.time()),
+            'repeat_seconds': repeat_seconds,
+            'targets': targets,
+            'dry_run': bool(dry_run),
+            'status': 'pending',
+            'runs': 0,
+            'last_result': None
+        }
+        with self._lock:
+            jobs = self._load()
+            jobs[job['id']] = job
+            self._save(jobs)
+        logger.info(f"📅 مهمة بث جديدة {job['id']} ({kind})")
+        return job
+
+    def cancel_job(self, job_id):
+        with self._lock:
+            jobs = self._load()
+            if job_id not in jobs:
+                return False
+            jobs[job_id]['status'] = 'cancelled'
+            self._save(jobs)
+        return True
+
+    def list_jobs(self):
+        with self._lock:
+            return list(self._load().values())
+
+    # ─────────────── التشغيل ───────────────
+    def start(self):
+        """تشغيل حلقة الجدولة (عامل واحد فقط يحمل القفل ينفذ المهام)"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._leader_fd = None
+        Thread(target=self._run, daemon=True).start()
+
+    def _is_leader(self):
+        if self._leader_fd is not None:
+            return True
+        fd = os.open(f"{self.jobs_file}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._leader_fd = fd
+        logger.info(f"📡 العامل {os.getpid()} مسؤول عن البث المجدول")
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self._is_leader():
+                    self.run_due()
+                    time.sleep(1)
+                else:
+                    time.sleep(30)
+            except Exception as e:
+                logger.error(f"❌ خطأ في جدولة البث: {e}", exc_info=True)
+                time.sleep(5)
+
+    def run_due(self, now=None):
+        """تنفيذ المهام المستحقة"""
+        now = now or time.time()
+        with self._lock:
+            jobs = self._load()
+        due = [job for job in jobs.values() if job['status'] == 'pending' and job['run_at'] <= now]
+        for job in due:
+            result = self.run_job(job)
+            with self._lock:
+                jobs = self._load()
+                stored = jobs.get(job['id'])
+                if stored is None or stored['status'] != 'pending':
+                    continue
+                stored['runs'] += 1
+                stored['last_result'] = result
+                if stored.get('repeat_seconds'):
+                    while stored['run_at'] <= now:
+                        stored['run_at'] += stored['repeat_seconds']
+                else:
+                    stored['status'] = 'done'
+                self._save(jobs)
+
+    @staticmethod
+    def _remaining_quota(api, state, refresh=False):
+        """الحصة الشهرية المتبقية (None = غير محدودة)، تُحدّث من LINE كل 10 دقائق أو عند refresh"""
+        now = time.time()
+        if refresh or now - state['checked_at'] > QUOTA_REFRESH_SECONDS:
+            try:
+                quota = api.get_message_quota()
+                state['limit'] = quota.value if quota.type == 'limited' else None
+                used = api.get_message_quota_consumption().total_usage
+                month = time.strftime('%Y-%m')
+                # الاستهلاك في LINE يتأخر قليلاً: لا ننزل عن العدّ المحلي في نفس الشهر
+                state['used'] = max(used, state['used']) if state['month'] == month else used
+                state['month'] = month
+                state['checked_at'] = now
+            except Exception as e:
+                logger.warning(f"⚠️ تعذر جلب حصة الرسائل: {e}")
+        if state['limit'] is None:
+            return None
+        return max(0, state['limit'] - state['used'])
+
+    def _cost(self, api, to):
+        """عدد الرسائل التي يحسبها LINE لـ push واحد إلى to"""
+        if to.startswith('U'):
+            return 1
+        cached = self._member_counts.get(to)
+        if cached is not None and time.time() - cached[1] < MEMBER_COUNT_TTL:
+            return cached[0]
+        method = api.get_room_members_count if to.startswith('R') else api.get_group_members_count
+        try:
+            count = max(1, int(method(to)))
+        except Exception as e:
+            logger.warning(f"⚠️ تعذر جلب عدد أعضاء {to}: {e}")
+            return cached[0] if cached is not None else 1  # الدفعة التالية تصحح من الاستهلاك الفعلي
+        self._member_counts[to] = (count, time.time())
+        return count
+
+    def run_job(self, job):
+        """إرسال مهمة واحدة لكل المستلمين على دفعات لا تتجاوز الحصة المتبقية"""
+        dry_run = self.dry_run or job.get('dry_run')
+        channel = job.get('channel') or self.default_channel
+        api = self.stub_api if dry_run else self.api(channel)
+        if api is None:
+            logger.warning(f"⚠️ بث {job['id']}: القناة {channel} غير موجودة")
+            return {'sent': 0, 'failed': 0, 'skipped': 0, 'error': 'القناة غير موجودة', 'at': time.time()}
+        quota = (self.dry_run_quota if dry_run else self.quota).setdefault(
+            channel, {'limit': None, 'used': 0, 'checked_at': 0.0, 'month': None})
+        targets = self.recipients(channel) if job['targets'] == 'all' else job['targets']
+        targets = list(dict.fromkeys(t for t in targets if t))  # إزالة التكرار مع حفظ الترتيب
+
+        messages = self.render(job)
+        if not messages:
+            return {'sent': 0, 'failed': 0, 'skipped': 0}
+
+        def send(to):
+            self.bucket.acquire()
+            try:
+                api.push_message(to, messages)
+                return True
+            except Exception as e:
+                logger.warning(f"⚠️ فشل البث إلى {to}: {e}")
+                return False
+
+        sent = failed = skipped = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for i in range(0, len(targets), QUOTA_BATCH):
+                batch = targets[i:i + QUOTA_BATCH]
+                remaining = self._remaining_quota(api, quota, refresh=i > 0)
+                costs = [None] * len(batch)
+                if remaining is not None:
+                    for j, to in enumerate(batch):
+                        costs[j] = self._cost(api, to)
+                        if costs[j] > remaining:
+                            batch, costs = batch[:j], costs[:j]
+                            break
+                        remaining -= costs[j]
+                for ok, cost in zip(pool.map(send, batch), costs):
+                    if ok:
+                        sent += 1
+                        quota['used'] += cost or 1
+                    else:
+                        failed += 1
+                if i + len(batch) < min(i + QUOTA_BATCH, len(targets)):
+                    skipped = len(targets) - i - len(batch)
+                    self.stats['skipped_quota'] += skipped
+                    logger.warning(f"⚠️ الحصة الشهرية لا تكفي، تم تخطي {skipped} مجموعة")
+                    break
+        self.stats['jobs_run'] += 1
+        self.stats['sent'] += sent
+        self.stats['failed'] += failed
+        logger.info(f"📡 بث {job['id']}: {sent} مرسل، {failed} فشل{' (dry-run)' if dry_run else ''}")
+        return {'sent': sent, 'failed': failed, 'skipped': skipped, 'dry_run': bool(dry_run), 'at': time.time()}
@@ -0,0 +1,158 @@
+"""
+لقطة المستخدمين الثنائية - سجلات بطول مسبق + فهرس في نهاية الملف
+يتم فتحها عبر mmap عند الإقلاع، ولا يُفك ترميز المستخدم إلا عند أول ظهور له
+
+التنسيق:
+    Header : magic(4) version(u16) reserved(u16)
+    Record : length(u32) + points(q) games_played(q) last_active(d) registered(B)
+             id_len(u16) id  name_len(u16) name  extra_len(u32) extra(JSON)
+    Index  : (hash(u64), offset(u64)) × count مرتبة حسب hash
+    Trailer: index_offset(u64) count(u64) registered(u32) magic(4)
+"""
+
+import os
+import mmap
+import json
+import struct
+import hashlib
+from array import array
+
+MAGIC = b'WHSN'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHH')
+LENGTH = struct.Struct('<I')
+FIELDS = struct.Struct('<qqdB')
+SHORT = struct.Struct('<H')
+INDEX_ENTRY = struct.Struct('<QQ')
+TRAILER = struct.Struct('<QQI4s')
+
+
+def key_hash(user_id):
+    return int.from_bytes(hashlib.blake2b(user_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def encode_record(user_id, points, games_played, last_active, registered, name, extra=None):
+    """ترميز سجل مستخدم واحد (مع بادئة الطول)"""
+    uid = user_id.encode('utf-8')
+    name_bytes = name.encode('utf-8')
+    extra_bytes = json.dumps(extra, ensure_ascii=False).encode('utf-8') if extra else b''
+    body = b''.join((
+        FIELDS.pack(points, games_played, last_active, 1 if registered else 0),
+        SHORT.pack(len(uid)), uid,
+        SHORT.pack(len(name_bytes)), name_bytes,
+        LENGTH.pack(len(extra_bytes)), extra_bytes,
+    ))
+    return LENGTH.pack(len(body)) + body
+
+
+class Snapshot:
+    """قراءة لقطة عبر mmap - الإقلاع O(1) بغض النظر عن عدد المستخدمين"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"ملف لقطة غير صالح: {path}")
+        self.index_offset, self.count, self.registered, magic = TRAILER.unpack_from(
+            self._mm, len(self._mm) - TRAILER.size)
+        if magic != MAGIC:
+            raise ValueError(f"فهرس اللقطة تالف: {path}")
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def _entry(self, i):
+        return INDEX_ENTRY.unpack_from(self._mm, self.index_offset + i * INDEX_ENTRY.size)
+
+    def find(self, user_id):
+        """موضع سجل المستخدم في الملف أو None (بحث ثنائي في الفهرس)"""
+        target = key_hash(user_id)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < self.count:
+            h, offset = self._entry(lo)
+            if h != target:
+                break
+            if self.read_id(offset) == user_id:
+                return offset
+            lo += 1
+        return None
+
+    def read_id(self, offset):
+        pos = offset + LENGTH.size + FIELDS.size
+        (id_len,) = SHORT.unpack_from(self._mm, pos)
+        return self._mm[pos + 2:pos + 2 + id_len].decode('utf-8')
+
+    def read(self, offset):
+        """فك ترميز سجل: (user_id, {name, points, ...})"""
+        pos = offset + LENGTH.size
+        points, games_played, last_active, registered = FIELDS.unpack_from(self._mm, pos)
+        pos += FIELDS.size
+        (id_len,) = SHORT.unpack_from(self._mm, pos)
+        user_id = self._mm[pos + 2:pos + 2 + id_len].decode('utf-8')
+        pos += 2 + id_len
+        (name_len,) = SHORT.unpack_from(self._mm, pos)
+        name = self._mm[pos + 2:pos + 2 + name_len].decode('utf-8')
+        pos += 2 + name_len
+        (extra_len,) = LENGTH.unpack_from(self._mm, pos)
+        user = json.loads(self._mm[pos + 4:pos + 4 + extra_len]) if extra_len else {}
+        user.update(name=name, points=points, games_played=games_played,
+                    last_active=last_active, registered=bool(registered))
+        return user_id, user
+
+    def read_fields(self, offset):
+        """الحقول الرقمية فقط: (points, games_played, last_active, registered)"""
+        return FIELDS.unpack_from(self._mm, offset + LENGTH.size)
+
+    def raw(self, offset):
+        """السجل كما هو (لنسخه عند الحفظ بدون فك ترميز)"""
+        (size,) = LENGTH.unpack_from(self._mm, offset)
+        return self._mm[offset:offset + LENGTH.size + size]
+
+    def offsets(self):
+        """مواضع كل السجلات بترتيب الملف"""
+        pos = HEADER.size
+        while pos < self.index_offset:
+            yield pos
+            (size,) = LENGTH.unpack_from(self._mm, pos)
+            pos += LENGTH.size + size
+
+
+def write_snapshot(path, records):
+    """كتابة لقطة جديدة بشكل ذري
+
+    records: عناصر (user_id, raw_bytes, registered) حيث raw_bytes ناتج encode_record
+    أو Snapshot.raw. ترجع عدد السجلات.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"  # لكل عامل ملفه، فلا يتصادم حفظان متزامنان
+    hashes = array('Q')
+    offsets = array('Q')
+    registered = 0
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0))
+        offset = HEADER.size
+        for user_id, raw, is_registered in records:
+            hashes.append(key_hash(user_id))
+            offsets.append(offset)
+            f.write(raw)
+            offset += len(raw)
+            registered += 1 if is_registered else 0
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        f.write(b''.join(INDEX_ENTRY.pack(hashes[i], offsets[i]) for i in order))
+        f.write(TRAILER.pack(offset, len(hashes), registered, MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(hashes)
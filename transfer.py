@@ -0,0 +1,191 @@
+"""
+تصدير واستيراد بيانات القناة بصيغة NDJSON (سطر JSON لكل سجل)
+التصدير مولّد يُرسل على دفعات، والاستيراد يقرأ السطور تدريجياً ويطبقها على دفعات
+
+أنواع السطور:
+    {"type": "meta", "version": 1, "channel": ..., "exported_at": ..., "users": n}
+    {"type": "user", "id": ..., "name": ..., "points": ..., "last_active": ..., "games_played": ..., "registered": ...}
+    {"type": "game", "room": ..., "state": {...}}
+    {"type": "used", "key": "questions_used", "items": [...]}
+    {"type": "room", "id": ..., "joined_at": ...}
+    {"type": "stats", "stats": {...}}
+"""
+
+import json
+import time
+import logging
+from datetime import datetime
+
+logger = logging.getLogger("whale-bot")
+
+FORMAT_VERSION = 1
+CHUNK_LINES = 500      # سطور لكل جزء من الاستجابة
+IMPORT_BATCH = 1000    # سجلات لكل دفعة استيراد
+IMPORT_PERSIST_USERS = 50000  # مستخدمون مستوردون في الذاكرة قبل حفظهم وإخراجهم منها
+MAX_ERRORS = 20        # أخطاء تُعاد في نتيجة الاستيراد
+MAX_ID_LENGTH = 64
+
+
+def _line(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def export_lines(data, channel_name, rooms=()):
+    """مولّد أجزاء NDJSON لقاعدة بيانات قناة واحدة (rooms: [(room, joined_at)] من سجل المجموعات)"""
+    chunk = [_line({'type': 'meta', 'version': FORMAT_VERSION, 'channel': channel_name,
+                    'exported_at': datetime.now().isoformat(), 'users': len(data['users'])})]
+
+    def records():
+        for user_id, user in data['users'].iter_records():
+            yield {'type': 'user', 'id': user_id, **user}
+        for room, state in list(data['games'].items()):
+            yield {'type': 'game', 'room': room, 'state': state}
+        for key, items in list(data.items()):
+            if key.endswith('_used') and isinstance(items, list):
+                yield {'type': 'used', 'key': key, 'items': items}
+        for room, joined_at in rooms:
+            yield {'type': 'room', 'id': room, 'joined_at': joined_at}
+        yield {'type': 'stats', 'stats': data.get('stats', {})}
+
+    for record in records():
+        chunk.append(_line(record))
+        if len(chunk) >= CHUNK_LINES:
+            yield ''.join(chunk)
+            chunk = []
+            time.sleep(0)  # إفساح المجال لبقية الطلبات (gevent)
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def _valid_id(value):
+    return isinstance(value, str) and 0 < len(value) <= MAX_ID_LENGTH
+
+
+def validate(record):
+    """سبب رفض السجل أو None إذا كان صالحاً"""
+    if not isinstance(record, dict):
+        return "السجل ليس كائن JSON"
+    kind = record.get('type')
+    if kind == 'meta':
+        if record.get('version') != FORMAT_VERSION:
+            return f"إصدار غير مدعوم: {record.get('version')}"
+    elif kind == 'user':
+        if not _valid_id(record.get('id')):
+            return "معرف مستخدم غير صالح"
+        if not isinstance(record.get('name', ''), str):
+            return "name يجب أن يكون نصاً"
+        if not _is_count(record.get('points', 0)) or not _is_count(record.get('games_played', 0)):
+            return "points و games_played أعداد صحيحة موجبة"
+        last_active = record.get('last_active', 0)
+        if isinstance(last_active, str):
+            try:
+                datetime.fromisoformat(last_active)
+            except ValueError:
+                return "last_active ليس تاريخاً صالحاً"
+        elif not isinstance(last_active, (int, float)) or isinstance(last_active, bool):
+            return "last_active يجب أن يكون تاريخاً أو رقماً"
+        if not isinstance(record.get('registered', False), bool):
+            return "registered يجب أن يكون true أو false"
+    elif kind == 'game':
+        if not _valid_id(record.get('room')) or not isinstance(record.get('state'), dict):
+            return "لعبة بدون room أو state"
+    elif kind == 'used':
+        if not str(record.get('key', '')).endswith('_used') or not isinstance(record.get('items'), list):
+            return "قائمة مستخدمة غير صالحة"
+    elif kind == 'room':
+        if not _valid_id(record.get('id')) or not isinstance(record.get('joined_at'), (int, float)):
+            return "غرفة غير صالحة"
+    elif kind == 'stats':
+        if not isinstance(record.get('stats'), dict):
+            return "stats يجب أن يكون كائناً"
+    else:
+        return f"نوع غير معروف: {kind}"
+    return None
+
+
+class Importer:
+    """استيراد تدريجي: feed(line) لكل سطر ثم finish()
+
+    السجلات الصالحة تُجمع في دفعة وتُطبّق على data كل IMPORT_BATCH سجل (دمج: المستخدم الموجود يُستبدل)
+    السطور غير الصالحة تُتجاهل وتُسجل في errors
+    persist(user_ids): حفظ ما طُبّق وإخراج المستخدمين المستوردين من الذاكرة، كل IMPORT_PERSIST_USERS
+    مستخدم وعند النهاية، فتبقى الذاكرة محدودة مهما كان حجم الملف
+    """
+
+    def __init__(self, data, dry_run=False, persist=None, add_rooms=None):
+        self.data = data
+        self.dry_run = dry_run
+        self.persist = persist
+        self.add_rooms = add_rooms  # add_rooms({room: joined_at}) لسجل المجموعات المشترك
+        self.pending_users = []  # مستوردون لم يُحفظوا بعد
+        self.batch = []
+        self.line_number = 0
+        self.counts = {'user': 0, 'game': 0, 'used': 0, 'room': 0, 'stats': 0, 'meta': 0}
+        self.rejected = 0
+        self.errors = []
+
+    def feed(self, line):
+        self.line_number += 1
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+        except ValueError:
+            error = "JSON غير صالح"
+        else:
+            error = validate(record)
+        if error:
+            self.rejected += 1
+            if len(self.errors) < MAX_ERRORS:
+                self.errors.append({'line': self.line_number, 'error': error})
+            return
+        self.batch.append(record)
+        if len(self.batch) >= IMPORT_BATCH:
+            self.commit()
+
+    def commit(self):
+        """تطبيق الدفعة الحالية"""
+        batch, self.batch = self.batch, []
+        data = self.data
+        rooms = {}
+        for record in batch:
+            kind = record['type']
+            self.counts[kind] += 1
+            if self.dry_run or kind == 'meta':
+                continue
+            if kind == 'user':
+                user_id = record['id']
+                data['users'][user_id] = {k: v for k, v in record.items() if k not in ('type', 'id')}
+                self.pending_users.append(user_id)
+            elif kind == 'game':
+                data['games'][record['room']] = record['state']
+            elif kind == 'used':
+                data[record['key']] = record['items']
+            elif kind == 'room':
+                rooms[record['id']] = record['joined_at']
+            elif kind == 'stats':
+                data['stats'] = dict(data.get('stats', {}), **record['stats'])
+        if rooms and self.add_rooms is not None:
+            self.add_rooms(rooms)
+        if len(self.pending_users) >= IMPORT_PERSIST_USERS:
+            self.flush()
+        time.sleep(0)  # إفساح المجال لبقية الطلبات (gevent)
+
+    def flush(self):
+        """حفظ المطبّق حتى الآن (لا شيء في dry_run)"""
+        pending, self.pending_users = self.pending_users, []
+        if self.persist is not None and not self.dry_run:
+            self.persist(pending)
+
+    def finish(self):
+        self.commit()
+        self.flush()
+        return {'imported': self.counts, 'rejected': self.rejected, 'errors': self.errors,
+                'lines': self.line_number, 'dry_run': self.dry_run}
@@ -0,0 +1,376 @@
+"""
+جدول المستخدمين المضغوط - الحقول الرقمية في مصفوفات typed
+بدلاً من dict كامل لكل مستخدم، مع واجهة شبيهة بالـ dict للمعالجات الحالية
+يمكن ربطه بلقطة (snapshot.py) فيُحمّل كل مستخدم منها عند أول وصول فقط
+
+طبقتان: الذاكرة للمستخدمين النشطين، واللقطة على القرص للباقين
+demote() يُخرج غير النشطين المحفوظين من الذاكرة، ويعودون تلقائياً عند أول وصول (بحث ثنائي في فهرس اللقطة)
+"""
+
+import sys
+import heapq
+from array import array
+from collections.abc import MutableMapping
+from datetime import datetime
+
+from snapshot import encode_record
+
+USER_FIELDS = ('name', 'points', 'last_active', 'games_played', 'registered')
+
+
+def _to_epoch(value):
+    """تحويل last_active (نص ISO أو رقم) إلى epoch"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value or 0)
+
+
+class UserRecord:
+    """واجهة dict لسجل مستخدم واحد داخل الجدول"""
+
+    __slots__ = ('_table', '_slot')
+
+    def __init__(self, table, slot):
+        self._table = table
+        self._slot = slot
+
+    def __getitem__(self, key):
+        return self._table._get_field(self._slot, key)
+
+    def __setitem__(self, key, value):
+        self._table._set_field(self._slot, key, value)
+
+    def __contains__(self, key):
+        return key in USER_FIELDS or key in self._table._extra.get(self._slot, ())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(USER_FIELDS) + list(self._table._extra.get(self._slot, ()))
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, UserRecord):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return f"UserRecord({self.to_dict()!r})"
+
+
+class UserTable(MutableMapping):
+    """جدول مستخدمين: user_id → slot، والحقول في مصفوفات متوازية"""
+
+    def __init__(self, users=None, snapshot=None):
+        self._ids = {}              # {user_id: slot}
+        self._keys = []             # slot → user_id (None للخانات المحررة)
+        self._free = []
+        self._names = []
+        self._points = array('q')
+        self._games_played = array('q')
+        self._last_active = array('d')
+        self._registered = bytearray()
+        self._extra = {}            # حقول إضافية نادرة {slot: {key: value}}
+        self._snapshot = snapshot
+        self._resolved = set()      # مستخدمو اللقطة الذين تم تحميلهم أو حذفهم
+        self._resolved_registered = 0
+        self._dirty = set()         # خانات تغيرت منذ آخر حفظ (لا تُخرج من الذاكرة قبل حفظها)
+        self._deleted = False       # حُذف مستخدم منذ آخر حفظ
+        self.stats = {'promoted': 0, 'demoted': 0}
+        if users:
+            for user_id, user in users.items():
+                self[user_id] = user
+
+    # ─────────────── الوصول للحقول ───────────────
+    def _get_field(self, slot, key):
+        if key == 'points':
+            return self._points[slot]
+        if key == 'name':
+            return self._names[slot]
+        if key == 'registered':
+            return bool(self._registered[slot])
+        if key == 'games_played':
+            return self._games_played[slot]
+        if key == 'last_active':
+            return datetime.fromtimestamp(self._last_active[slot]).isoformat()
+        extra = self._extra.get(slot)
+        if extra is None or key not in extra:
+            raise KeyError(key)
+        return extra[key]
+
+    def _set_field(self, slot, key, value):
+        if key == 'points':
+            self._points[slot] = int(value)
+        elif key == 'name':
+            self._names[slot] = sys.intern(str(value))
+        elif key == 'registered':
+            self._registered[slot] = 1 if value else 0
+        elif key == 'games_played':
+            self._games_played[slot] = int(value)
+        elif key == 'last_active':
+            self._last_active[slot] = _to_epoch(value)
+        else:
+            self._extra.setdefault(slot, {})[key] = value
+        self._dirty.add(slot)
+
+    def _alloc(self, user_id):
+        if self._free:
+            slot = self._free.pop()
+            self._keys[slot] = user_id
+        else:
+            slot = len(self._keys)
+            self._keys.append(user_id)
+            self._names.append('')
+            self._points.append(0)
+            self._games_played.append(0)
+            self._last_active.append(0.0)
+            self._registered.append(0)
+        self._ids[user_id] = slot
+        return slot
+
+    # ─────────────── التحميل الكسول من اللقطة ───────────────
+    def _snapshot_offset(self, user_id):
+        if self._snapshot is None or user_id in self._resolved:
+            return None
+        return self._snapshot.find(user_id)
+
+    def _resolve(self, user_id, offset):
+        self._resolved.add(user_id)
+        if self._snapshot.read_fields(offset)[3]:
+            self._resolved_registered += 1
+
+    def _fault(self, user_id):
+        """تحميل مستخدم من اللقطة عند أول ظهور له"""
+        offset = self._snapshot_offset(user_id)
+        if offset is None:
+            return None
+        user_id, user = self._snapshot.read(offset)
+        user_id = sys.intern(user_id)
+        self._resolve(user_id, offset)
+        self._store(user_id, user)
+        self.stats['promoted'] += 1
+        return self._ids[user_id]
+
+    def _unresolved_offsets(self, snapshot=None, resolved=None):
+        """مواضع مستخدمي اللقطة الذين لم يُحمّلوا بعد
+
+        snapshot و resolved: نسخة ثابتة للمرور الطويل (التصدير)، لأن الحفظ يستبدل اللقطة أثناءه
+        """
+        if snapshot is None:
+            snapshot, resolved = self._snapshot, self._resolved
+        if snapshot is None:
+            return
+        for offset in snapshot.offsets():
+            if not resolved or snapshot.read_id(offset) not in resolved:
+                yield offset
+
+    def load_all(self):
+        """تحميل كل مستخدمي اللقطة في الذاكرة (اختياري)"""
+        for offset in list(self._unresolved_offsets()):
+            user_id, user = self._snapshot.read(offset)
+            user_id = sys.intern(user_id)
+            self._resolve(user_id, offset)
+            self._store(user_id, user)
+
+    def rebind(self, snapshot):
+        """ربط الجدول بلقطة جديدة كُتبت من snapshot_records()"""
+        self._snapshot = snapshot
+        self._dirty.clear()
+        self._deleted = False
+        self._resolved = set(self._ids)
+        self._resolved_registered = sum(self._registered[slot] for slot in self._ids.values())
+
+    def changed(self):
+        """هل يحتاج الحفظ كتابة لقطة جديدة (تعديل أو حذف منذ آخر حفظ، أو لا لقطة بعد)"""
+        return self._snapshot is None or bool(self._dirty) or self._deleted
+
+    def snapshot_records(self):
+        """سجلات الحفظ: غير المحمّلين يُنسخون كما هم بدون فك ترميز"""
+        for offset in self._unresolved_offsets():
+            yield self._snapshot.read_id(offset), self._snapshot.raw(offset), self._snapshot.read_fields(offset)[3]
+        for user_id, slot in list(self._ids.items()):
+            registered = self._registered[slot]
+            yield user_id, encode_record(
+                user_id, self._points[slot], self._games_played[slot], self._last_active[slot],
+                registered, self._names[slot], self._extra.get(slot)), registered
+
+    # ─────────────── واجهة MutableMapping ───────────────
+    def __getitem__(self, user_id):
+        slot = self._ids.get(user_id)
+        if slot is None:
+            slot = self._fault(user_id)
+            if slot is None:
+                raise KeyError(user_id)
+        return UserRecord(self, slot)
+
+    def __setitem__(self, user_id, user):
+        user_id = sys.intern(user_id)
+        if user_id not in self._ids:
+            offset = self._snapshot_offset(user_id)
+            if offset is not None:
+                self._resolve(user_id, offset)
+        self._store(user_id, user)
+        self._dirty.add(self._ids[user_id])
+
+    def _store(self, user_id, user):
+        slot = self._ids.get(user_id)
+        if slot is None:
+            slot = self._alloc(user_id)
+        self._extra.pop(slot, None)
+        self._names[slot] = sys.intern(str(user.get('name', '')))
+        self._points[slot] = int(user.get('points', 0))
+        self._games_played[slot] = int(user.get('games_played', 0))
+        self._last_active[slot] = _to_epoch(user.get('last_active', 0))
+        self._registered[slot] = 1 if user.get('registered', False) else 0
+        for key, value in user.items():
+            if key not in USER_FIELDS:
+                self._extra.setdefault(slot, {})[key] = value
+
+    def __delitem__(self, user_id):
+        if user_id not in self._ids and self._fault(user_id) is None:
+            raise KeyError(user_id)
+        self._release(user_id)
+        self._deleted = True
+
+    def _release(self, user_id):
+        slot = self._ids.pop(user_id)
+        self._dirty.discard(slot)
+        self._keys[slot] = None
+        self._names[slot] = ''
+        self._points[slot] = 0
+        self._games_played[slot] = 0
+        self._last_active[slot] = 0.0
+        self._registered[slot] = 0
+        self._extra.pop(slot, None)
+        self._free.append(slot)
+
+    def __contains__(self, user_id):
+        return user_id in self._ids or self._fault(user_id) is not None
+
+    def __iter__(self):
+        ids = list(self._ids)
+        ids.extend(self._snapshot.read_id(offset) for offset in self._unresolved_offsets())
+        return iter(ids)
+
+    def __len__(self):
+        if self._snapshot is None:
+            return len(self._ids)
+        return len(self._ids) + len(self._snapshot) - len(self._resolved)
+
+    # ─────────────── استعلامات سريعة بدون إنشاء واجهات ───────────────
+    def last_active_ts(self, user_id):
+        return self._last_active[self[user_id]._slot]
+
+    def idle_since(self, cutoff_ts):
+        """المستخدمون الذين آخر نشاط لهم قبل cutoff_ts"""
+        idle = [uid for uid, slot in self._ids.items() if self._last_active[slot] < cutoff_ts]
+        for offset in self._unresolved_offsets():
+            if self._snapshot.read_fields(offset)[2] < cutoff_ts:
+                idle.append(self._snapshot.read_id(offset))
+        return idle
+
+    # ─────────────── الطبقات ───────────────
+    def demote(self, cutoff_ts=None, user_ids=None):
+        """إخراج المستخدمين غير النشطين منذ cutoff_ts (أو user_ids) من الذاكرة إلى اللقطة، ويرجع معرفاتهم
+
+        فقط من لم يتغير منذ آخر حفظ (نسخته في اللقطة مطابقة)، فيُستدعى بعد save_db
+        """
+        if self._snapshot is None:
+            return []
+        demoted = []
+        candidates = self._ids.items() if user_ids is None else (
+            (user_id, self._ids[user_id]) for user_id in user_ids if user_id in self._ids)
+        for user_id, slot in list(candidates):
+            if slot in self._dirty or (cutoff_ts is not None and self._last_active[slot] >= cutoff_ts):
+                continue
+            registered = self._registered[slot]
+            self._release(user_id)
+            self._resolved.discard(user_id)
+            self._resolved_registered -= registered
+            demoted.append(user_id)
+        self.stats['demoted'] += len(demoted)
+        return demoted
+
+    def peek(self, user_id):
+        """بيانات المستخدم (dict) بدون تحميله في الذاكرة، أو None"""
+        slot = self._ids.get(user_id)
+        if slot is not None:
+            return UserRecord(self, slot).to_dict()
+        offset = self._snapshot_offset(user_id)
+        if offset is None:
+            return None
+        user = self._snapshot.read(offset)[1]
+        user['last_active'] = datetime.fromtimestamp(user['last_active']).isoformat()
+        return user
+
+    def top_registered(self, count=10):
+        """[(user_id, name, points)] لأعلى المسجلين نقاطاً في الطبقتين بدون تحميل أحد"""
+        def candidates():
+            for user_id, slot in self._ids.items():
+                if self._registered[slot]:
+                    yield self._points[slot], user_id, None
+            for offset in self._unresolved_offsets():
+                points, _, _, registered = self._snapshot.read_fields(offset)
+                if registered:
+                    yield points, None, offset
+
+        top = heapq.nlargest(count, candidates(), key=lambda candidate: candidate[0])
+        result = []
+        for points, user_id, offset in top:
+            if offset is None:
+                result.append((user_id, self._names[self._ids[user_id]], points))
+            else:
+                user_id, user = self._snapshot.read(offset)
+                result.append((user_id, user['name'], points))
+        return result
+
+    def tier_status(self):
+        return dict(self.stats, hot=len(self._ids), cold=len(self) - len(self._ids), dirty=len(self._dirty))
+
+    def loaded_count(self):
+        """عدد المستخدمين المحمّلين في الذاكرة (الباقي في اللقطة فقط)"""
+        return len(self._ids)
+
+    def count_registered(self):
+        loaded = sum(self._registered[slot] for slot in self._ids.values())
+        if self._snapshot is None:
+            return loaded
+        return loaded + self._snapshot.registered - self._resolved_registered
+
+    def iter_records(self):
+        """(user_id, dict) لكل المستخدمين بدون تحميلهم في الجدول (للتصدير)
+
+        اللقطة والمحمّلون يُثبّتون عند البداية فيبقى المرور صحيحاً مع الحفظ أثناءه
+        قد يظهر مستخدم مرتين إذا حُمّل من اللقطة أثناء المرور
+        """
+        snapshot, resolved = self._snapshot, frozenset(self._resolved)
+        loaded = list(self._ids)
+        if snapshot is not None:
+            for offset in self._unresolved_offsets(snapshot, resolved):
+                user_id, user = snapshot.read(offset)
+                user['last_active'] = datetime.fromtimestamp(user['last_active']).isoformat()
+                yield user_id, user
+        for user_id in loaded:
+            slot = self._ids.get(user_id)
+            user = UserRecord(self, slot).to_dict() if slot is not None else self.peek(user_id)  # نُقل للقرص أثناء المرور
+            if user is not None:
+                yield user_id, user
+
+    def to_dict(self):
+        data = {uid: self[uid].to_dict() for uid in self._ids}
+        for offset in self._unresolved_offsets():
+            user_id, user = self._snapshot.read(offset)
+            user['last_active'] = datetime.fromtimestamp(user['last_active']).isoformat()
+            data[user_id] = user
+        return data